@@ -1,16 +1,38 @@
 import os
 import json
 import logging
-import base64
+import threading
+import time
 from typing import List, Dict, Any, Tuple
-from flask import Flask, render_template, request, session, flash, redirect, url_for, abort
+import mimetypes
+from flask import (Flask, Response, render_template, request, session, flash, redirect, url_for, abort, jsonify,
+                   send_from_directory, stream_with_context)
 from datetime import datetime
 from dotenv import load_dotenv
-import requests
-import firebase_admin
-from firebase_admin import credentials, firestore
-import razorpay
-
+import click
+
+from services import LazyService, ServiceProxy
+from cart_store import CartStore, new_cart_id
+from metrics import begin_request, end_request, instrument_firestore, instrument_session, registry, stat_values
+from assets import AssetVersions, append_version, mark_immutable, product_version
+from compression import ResponseCompressor, available_encodings, static_variant
+from orders import OrderJournal, OrderWriter, dump_order, write_order
+from sales import SalesAggregates
+from write_queue import WriteQueue
+from fanout import FanOut
+from feeds import FeedCache, feed_etag, iter_feed_csv, iter_feed_xml, iter_sitemap
+from page_cache import PageCache
+from snapshot import CatalogSnapshot
+from payments import CheckoutOrders, make_http_session
+from reviews import ReviewFeed
+from uploads import ImageUploader
+from images import ImageProcessor, build_static_derivatives, imaging_available, srcset, static_derivative_name, variant_for
+from catalog import (PRICE_SIZES, CartPricer, CatalogCache, CatalogIndex, ProductCache, decode_id_cursor,
+                     encode_id_cursor, first_image, money_to_int, price_cart, product_from_doc)
+from search import SORTS, SearchIndex, parse_search_args
+from product_writes import ProductConflict, ProductNotFound, ProductWriter
+from catalog_io import (CatalogImporter, ImportFileError, ProductIdAllocator, iter_export_csv, iter_export_json,
+                        read_import_rows, stream_products)
 
 # Load environment variables
 load_dotenv()
@@ -20,8 +42,6 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PRIVATE_DIR = os.path.join(BASE_DIR, "private")
 os.makedirs(PRIVATE_DIR, exist_ok=True)
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "public", "uploads")
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-products_file = os.path.join(PRIVATE_DIR, "products.json")
 
 app = Flask(__name__, static_folder="public", static_url_path="/static")
 app.secret_key = os.environ.get("SECRET_KEY", "8141@#Kaswala")
@@ -31,82 +51,61 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("wallcraft")
 
+# Request metrics (served at /metrics, optionally guarded by METRICS_TOKEN)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
 # Razorpay config
 RAZORPAY_KEY_ID = os.environ.get("RAZORPAY_KEY_ID", "rzp_test_RGHzf24TfjfbAy")
 RAZORPAY_KEY_SECRET = os.environ.get("RAZORPAY_KEY_SECRET", "xPSpg6R2zzdWf85Pn5gGfOyQ")
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
-
-# ImgBB API Key
-IMGBB_API_KEY = os.environ.get("IMGBB_API_KEY", "debd1d013910003d49c0b4dbec779e64")  # Replace with your key
-
-# Initialize Firestore
-def init_firestore():
-    firebase_key_json = os.environ.get("FIREBASE_KEY")
-    if not firebase_key_json:
-        raise Exception("FIREBASE_KEY env var not set")
-    try:
-        firebase_key_dict = json.loads(firebase_key_json)
-    except Exception as e:
-        raise Exception(f"Invalid FIREBASE_KEY JSON: {e}")
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(firebase_key_dict)
-        firebase_admin.initialize_app(cred)
-    return firestore.client()
 
-try:
-    db = init_firestore()
-    logger.info("Firestore initialized successfully")
-except Exception as e:
-    db = None
-    logger.error(f"Failed to init Firestore: {e}")
+def init_http_session():
+    session = make_http_session(
+        timeout=(3.05, float(os.environ.get("RAZORPAY_TIMEOUT_SECONDS", "10"))),
+        retries=int(os.environ.get("RAZORPAY_RETRIES", "2")),
+    )
+    if METRICS_ENABLED:
+        instrument_session(session, "razorpay")
+    return session
+
+def init_razorpay():
+    import razorpay
+    return razorpay.Client(session=http_session.get(), auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+
+# Built on first use in each worker, see services.LazyService
+http_session = LazyService("HTTP session", init_http_session)
+razorpay_service = LazyService("Razorpay client", init_razorpay)
+razorpay_client = ServiceProxy(razorpay_service)
+checkout_orders = CheckoutOrders(
+    razorpay_client,
+    ttl=float(os.environ.get("CHECKOUT_ORDER_TTL_SECONDS", "1800")),
+    verify_after=float(os.environ.get("CHECKOUT_ORDER_VERIFY_AFTER_SECONDS", "120")),
+)
 
 # --- ImgBB upload ---
-import base64
-import requests
-
 IMGBB_API_KEY = os.environ.get("IMGBB_API_KEY", "49c929b174cd1008c4379f46285ac846")  # Replace with actual key
 
-def upload_file_to_imgbb_and_get_url(file_storage) -> str | None:
-    try:
-        file_storage.seek(0)
-        img_bytes = file_storage.read()
-        encoded_image = base64.b64encode(img_bytes).decode('utf-8')
-        url = "https://api.imgbb.com/1/upload"
-        payload = {
-            "key": IMGBB_API_KEY,
-            "image": encoded_image,
-            "name": file_storage.filename,
-            "expiration": "0"
-        }
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        response = requests.post(url, data=payload, headers=headers)
-        result = response.json()
-        if response.status_code == 200 and result.get("success"):
-            direct_url = result["data"]["url"]
-            return direct_url
-        else:
-            logger.error(f"ImgBB upload failed: {result}")
-            return None
-    except Exception as e:
-        logger.error(f"Exception during ImgBB upload: {e}")
-        return None
-
-
-
-def add_product_to_firestore(data):
-    try:
-        db.collection("products").document(str(data["id"])).set(data)
-        logger.info(f"Product {data['id']} saved to Firestore")
-        return True
-    except Exception as e:
-        logger.error(f"Error saving product to Firestore: {e}")
-        return False
-
-
-
-
+image_uploader = ImageUploader(
+    IMGBB_API_KEY,
+    max_workers=int(os.environ.get("IMGBB_UPLOAD_WORKERS", "4")),
+    timeout=(5, float(os.environ.get("IMGBB_TIMEOUT_SECONDS", "30"))),
+    retries=int(os.environ.get("IMGBB_RETRIES", "3")),
+    session_hook=(lambda s: instrument_session(s, "imgbb")) if METRICS_ENABLED else None,
+)
+
+IMAGE_DERIVATIVES = os.environ.get("IMAGE_DERIVATIVES", "1") == "1" and imaging_available()
+image_processor = ImageProcessor(image_uploader, max_workers=int(os.environ.get("IMAGE_DERIVATIVE_WORKERS", "3")))
+
+def upload_images(files) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Upload the allowed files concurrently; return their URLs and derivative variants."""
+    files = [f for f in files if f and f.filename and allowed_file(f.filename)]
+    results = image_uploader.upload_many(files)
+    failed = [r.filename for r in results if not r.ok]
+    if failed:
+        flash(f"Failed to upload: {', '.join(failed)}", "warning")
+    uploaded = [(r.url, f) for r, f in zip(results, files) if r.ok]
+    variants = image_processor.build_variants(uploaded) if IMAGE_DERIVATIVES else []
+    return [url for url, _ in uploaded], variants
 
 
 # ---------------------------------------------------------------------
@@ -117,20 +116,13 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def money_to_int(val: str) -> int:
-    if not val:
-        return 0
-    try:
-        cleaned = val.replace("₹", "").replace(",", "").strip()
-        return int(cleaned) if cleaned else 0
-    except ValueError:
-        logger.warning(f"money_to_int: Cannot convert value '{val}' to int.")
-        return 0
-
 # ---------------------------------------------------------------------
 # Firebase Initialization
 # ---------------------------------------------------------------------
 def init_firestore():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     firebase_key_json = os.environ.get("FIREBASE_KEY")
     if not firebase_key_json:
         raise Exception("FIREBASE_KEY environment variable not set!")
@@ -141,25 +133,35 @@ def init_firestore():
     if not firebase_admin._apps:
         cred = credentials.Certificate(firebase_key_dict)
         firebase_admin.initialize_app(cred)
-    return firestore.client()
+    client = firestore.client()
+    return instrument_firestore(client) if METRICS_ENABLED else client
 
-db = None
-try:
-    db = init_firestore()
-    logger.info("Firestore initialized successfully.")
-except Exception as e:
-    logger.error(f"Firestore initialization failed: {e}")
+firestore_service = LazyService(
+    "Firestore",
+    init_firestore,
+    retry_after=float(os.environ.get("FIRESTORE_RETRY_SECONDS", "30")),
+)
+# Falsy while Firestore is unavailable, so `if not db` checks still work
+db = ServiceProxy(firestore_service)
 
 # ---------------------------------------------------------------------
 # Product Data – Robust Persistence
 # ---------------------------------------------------------------------
-def save_products(data: List[Dict[str, Any]]) -> None:
-    try:
-        with open(products_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.info("products.json saved with %d products", len(data))
-    except Exception as e:
-        logger.error(f"Failed to write products file: {e}")
+# Last known catalog on disk: seeds cold workers and covers Firestore outages
+CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT", "1") == "1"
+catalog_snapshot = CatalogSnapshot(os.path.join(PRIVATE_DIR, "catalog.snapshot"))
+
+def load_catalog_snapshot() -> List[Dict[str, Any]] | None:
+    return catalog_snapshot.load() if CATALOG_SNAPSHOT else None
+
+def save_catalog_snapshot(products: List[Dict[str, Any]], version: int) -> None:
+    # Runs under the catalog lock, so serialize and write off the request thread
+    if CATALOG_SNAPSHOT:
+        threading.Thread(target=catalog_snapshot.write, args=(products,), name="catalog-snapshot", daemon=True).start()
+
+def fetch_products() -> List[Dict[str, Any]]:
+    docs = db.collection("products").order_by("id").stream()
+    return [product_from_doc(doc) for doc in docs]
 
 def load_products_from_firestore() -> List[Dict[str, Any]]:
     if not db:
@@ -168,51 +170,237 @@ def load_products_from_firestore() -> List[Dict[str, Any]]:
 
     products = []
     try:
-        docs = db.collection("products").order_by("id").stream()
-        for doc in docs:
-            product = doc.to_dict()
-            # Ensure 'id' is int for sorting & comparisons if stored as string
-            if "id" in product:
-                product["id"] = int(product["id"])
-            products.append(product)
+        products = fetch_products()
     except Exception as e:
         logger.error(f"Error loading products from Firestore: {e}")
     return products
 
+# ---------------------------------------------------------------------
+# Catalog Cache
+# ---------------------------------------------------------------------
+CATALOG_TTL_SECONDS = float(os.environ.get("CATALOG_TTL_SECONDS", "300"))
+CATALOG_WATCH = os.environ.get("CATALOG_WATCH", "1") == "1"
+CATALOG_BACKGROUND_REFRESH = os.environ.get("CATALOG_BACKGROUND_REFRESH", "1") == "1"
+
+def _load_catalog() -> List[Dict[str, Any]] | None:
+    # Unlike load_products_from_firestore, errors propagate (and a missing
+    # client yields None) so the cache keeps serving its last good copy
+    # instead of caching an empty list.
+    if not db:
+        return None
+    return fetch_products()
 
-def get_cart_items_and_total(cart: Dict[str, Any], products: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
-    items = []
-    total = 0
-    for key, data in cart.items():
-        try:
-            parts = key.split(":")
-            if len(parts) != 2:
-                logger.error(f"Invalid cart item key format: {key}")
-                continue
-            pid, size = parts
-            qty = data.get("qty", 0)
-            product = next((p for p in products if p["id"] == int(pid)), None)
-            if not product or qty <= 0:
-                continue
-            price = money_to_int(product.get(f"price_{size}", "0"))
-            subtotal = price * qty
-            total += subtotal
-            img_url = product.get("imgs")[0] if product.get("imgs") else ""
-            items.append({
-                "id": product["id"],
-                "name": product["name"],
-                "img": img_url,
-                "size": size,
-                "price": price,
-                "qty": qty,
-                "subtotal": subtotal,
-            })
-        except Exception as e:
-            logger.error(f"Error processing cart item {key}: {e}")
-    return items, total
+def _catalog_query():
+    return db.collection("products") if db else None
+
+catalog_cache = CatalogCache(
+    _load_catalog,
+    query_factory=_catalog_query if CATALOG_WATCH else None,
+    ttl=CATALOG_TTL_SECONDS,
+    seed=load_catalog_snapshot,
+    on_change=save_catalog_snapshot,
+    background_refresh=CATALOG_BACKGROUND_REFRESH,
+)
+
+def get_catalog() -> List[Dict[str, Any]]:
+    return catalog_cache.get()
+
+def get_catalog_index() -> CatalogIndex:
+    return catalog_cache.index()
+
+def fetch_product(product_id: int) -> Dict[str, Any] | None:
+    if not db:
+        return None
+    doc = db.collection("products").document(str(product_id)).get()
+    if not doc.exists:
+        return None
+    product = product_from_doc(doc)
+    product.setdefault("id", product_id)
+    return product
+
+def fetch_products_by_id(product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    if not db or not product_ids:
+        return {}
+    refs = [db.collection("products").document(str(pid)) for pid in product_ids]
+    found = {}
+    for doc in db.get_all(refs):
+        if not doc.exists:
+            continue
+        product = product_from_doc(doc)
+        product.setdefault("id", int(doc.id))
+        found[int(doc.id)] = product
+    return found
+
+product_cache = ProductCache(
+    fetch_product,
+    batch_fetcher=fetch_products_by_id,
+    ttl=CATALOG_TTL_SECONDS,
+    negative_ttl=float(os.environ.get("PRODUCT_NEGATIVE_TTL_SECONDS", "60")),
+)
+
+def get_product(product_id: int) -> Dict[str, Any] | None:
+    # A warm catalog answers for free; otherwise read just this document.
+    # Display may use an expired copy while it refreshes; cart pricing may not.
+    index = catalog_cache.cached_index(allow_stale=True)
+    if index is not None:
+        return index.get(product_id)
+    return product_cache.get(product_id)
+
+cart_pricer = CartPricer(catalog_cache, product_cache)
+
+def price_session_cart(cart: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+    return cart_pricer.price(cart)
+
+# Re-synced incrementally whenever the cached catalog list changes
+search_index = SearchIndex()
+
+def get_search_index() -> SearchIndex:
+    search_index.sync(get_catalog())
+    return search_index
+
+def invalidate_catalog(product_id: int | None = None) -> None:
+    catalog_cache.invalidate()
+    product_cache.invalidate(product_id)
+
+# ---------------------------------------------------------------------
+# Rendered Page Cache
+# ---------------------------------------------------------------------
+PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE", "1") == "1"
+page_cache = PageCache(
+    max_entries=int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", "512")),
+    max_bytes=int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=float(os.environ.get("PAGE_CACHE_TTL_SECONDS", "120")),
+)
+
+def page_cache_enabled() -> bool:
+    return PAGE_CACHE_ENABLED
+
+def catalog_version() -> int:
+    # Makes sure the catalog is fresh first, so a reload yields a new key
+    return catalog_cache.index().version
+
+def loaded_catalog_version() -> int:
+    return catalog_cache.version
+
+def reviews_version() -> int:
+    return review_feed.version
+
+def sales_version() -> int:
+    return sales_aggregates.version
+
+cached_page = page_cache.cached
+
+# ---------------------------------------------------------------------
+# Order Persistence
+# ---------------------------------------------------------------------
+# Sharded per-product and per-day counters, committed together with each order
+sales_aggregates = SalesAggregates(
+    lambda: db if db else None,
+    shards=int(os.environ.get("SALES_SHARDS", "4")),
+    ttl=float(os.environ.get("SALES_TTL_SECONDS", "300")),
+)
+
+order_journal = OrderJournal(os.path.join(PRIVATE_DIR, "orders.sqlite3"))
+order_writer = OrderWriter(
+    order_journal,
+    lambda: db if db else None,
+    interval=float(os.environ.get("ORDER_WRITER_INTERVAL_SECONDS", "5")),
+    keep_written=float(os.environ.get("ORDER_JOURNAL_KEEP_SECONDS", "86400")),
+    stage=sales_aggregates.stage,
+    on_written=sales_aggregates.invalidate,
+)
+
+@app.before_request
+def start_order_writer():
+    # Started per worker process, after Passenger forks, to pick up leftovers
+    if not order_writer.running:
+        order_writer.ensure_started()
+
+def save_order(order_data: Dict[str, Any]) -> None:
+    try:
+        if not order_journal.append(order_data):
+            logger.info(f"Order {order_data['order_id']} already journaled, ignoring resubmission")
+        order_writer.wake()
+        return
+    except Exception as e:
+        logger.error(f"Could not journal order {order_data.get('order_id')}: {e}")
+    # The journal is unavailable, so fall back to writing directly
+    try:
+        if write_order(db, order_data, sales_aggregates.stage):
+            sales_aggregates.invalidate()
+        logger.info("Order saved in Firestore")
+    except Exception as e:
+        logger.critical(f"ORDER NOT SAVED {e}: {dump_order(order_data)}")
+
+@app.cli.command("drain-orders")
+def drain_orders():
+    """Write every pending journaled order to Firestore now."""
+    if not db:
+        raise SystemExit("Firestore is not initialized.")
+    written = order_writer.drain()
+    counts = order_journal.counts()
+    print(f"Wrote {written} orders; {counts['pending']} still pending")
+
+@app.cli.command("rebuild-sales")
+def rebuild_sales():
+    """Recompute the sales counters from the orders collection."""
+    if not db:
+        raise SystemExit("Firestore is not initialized.")
+    orders = (doc.to_dict() or {} for doc in
+              db.collection("orders").select(["order_id", "items", "total", "timestamp"]).stream())
+    result = sales_aggregates.rebuild(orders, on_progress=lambda n: print(f"  {n} orders read"))
+    print(f"Rebuilt sales counters from {result['orders']} orders: "
+          f"{result['documents']} documents in {result['batches']} batch(es)")
+
+# ---------------------------------------------------------------------
+# Reviews
+# ---------------------------------------------------------------------
+review_feed = ReviewFeed(
+    db,
+    page_size=int(os.environ.get("REVIEWS_PAGE_SIZE", "8")),
+    ttl=float(os.environ.get("REVIEWS_TTL_SECONDS", "120")),
+)
+
+# ---------------------------------------------------------------------
+# Background Writes
+# ---------------------------------------------------------------------
+write_flush_latency = registry.histogram(
+    "wallcraft_write_queue_flush_seconds", "Write queue batch commit latency by outcome.")
+
+write_queue = WriteQueue(
+    os.path.join(PRIVATE_DIR, "write_queue"),
+    lambda: db if db else None,
+    max_batch=int(os.environ.get("WRITE_QUEUE_BATCH", "100")),
+    interval=float(os.environ.get("WRITE_QUEUE_INTERVAL_SECONDS", "1")),
+    max_memory=int(os.environ.get("WRITE_QUEUE_MAX_MEMORY", "5000")),
+    on_flush=lambda elapsed, count, ok: write_flush_latency.observe(elapsed, outcome="ok" if ok else "error"),
+)
+write_queue.register("review", lambda batch, db, doc_id, data: review_feed.stage(batch, data, doc_id),
+                     on_written=review_feed.invalidate)
+write_queue.register("contact", lambda batch, db, doc_id, data: batch.create(
+    db.collection("contacts").document(doc_id), data))
+
+@app.before_request
+def start_write_queue():
+    # Per worker, like the order writer, so spill files left by a restart get flushed
+    if not write_queue.running:
+        write_queue.ensure_started()
+
+@app.cli.command("flush-writes")
+def flush_writes():
+    """Commit queued and spilled reviews and contact messages now."""
+    if not db:
+        raise SystemExit("Firestore is not initialized.")
+    written = write_queue.flush()
+    stats = write_queue.snapshot_stats()
+    print(f"Wrote {written} documents; {stats['depth']} queued, {stats['spill_files']} spill file(s) left")
+
+
+def get_cart_items_and_total(cart: Dict[str, Any], index: CatalogIndex) -> Tuple[List[Dict[str, Any]], int]:
+    return price_cart(cart, index)
 
 def get_products():
-    return load_products()
+    return get_catalog()
 
 @app.context_processor
 def inject_request():
@@ -222,38 +410,293 @@ def inject_request():
 def inject_now():
     return {'now': datetime.utcnow}
 
+@app.context_processor
+def inject_images():
+    def product_image(product, index=0):
+        imgs = product.get("imgs") or []
+        if isinstance(imgs, str):
+            imgs = [imgs]
+        return imgs[index] if len(imgs) > index else ""
+
+    def static_image(filename, width, fmt="jpeg"):
+        derived = static_derivative_name(filename, width, fmt)
+        if os.path.exists(os.path.join(app.static_folder, derived)):
+            return url_for("static", filename=derived)
+        return url_for("static", filename=filename)
+
+    return dict(product_image=product_image, img_variant=variant_for, srcset=srcset, static_image=static_image)
+
+# ---------------------------------------------------------------------
+# Response Compression
+# ---------------------------------------------------------------------
+# Registered before every other after_request hook so it runs last
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION", "1") == "1"
+response_compressor = ResponseCompressor(
+    min_size=int(os.environ.get("COMPRESSION_MIN_BYTES", "1024")),
+    gzip_level=int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_level=int(os.environ.get("COMPRESSION_BROTLI_LEVEL", "5")),
+)
+
+@app.before_request
+def serve_precompressed_static():
+    # Prefer the .br/.gz written by `flask build-assets` over the plain file
+    if not COMPRESSION_ENABLED or request.endpoint != "static":
+        return None
+    filename = (request.view_args or {}).get("filename", "")
+    variant = static_variant(app.static_folder, filename, request.accept_encodings)
+    if variant is None:
+        return None
+    encoding, variant_name = variant
+    response = send_from_directory(app.static_folder, variant_name,
+                                   mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                                   max_age=app.get_send_file_max_age(filename))
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+@app.after_request
+def compress_response(response):
+    if COMPRESSION_ENABLED and request.endpoint != "static":
+        return response_compressor(response, request)
+    return response
+
+@app.cli.command("build-assets")
+@click.option("--no-css", is_flag=True, help="Only precompress static files.")
+def build_assets_command(no_css):
+    """Move shared template CSS into public/css/site.css and precompress static files."""
+    from build_assets import build
+    result = build(os.path.join(app.root_path, app.template_folder), app.static_folder, css=not no_css)
+    if "css" in result:
+        css = result["css"]
+        print(f"Shared stylesheet: {css['shared_rules']} rules, {css['templates']} templates updated, "
+              f"{css['bytes_saved']} bytes removed from templates")
+    packed = result["precompress"]
+    print(f"Precompressed {packed['files']} static files ({', '.join(available_encodings())}): "
+          f"{packed['gz']} .gz, {packed['br']} .br written, {packed['skipped']} too small")
+
+# ---------------------------------------------------------------------
+# Asset Versioning
+# ---------------------------------------------------------------------
+asset_versions = AssetVersions(app.static_folder)
+
+@app.url_defaults
+def fingerprint_static(endpoint, values):
+    if endpoint == "static" and "v" not in values and "filename" in values:
+        version = asset_versions.hash_for(values["filename"])
+        if version:
+            values["v"] = version
+
+@app.after_request
+def cache_fingerprinted_assets(response):
+    if request.endpoint == "static" and response.status_code in (200, 304):
+        filename = (request.view_args or {}).get("filename", "")
+        if asset_versions.is_current(filename, request.args.get("v")):
+            mark_immutable(response)
+    return response
+
+def versioned_url(target, product=None):
+    # Remote images are versioned by their product document, local files by content
+    if target.startswith(("http://", "https://", "//")):
+        return append_version(target, product_version(product))
+    return url_for("static", filename=target)
+
+@app.context_processor
+def inject_versioned_url():
+    return dict(versioned_url=versioned_url)
+
+# ---------------------------------------------------------------------
+# Request Metrics
+# ---------------------------------------------------------------------
+@app.before_request
+def start_request_metrics():
+    if METRICS_ENABLED:
+        begin_request()
+
+@app.after_request
+def finish_request_metrics(response):
+    if not METRICS_ENABLED:
+        return response
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    stats = end_request(route, request.method, response.status_code)
+    if stats is not None:
+        response.headers["Server-Timing"] = stats.server_timing()
+    return response
+
+registry.gauge("wallcraft_catalog_cache", "Catalog cache counters and state.",
+               lambda: stat_values(catalog_cache.snapshot_stats()))
+registry.gauge("wallcraft_product_cache", "Product cache counters.",
+               lambda: stat_values(product_cache.stats))
+registry.gauge("wallcraft_page_cache", "Rendered page cache counters and size.",
+               lambda: stat_values(page_cache.snapshot_stats()))
+registry.gauge("wallcraft_checkout_orders", "Razorpay checkout orders created, reused or failed.",
+               lambda: stat_values(checkout_orders.stats))
+registry.gauge("wallcraft_order_journal", "Journaled orders by status.",
+               lambda: stat_values(order_journal.counts()))
+registry.gauge("wallcraft_write_queue", "Queued review/contact writes, spill files and flush counters.",
+               lambda: stat_values(write_queue.snapshot_stats()))
+registry.gauge("wallcraft_fanout", "Request fetches run on the fan-out pool or inline.",
+               lambda: stat_values(fanout.stats))
+registry.gauge("wallcraft_compression", "Dynamic responses compressed, streamed or served from the compressed cache.",
+               lambda: stat_values(response_compressor.snapshot_stats()))
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        abort(404)
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        abort(403)
+    return registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 # ==================== Routes ====================
 
+# ---------------------------------------------------------------------
+# Catalog Pages
+# ---------------------------------------------------------------------
+# Pool for fetches a single request can run side by side; 0 runs them one after another
+fanout = FanOut(max_workers=int(os.environ.get("FANOUT_WORKERS", "8")))
+
+# Cards rendered up front; the shop grid fetches the rest from /api/products
+HOME_FEATURED_COUNT = int(os.environ.get("HOME_FEATURED_COUNT", "8"))
+HOME_BEST_SELLERS_COUNT = int(os.environ.get("HOME_BEST_SELLERS_COUNT", "4"))
+SHOP_PAGE_SIZE = int(os.environ.get("SHOP_PAGE_SIZE", "12"))
+PRODUCTS_API_MAX_LIMIT = 48
+PRODUCT_API_FIELDS = ("id", "name", "img", "url", "price_small", "price_medium", "price_large")
+
+def card_image_url(product: Dict[str, Any]) -> str:
+    src = first_image(product)
+    if not src:
+        return ""
+    variant = variant_for(product, src)
+    if variant and "card" in variant:
+        return variant["card"]["jpeg"]
+    return versioned_url(src, product)
+
+def product_summary(product: Dict[str, Any], fields=PRODUCT_API_FIELDS) -> Dict[str, Any]:
+    summary = {}
+    for field in fields:
+        if field == "img":
+            summary["img"] = card_image_url(product)
+        elif field == "url":
+            summary["url"] = url_for("product_detail", product_id=product["id"])
+        elif field.startswith("price_"):
+            summary[field] = money_to_int(product.get(field, "0"))
+        else:
+            summary[field] = product.get(field)
+    return summary
+
 @app.route("/")
+@cached_page(catalog_version, reviews_version, sales_version, enabled=page_cache_enabled, shows_flashes=True)
 def home():
-    products = load_products_from_firestore()
-    reviews = []
+    index = get_catalog_index()
+    products, more = index.page(None, HOME_FEATURED_COUNT)
+    reviews_page = {"reviews": [], "next_cursor": None}
+    review_stats = None
+    best_sellers = []
     if db:
-        try:
-            for r in db.collection("reviews").order_by("timestamp", direction=firestore.Query.DESCENDING).stream():
-                review = r.to_dict()
-                reviews.append({
-                    "customer_name": review.get("customer_name", "Anonymous"),
-                    "review_text": review.get("review_text", ""),
-                    "rating": int(review.get("rating", 0))
-                })
-        except:
-            pass
-    return render_template("home.html", products=products, reviews=reviews)
+        # Independent reads on cold caches, so wait for one round trip, not three
+        page, stats, sellers = fanout.gather(
+            review_feed.page, review_feed.stats,
+            # A few spare in case a best seller has since been deleted
+            lambda: sales_aggregates.best_sellers(HOME_BEST_SELLERS_COUNT * 2),
+            return_exceptions=True,
+        )
+        error = next((r for r in (page, stats) if isinstance(r, Exception)), None)
+        if error is not None:
+            logger.error(f"Error loading reviews: {error}")
+        else:
+            reviews_page, review_stats = page, stats
+        if isinstance(sellers, Exception):
+            logger.error(f"Error loading best sellers: {sellers}")
+        else:
+            best_sellers = [index.get(s["product_id"]) for s in sellers if index.get(s["product_id"])]
+    return render_template(
+        "home.html",
+        products=products,
+        more_products=more is not None,
+        best_sellers=best_sellers[:HOME_BEST_SELLERS_COUNT],
+        reviews=reviews_page["reviews"],
+        reviews_next_cursor=reviews_page["next_cursor"],
+        review_stats=review_stats,
+    )
+
+@app.route("/api/reviews")
+def api_reviews():
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit", type=int)
+    try:
+        page = review_feed.page(cursor=cursor, limit=limit)
+    except Exception as e:
+        logger.error(f"Error loading reviews page: {e}")
+        return jsonify({"error": "Could not load reviews."}), 503
+    return jsonify(page)
 
 @app.route("/shop")
+@cached_page(catalog_version, enabled=page_cache_enabled)
 def shop():
-    return render_template("shop.html", products=load_products())
+    query = parse_search_args(request.args)
+    next_cursor = None
+    if query.active:
+        products = get_search_index().search(query)
+    else:
+        cursor = request.args.get("cursor")
+        products, next_id = get_catalog_index().page(decode_id_cursor(cursor) if cursor else None, SHOP_PAGE_SIZE)
+        next_cursor = encode_id_cursor(next_id) if next_id is not None else None
+    return render_template("shop.html", products=products, next_cursor=next_cursor,
+                           query=query, sorts=SORTS, sizes=PRICE_SIZES)
+
+@app.route("/api/products")
+def api_products():
+    limit = max(1, min(request.args.get("limit", SHOP_PAGE_SIZE, type=int), PRODUCTS_API_MAX_LIMIT))
+    fields = tuple(f for f in request.args.get("fields", "").split(",") if f) or PRODUCT_API_FIELDS
+    unknown = [f for f in fields if f not in PRODUCT_API_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    after = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        after = decode_id_cursor(cursor)
+        if after is None:
+            return jsonify({"error": "Invalid cursor."}), 400
+
+    index = get_catalog_index()
+    products, next_id = index.page(after, limit)
+    response = jsonify({
+        "products": [product_summary(p, fields) for p in products],
+        "next_cursor": encode_id_cursor(next_id) if next_id is not None else None,
+    })
+    response.set_etag(f"{index.version}-{cursor or ''}-{limit}-{','.join(fields)}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route("/api/search")
+def api_search():
+    query = parse_search_args(request.args)
+    limit = max(1, min(request.args.get("limit", 50, type=int), 200))
+    started = time.perf_counter()
+    results = get_search_index().search(query)
+    took_ms = (time.perf_counter() - started) * 1000
+    return jsonify({
+        "products": [{
+            "id": p["id"],
+            "name": p.get("name"),
+            "img": first_image(p),
+            "url": url_for("product_detail", product_id=p["id"]),
+            **{f"price_{size}": money_to_int(p.get(f"price_{size}", "0")) for size in PRICE_SIZES},
+        } for p in results[:limit]],
+        "total": len(results),
+        "took_ms": round(took_ms, 3),
+    })
 
 @app.route("/product/<int:product_id>")
+@cached_page(loaded_catalog_version, enabled=page_cache_enabled)
 def product_detail(product_id):
-    products = load_products_from_firestore()
-    product = next((p for p in products if p["id"] == product_id), None)
+    product = get_product(product_id)
     if not product:
         abort(404)
     return render_template("product_detail.html", product=product)
 
 @app.route("/about")
+@cached_page(enabled=page_cache_enabled)
 def about():
     return render_template("about.html")
 
@@ -265,27 +708,69 @@ def contact():
     return render_template("contact.html")
 
 
+# ---------------------------------------------------------------------
+# Cart
+# ---------------------------------------------------------------------
+cart_store = CartStore(os.path.join(PRIVATE_DIR, "carts.sqlite3"))
+
+def current_cart_id(create: bool = False) -> str | None:
+    cart_id = session.get("cart_id")
+    legacy = session.pop("cart", None)
+    if legacy:
+        # Move carts from the old cookie format into the server-side store
+        cart_id = cart_id or new_cart_id()
+        session["cart_id"] = cart_id
+        cart_store.merge(cart_id, legacy)
+    if not cart_id and create:
+        cart_id = new_cart_id()
+        session["cart_id"] = cart_id
+    return cart_id
+
+def load_cart() -> Dict[str, int]:
+    return cart_store.get(current_cart_id())
+
+def cart_line_from(data) -> Tuple[str, int] | None:
+    try:
+        pid = int(data.get("product_id"))
+        qty = int(data.get("quantity", data.get("qty", 1)))
+    except (TypeError, ValueError):
+        return None
+    size = data.get("size", "small")
+    if size not in PRICE_SIZES:
+        return None
+    return f"{pid}:{size}", qty
+
+def update_cart_line(key: str, action: str) -> Dict[str, int]:
+    cart_id = current_cart_id()
+    if not cart_id:
+        return {}
+    if action == "increase":
+        return cart_store.adjust(cart_id, key, 1)
+    if action == "decrease":
+        return cart_store.adjust(cart_id, key, -1)
+    if action == "remove":
+        return cart_store.remove(cart_id, key)
+    return cart_store.get(cart_id)
+
+def cart_payload(cart: Dict[str, int], priced: bool = False) -> Dict[str, Any]:
+    payload = {"count": sum(cart.values())}
+    if priced:
+        items, total = price_session_cart(cart)
+        payload.update(items=items, total=total)
+    return payload
+
+
 @app.route('/cart')
 def cart():
-    cart = session.get('cart', {})
-    products = load_products_from_firestore()
-    items, total = get_cart_items_and_total(cart, products)
+    items, total = price_session_cart(load_cart())
     return render_template('cart.html', cart_items=items, total=total)
 
 
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
-    product_id = request.form.get('product_id')
-    size = request.form.get('size')
-    quantity = int(request.form.get('quantity', 1))
-    cart = session.get('cart', {})
-
-    key = f"{product_id}:{size}"
-    if key not in cart:
-        cart[key] = {'qty': 0}
-    cart[key]['qty'] += quantity
-    session['cart'] = cart
-
+    line = cart_line_from(request.form)
+    if line and line[1] > 0:
+        cart_store.add(current_cart_id(create=True), *line)
     return redirect(url_for('cart'))
 
 
@@ -293,41 +778,60 @@ def add_to_cart():
 def update_cart():
     pid = request.form.get("product_id")
     size = request.form.get("size", "small")
-    action = request.form.get("action")
-    key = f"{pid}:{size}"
-    cart = session.get("cart", {})
-    if key in cart:
-        if action == "increase":
-            cart[key]["qty"] += 1
-        elif action == "decrease":
-            cart[key]["qty"] = max(1, cart[key]["qty"] - 1)
-        elif action == "remove":
-            cart.pop(key, None)
-    session["cart"] = cart
+    update_cart_line(f"{pid}:{size}", request.form.get("action"))
     return redirect(url_for("cart"))
 
-@app.route("/checkout")
-def checkout():
-    cart = session.get("cart", {})
-    products = load_products_from_firestore()
-    items, total = get_cart_items_and_total(cart, products)
 
-    amount_paise = total * 100
-    try:
-        razorpay_order = razorpay_client.order.create({
-            "amount": amount_paise,
-            "currency": "INR",
-            "payment_capture": "1"
-        })
-    except:
-        razorpay_order = {"id": None}
+@app.route("/api/cart/count")
+def api_cart_count():
+    return jsonify(cart_payload(load_cart()))
+
+
+@app.route("/api/cart/add", methods=["POST"])
+def api_cart_add():
+    line = cart_line_from(request.get_json(silent=True) or request.form)
+    if not line or line[1] <= 0:
+        return jsonify({"error": "Invalid product, size or quantity."}), 400
+    cart = cart_store.add(current_cart_id(create=True), *line)
+    return jsonify(cart_payload(cart))
+
 
-    return render_template("checkout.html", cart_items=items, total=total, razorpay_order_id=razorpay_order.get("id"), razorpay_key_id=RAZORPAY_KEY_ID)
+@app.route("/api/cart/update", methods=["POST"])
+def api_cart_update():
+    data = request.get_json(silent=True) or request.form
+    line = cart_line_from(data)
+    if not line:
+        return jsonify({"error": "Invalid product, size or quantity."}), 400
+    action = data.get("action")
+    if action:
+        cart = update_cart_line(line[0], action)
+    else:
+        cart_id = current_cart_id(create=True)
+        cart = cart_store.set_qty(cart_id, *line)
+    return jsonify(cart_payload(cart, priced=True))
+
+
+@app.route("/api/cart/remove", methods=["POST"])
+def api_cart_remove():
+    line = cart_line_from(request.get_json(silent=True) or request.form)
+    if not line:
+        return jsonify({"error": "Invalid product or size."}), 400
+    return jsonify(cart_payload(update_cart_line(line[0], "remove"), priced=True))
+
+@app.route("/checkout")
+def checkout():
+    cart = load_cart()
+    cached_order = checkout_orders.cached(session)
+    # Pricing reads products while Razorpay confirms the session's order is still payable
+    (items, total), remote_order = fanout.gather(lambda: price_session_cart(cart),
+                                                 lambda: checkout_orders.fetch(cached_order))
+    razorpay_order_id = checkout_orders.order_id_for(session, items, total, remote=remote_order)
+    return render_template("checkout.html", cart_items=items, total=total, razorpay_order_id=razorpay_order_id, razorpay_key_id=RAZORPAY_KEY_ID)
 
 @app.route("/process_order", methods=["POST"])
 def process_order():
     try:
-        cart = session.get("cart")
+        cart = load_cart()
         if not cart:
             flash("Your cart is empty.")
             return redirect(url_for("shop"))
@@ -346,13 +850,16 @@ def process_order():
             'razorpay_payment_id': payment_id,
             'razorpay_signature': signature
         }
+        from razorpay.errors import SignatureVerificationError
         try:
             razorpay_client.utility.verify_payment_signature(params_dict)
-        except razorpay.errors.SignatureVerificationError:
+        except SignatureVerificationError:
             flash("Payment verification failed")
             return redirect(url_for("checkout"))
+        # This order is paid now, so checkout must never offer it again
+        checkout_orders.forget(session)
         
-        products = load_products_from_firestore()
+        items, total_amount = price_session_cart(cart)
         order_data = {
             "name": request.form.get("name"),
             "mobile": request.form.get("mobile"),
@@ -366,39 +873,22 @@ def process_order():
             "timestamp": datetime.utcnow()
         }
 
-        # Fill order items
-        total_amount = 0
-        for key, data in cart.items():
-            try:
-                pid, size = key.split(":")
-                qty = data.get("qty", 0)
-                product = next((p for p in products if str(p["id"]) == pid), None)
-                if not product:
-                    continue
-                price = money_to_int(product.get(f"price_{size}", "0"))
-                subtotal = price * qty
-                total_amount += subtotal
-                order_data["items"].append({
-                    "product_id": product["id"],
-                    "name": product["name"],
-                    "img": product.get("imgs", [""])[0],
-                    "size": size,
-                    "price": price,
-                    "quantity": qty,
-                    "subtotal": subtotal
-                })
-            except:
-                continue
+        # Fill order items from the same pricing the cart page shows
+        order_data["items"] = [{
+            "product_id": item["id"],
+            "name": item["name"],
+            "img": item["img"],
+            "size": item["size"],
+            "price": item["price"],
+            "quantity": item["qty"],
+            "subtotal": item["subtotal"]
+        } for item in items]
         order_data["total"] = total_amount
 
-        # Save order to Firestore
-        if db:
-            db.collection("orders").add(order_data)
-            logger.info("Order saved in Firestore")
-        else:
-            logger.warning("Firestore not initialized, order not saved")
+        # Journal the paid order locally; the background writer saves it to Firestore
+        save_order(order_data)
 
-        session.pop("cart", None)
+        cart_store.clear(current_cart_id())
         return render_template("order_success.html", order_items=order_data["items"], total=order_data["total"])
 
     except Exception as e:
@@ -410,10 +900,6 @@ def process_order():
 
 @app.route("/process_contact", methods=["POST"])
 def process_contact():
-    if db is None:
-        flash("⚠️ Firestore is not initialized.", "danger")
-        return redirect(url_for("contact"))
-
     name = request.form.get("name")
     email = request.form.get("email")
     mobile = request.form.get("mobile")
@@ -425,7 +911,7 @@ def process_contact():
         return redirect(url_for("contact"))
 
     try:
-        db.collection("contacts").add({
+        write_queue.enqueue("contact", {
             "name": name,
             "email": email,
             "mobile": mobile,
@@ -444,128 +930,94 @@ def process_contact():
 
 @app.route("/submit-review", methods=["POST"])
 def submit_review():
-    if not db:
-        flash("Database not initialized", "danger")
-        return redirect(url_for("home"))
     name = request.form.get("name")
     review_text = request.form.get("review")
     rating = request.form.get("rating")
     try:
-        db.collection("reviews").add({
+        write_queue.enqueue("review", {
             "customer_name": name,
             "review_text": review_text,
             "rating": int(rating),
             "timestamp": datetime.utcnow()
         })
         flash("Review submitted.")
-    except:
+    except Exception as e:
+        logger.error(f"Failed to save review: {e}")
         flash("Failed to submit review.")
     return redirect(url_for("home"))
-from datetime import datetime
 
-@app.context_processor
-def inject_now():
-    return {'now': datetime.utcnow}
+@app.cli.command("rebuild-review-stats")
+def rebuild_review_stats():
+    """Recount the reviews aggregate document from the reviews collection."""
+    if not db:
+        raise SystemExit("Firestore is not initialized.")
+    stats = review_feed.rebuild_stats()
+    print(f"Rebuilt review stats: {stats['count']} reviews, average {stats['average']}")
 
 
 @app.route("/cancellation-refund")
+@cached_page(enabled=page_cache_enabled)
 def cancellation_refund():
     return render_template("cancellation_refund.html")
 
 
 @app.route("/privacy-policy")
+@cached_page(enabled=page_cache_enabled)
 def privacy_policy():
     return render_template("privacy_policy.html")
 
 
 
 @app.route("/terms-conditions")
+@cached_page(enabled=page_cache_enabled)
 def terms_conditions():
     return render_template("terms_conditions.html")
 
 @app.route("/shipping-policy")
+@cached_page(enabled=page_cache_enabled)
 def shipping_policy():
     return render_template("shipping_policy.html")
 
 
 # ----------- Admin Panel -----------
 
-@app.route("/secret-admin", methods=["GET", "POST"])
-def secret_admin():
-    products = load_products_from_firestore()
+product_writer = ProductWriter(lambda: db if db else None)
 
-    def upload_image_and_save_to_firestore(file_storage, product_id):
-        try:
-            file_storage.seek(0)
-            img_bytes = file_storage.read()
-            encoded_image = base64.b64encode(img_bytes).decode('utf-8')
-            url = "https://api.imgbb.com/1/upload"
-            payload = {
-                "key": "49c929b174cd1008c4379f46285ac846",
-                "image": encoded_image,
-                "name": file_storage.filename,
-                "expiration": "0"  # no auto-delete
-            }
-            headers = {
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
-            response = requests.post(url, data=payload, headers=headers)
-            result = response.json()
-            if response.status_code == 200 and result.get("success"):
-                direct_url = result["data"]["url"]
-                if direct_url:
-                    if db and product_id is not None:
-                        product_ref = db.collection("products").document(str(product_id))
-                        product_doc = product_ref.get()
-                        if product_doc.exists:
-                            product_data = product_doc.to_dict()
-                            imgs = product_data.get("imgs", [])
-                            if isinstance(imgs, str):
-                                imgs = [imgs]
-                            imgs.append(direct_url)
-                            try:
-                                product_ref.update({"imgs": imgs})
-                                logger.info(f"Image URL saved to Firestore for product {product_id}")
-                            except Exception as e:
-                                logger.error(f"Error updating Firestore product images: {e}")
-                        else:
-                            try:
-                                product_ref.set({"imgs": [direct_url]})
-                                logger.info(f"Firestore product document created with image for product {product_id}")
-                            except Exception as e:
-                                logger.error(f"Error creating Firestore product document: {e}")
-                    return direct_url
-            logger.error(f"ImgBB upload failed or invalid direct_url: {result}")
-            return None
-        except Exception as e:
-            logger.error(f"Exception during ImgBB upload and Firestore save: {e}")
-            return None
+def form_revision() -> datetime | None:
+    """The ``update_time`` the submitted form was rendered from, if any."""
+    try:
+        return datetime.fromisoformat(request.form.get("revision", ""))
+    except ValueError:
+        return None
 
+@app.route("/secret-admin", methods=["GET", "POST"])
+def secret_admin():
     if request.method == "POST":
         action = request.form.get("action")
 
         if action == "add":
-            files = request.files.getlist("img_file")
-            img_urls = []
-            for f in files:
-                if f and f.filename and allowed_file(f.filename):
-                    url = upload_file_to_imgbb(f)
-                    if url:
-                        img_urls.append(url)
+            img_urls, img_variants = upload_images(request.files.getlist("img_file"))
 
             features = request.form.get("features", "")
             features_list = [f.strip() for f in features.split(",") if f.strip()]
-            new_id = max([p.get("id", 0) for p in products], default=0) + 1
+            try:
+                new_id = product_ids.reserve(1)[0]
+            except Exception as e:
+                logger.error(f"Could not reserve a product ID: {e}")
+                flash("Failed to add product.", "danger")
+                return redirect(url_for("secret_admin"))
 
             new_product = {
                 "id": new_id,
                 "imgs": img_urls,
+                "img_variants": img_variants,
                 "name": request.form.get("name"),
                 "desc": request.form.get("desc"),
                 "price_small": request.form.get("price_small"),
                 "price_medium": request.form.get("price_medium"),
                 "price_large": request.form.get("price_large"),
                 "features": features_list,
+                "updated_at": datetime.utcnow(),
             }
             try:
                 db.collection("products").document(str(new_id)).set(new_product)
@@ -574,6 +1026,7 @@ def secret_admin():
             except Exception as e:
                 logger.error(f"Could not save product to Firestore: {e}")
                 flash("Failed to add product.", "danger")
+            invalidate_catalog(new_id)
             return redirect(url_for("secret_admin"))
 
         elif action == "update":
@@ -582,37 +1035,29 @@ def secret_admin():
             except (ValueError, TypeError):
                 flash("Invalid product ID.", "danger")
                 return redirect(url_for("secret_admin"))
-            product = next((p for p in products if p.get("id") == pid), None)
-            if not product:
-                flash("Product not found.", "danger")
-                return redirect(url_for("secret_admin"))
-            product["name"] = request.form.get("name")
-            product["desc"] = request.form.get("desc")
-            product["price_small"] = request.form.get("price_small")
-            product["price_medium"] = request.form.get("price_medium")
-            product["price_large"] = request.form.get("price_large")
             features = request.form.get("features", "")
-            product["features"] = [f.strip() for f in features.split(",") if f.strip()]
-            files = request.files.getlist("img_file")
-            img_urls = []
-            for f in files:
-                if f and f.filename and allowed_file(f.filename):
-                    url = upload_image_and_save_to_firestore(f, pid)
-                    if url:
-                        img_urls.append(url)
-            imgs = product.get("imgs") or []
-            if isinstance(imgs, str):
-                imgs = [imgs]
-            if img_urls:
-                imgs.extend(img_urls)
-            product["imgs"] = imgs
+            fields = {
+                "name": request.form.get("name"),
+                "desc": request.form.get("desc"),
+                "price_small": request.form.get("price_small"),
+                "price_medium": request.form.get("price_medium"),
+                "price_large": request.form.get("price_large"),
+                "features": [f.strip() for f in features.split(",") if f.strip()],
+            }
+            img_urls, img_variants = upload_images(request.files.getlist("img_file"))
             try:
-                db.collection("products").document(str(pid)).set(product)
+                product_writer.update(pid, fields, img_urls, img_variants, expected=form_revision(),
+                                      current=get_product(pid) if img_urls else None)
                 logger.info("Product updated in Firestore")
                 flash("Product updated successfully.", "success")
+            except ProductNotFound:
+                flash("Product not found.", "danger")
+            except ProductConflict:
+                flash("This product was changed by someone else. Review the latest version and save again.", "warning")
             except Exception as e:
                 logger.error(f"Could not update product in Firestore: {e}")
                 flash("Failed to update product.", "danger")
+            invalidate_catalog(pid)
             return redirect(url_for("secret_admin"))
 
         elif action == "delete":
@@ -622,12 +1067,15 @@ def secret_admin():
                 flash("Invalid product ID.", "danger")
                 return redirect(url_for("secret_admin"))
             try:
-                db.collection("products").document(str(pid)).delete()
+                product_writer.delete(pid, expected=form_revision())
                 logger.info("Product deleted from Firestore")
                 flash("Product deleted successfully.", "success")
+            except ProductConflict:
+                flash("This product was changed by someone else since you loaded the page; it was not deleted.", "warning")
             except Exception as e:
                 logger.error(f"Could not delete product from Firestore: {e}")
                 flash("Failed to delete product.", "danger")
+            invalidate_catalog(pid)
             return redirect(url_for("secret_admin"))
 
         elif action == "remove_image":
@@ -637,16 +1085,17 @@ def secret_admin():
                 flash("Invalid product ID.", "danger")
                 return redirect(url_for("secret_admin"))
             img_url = request.form.get("img_url")
-            product = next((p for p in products if p.get("id") == pid), None)
-            if product and img_url in product.get("imgs", []):
-                product["imgs"] = [img for img in product.get("imgs", []) if img != img_url]
+            if img_url:
                 try:
-                    db.collection("products").document(str(pid)).set(product)
-                    logger.info("Product image removed and product updated in Firestore")
+                    product_writer.remove_image(pid, img_url, current=get_product(pid))
+                    logger.info("Product image removed in Firestore")
                     flash("Image removed successfully.", "success")
+                except ProductNotFound:
+                    flash("Image or product not found.", "danger")
                 except Exception as e:
                     logger.error(f"Could not update product image in Firestore: {e}")
                     flash("Failed to remove image.", "danger")
+                invalidate_catalog(pid)
             else:
                 flash("Image or product not found.", "danger")
             return redirect(url_for("secret_admin"))
@@ -658,41 +1107,255 @@ def secret_admin():
                 flash("Invalid product ID.", "danger")
                 return redirect(url_for("secret_admin"))
             img_url = request.form.get("img_url")
-            product = next((p for p in products if p.get("id") == pid), None)
+            product = get_product(pid)
             if not product:
                 flash("Product not found for image replacement.", "danger")
                 return redirect(url_for("secret_admin"))
             files = request.files.getlist("replace_img")
             if files and files[0] and files[0].filename and allowed_file(files[0].filename):
-                new_img_url = upload_image_and_save_to_firestore(files[0], pid)
+                new_img_url = image_uploader.upload(files[0]).url
                 if new_img_url:
-                    imgs = product.get("imgs") or []
-                    if isinstance(imgs, str):
-                        imgs = [imgs]
-                    if img_url in imgs:
-                        idx = imgs.index(img_url)
-                        imgs[idx] = new_img_url
-                        product["imgs"] = imgs
-                        try:
-                            db.collection("products").document(str(pid)).set(product)
+                    variants = image_processor.build_variants([(new_img_url, files[0])]) if IMAGE_DERIVATIVES else []
+                    try:
+                        if product_writer.replace_image(pid, img_url, new_img_url, variants, current=product):
                             logger.info("Product image replaced and updated in Firestore")
                             flash("Image replaced successfully.", "success")
-                        except Exception as e:
-                            logger.error(f"Could not update replaced image in Firestore: {e}")
-                            flash("Failed to update image.", "danger")
+                        else:
+                            flash("Image or product not found.", "danger")
+                    except ProductNotFound:
+                        flash("Product not found for image replacement.", "danger")
+                    except Exception as e:
+                        logger.error(f"Could not update replaced image in Firestore: {e}")
+                        flash("Failed to update image.", "danger")
                 else:
                     flash("Failed to upload replacement image.", "danger")
+                invalidate_catalog(pid)
             else:
                 flash("No replacement image selected.", "warning")
             return redirect(url_for("secret_admin"))
 
-    return render_template("admin_panel.html", products=products)
+        elif action == "import":
+            upload = request.files.get("import_file")
+            if not upload or not upload.filename:
+                flash("Choose a CSV or JSON file to import.", "warning")
+                return redirect(url_for("secret_admin"))
+            try:
+                report = catalog_importer.run(read_import_rows(upload.stream, upload.filename),
+                                              skip_invalid=bool(request.form.get("skip_invalid")))
+            except ImportFileError as e:
+                flash(f"Import failed: {e}", "danger")
+                return redirect(url_for("secret_admin"))
+            except Exception as e:
+                logger.error(f"Catalog import failed: {e}")
+                flash("Import failed.", "danger")
+                return redirect(url_for("secret_admin"))
+            if report["written"]:
+                invalidate_catalog()
+            flash(import_summary(report), "danger" if report["error"] or not report["written"] else "success")
+            return redirect(url_for("secret_admin"))
 
+    # Read straight from Firestore so each form carries the revision it edits;
+    # the dashboard's counters are independent of it
+    products, sales = fanout.gather(load_products_from_firestore, sales_aggregates.dashboard,
+                                    return_exceptions=True)
+    if isinstance(sales, Exception):
+        logger.error(f"Error loading sales dashboard: {sales}")
+        sales = None
+    names = {p.get("id"): p.get("name") for p in products}
+    return render_template("admin_panel.html", products=products, sales=sales, product_names=names)
 
+# ---------------------------------------------------------------------
+# Bulk Import / Export
+# ---------------------------------------------------------------------
+product_ids = ProductIdAllocator(lambda: db if db else None)
+catalog_importer = CatalogImporter(lambda: db if db else None, product_ids, image_uploader)
+EXPORT_FORMATS = {"csv": ("text/csv", iter_export_csv), "json": ("application/json", iter_export_json)}
+
+def import_summary(report: Dict[str, Any], max_errors: int = 5) -> str:
+    # The admin page shows one flash message, so everything goes into it
+    parts = []
+    if report["errors"] and not report["written"]:
+        parts.append(f"Nothing imported: {len(report['errors'])} invalid rows of {report['rows']}.")
+    else:
+        parts.append(f"Imported {report['written']} of {report['rows']} rows ({report['created']} new, "
+                     f"{report['updated']} updated) in {report['batches']} batches.")
+    if report["images_uploaded"] or report["images_failed"]:
+        parts.append(f"Re-hosted {report['images_uploaded']} images, {report['images_failed']} kept as linked.")
+    if report["error"]:
+        parts.append(f"Stopped early: {report['error']}")
+    if report["errors"] and max_errors:
+        shown = "; ".join(str(e) for e in report["errors"][:max_errors])
+        more = len(report["errors"]) - max_errors
+        parts.append(f"Errors: {shown}" + (f" (and {more} more)" if more > 0 else ""))
+    return " ".join(parts)
+
+@app.route("/secret-admin/export.<fmt>")
+def export_catalog(fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    if not db:
+        abort(503)
+    mimetype, render = EXPORT_FORMATS[fmt]
+    filename = f"wallcraft-catalog-{datetime.utcnow():%Y%m%d}.{fmt}"
+    response = Response(stream_with_context(render(stream_products(db))), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    response.cache_control.no_store = True
+    return response
+
+@app.cli.command("import-catalog")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--skip-invalid", is_flag=True, help="Import the valid rows even if some rows are invalid.")
+@click.option("--dry-run", is_flag=True, help="Only validate the file.")
+@click.option("--no-rehost", is_flag=True, help="Keep image URLs as they are instead of uploading them to ImgBB.")
+def import_catalog_command(path, skip_invalid, dry_run, no_rehost):
+    """Create or update products from a CSV or JSON file."""
+    if not db and not dry_run:
+        raise SystemExit("Firestore is not initialized.")
+    with open(path, "rb") as f:
+        try:
+            rows = list(read_import_rows(f, path))
+        except ImportFileError as e:
+            raise SystemExit(f"Cannot read {path}: {e}")
+    report = catalog_importer.run(rows, skip_invalid=skip_invalid, dry_run=dry_run, rehost=not no_rehost,
+                                  on_progress=lambda done, total: print(f"  wrote {done}/{total}"))
+    for error in report["errors"]:
+        print(f"  {error}")
+    if dry_run:
+        print(f"{report['valid']} of {report['rows']} rows are valid")
+        return
+    if report["written"]:
+        invalidate_catalog()
+    print(import_summary(report, max_errors=0))
+    if report["error"] or (report["errors"] and not skip_invalid):
+        raise SystemExit(1)
+
+@app.cli.command("export-catalog")
+@click.option("--format", "fmt", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv")
+@click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-")
+def export_catalog_command(fmt, output):
+    """Write every product as CSV or JSON (to stdout by default)."""
+    if not db:
+        raise SystemExit("Firestore is not initialized.")
+    for chunk in EXPORT_FORMATS[fmt][1](stream_products(db)):
+        output.write(chunk)
+
+# ---------------------------------------------------------------------
+# Sitemap & Product Feed
+# ---------------------------------------------------------------------
+FEED_FORMATS = {"csv": ("text/csv", iter_feed_csv), "xml": ("application/xml", iter_feed_xml)}
+SITEMAP_PAGES = ("home", "shop", "about", "contact", "cancellation_refund", "privacy_policy",
+                 "terms_conditions", "shipping_policy")
+FEED_MAX_AGE = int(os.environ.get("FEED_MAX_AGE_SECONDS", "3600"))
+feed_cache = FeedCache(max_bytes=int(os.environ.get("FEED_CACHE_MAX_BYTES", str(8 * 1024 * 1024))))
+
+def product_link(product_id: int) -> str:
+    return url_for("product_detail", product_id=product_id, _external=True)
+
+def render_feed(kind: str, products: List[Dict[str, Any]]):
+    # Must run inside a request context: links are built from its host
+    if kind == "sitemap":
+        pages = [url_for(endpoint, _external=True) for endpoint in SITEMAP_PAGES]
+        return iter_sitemap(products, product_link, pages)
+    return FEED_FORMATS[kind][1](products, product_link, request.host_url)
+
+def feed_response(kind: str, mimetype: str) -> Response:
+    products = get_catalog_index().products
+    fingerprint, last_modified = feed_cache.validators(products)
+    body = feed_cache.stream((kind, request.host_url), products, lambda: render_feed(kind, products))
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.set_etag(feed_etag(kind, fingerprint, request.host_url))
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = FEED_MAX_AGE
+    return response.make_conditional(request)
+
+@app.route("/sitemap.xml")
+def sitemap():
+    return feed_response("sitemap", "application/xml")
+
+@app.route("/feed.<fmt>")
+def product_feed(fmt):
+    if fmt not in FEED_FORMATS:
+        abort(404)
+    return feed_response(fmt, FEED_FORMATS[fmt][0])
+
+@app.cli.command("export-feed")
+@click.option("--format", "fmt", type=click.Choice(sorted(FEED_FORMATS) + ["sitemap"]), default="csv")
+@click.option("--base-url", required=True, help="Public site URL the links point at, e.g. https://example.com/")
+@click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-")
+def export_feed_command(fmt, base_url, output):
+    """Write the product feed (CSV or XML) or the sitemap (to stdout by default)."""
+    if not db:
+        raise SystemExit("Firestore is not initialized.")
+    products = get_catalog_index().products
+    with app.test_request_context("/", base_url=base_url):
+        for chunk in render_feed(fmt, products):
+            output.write(chunk)
+
+
+
+
+@app.cli.command("backfill-image-variants")
+@click.option("--static", "static_only", is_flag=True, help="Only rebuild derivatives of public/images.")
+def backfill_image_variants(static_only):
+    """Generate thumbnail/card/detail derivatives for existing images."""
+    if not imaging_available():
+        raise SystemExit("Pillow is not installed.")
+    images_dir = os.path.join(app.static_folder, "images")
+    static_files = [f"images/{name}" for name in sorted(os.listdir(images_dir))
+                    if os.path.isfile(os.path.join(images_dir, name)) and allowed_file(name)]
+    written = build_static_derivatives(app.static_folder, static_files)
+    print(f"Wrote {len(written)} static derivatives")
+    if static_only:
+        return
+    if not db:
+        raise SystemExit("Firestore is not initialized.")
+    for product in load_products_from_firestore():
+        imgs = product.get("imgs") or []
+        if isinstance(imgs, str):
+            imgs = [imgs]
+        variants = [v for v in product.get("img_variants") or [] if v.get("src") in imgs]
+        done = {v["src"] for v in variants}
+        added = 0
+        for url in imgs:
+            if url in done:
+                continue
+            variant = image_processor.fetch_and_build(url)
+            if variant:
+                variants.append(variant)
+                added += 1
+        if added:
+            db.collection("products").document(str(product["id"])).update({"img_variants": variants})
+            print(f"Product {product['id']}: {added} image(s) processed")
+    invalidate_catalog()
 
 
 # ---------------------------------------------------------------------
-# Run App
+# App Factory
 # ---------------------------------------------------------------------
+def warm_up() -> None:
+    """Pay one-off import and template compile costs before workers fork.
+
+    Nothing that opens sockets or starts threads is created here; Firestore,
+    Razorpay and the HTTP session are still built lazily inside each worker.
+    """
+    started = time.perf_counter()
+    import firebase_admin.firestore  # noqa: F401
+    import razorpay  # noqa: F401
+    import requests  # noqa: F401
+    for name in app.jinja_env.list_templates(extensions=("html",)):
+        app.jinja_env.get_template(name)
+    logger.info(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+def create_app(warm: bool | None = None) -> Flask:
+    """Return the configured app; set PREFORK_WARMUP=1 to warm it before forking."""
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    if warm is None:
+        warm = os.environ.get("PREFORK_WARMUP", "0") == "1"
+    if warm:
+        warm_up()
+    return app
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    create_app().run(host="0.0.0.0", port=5000)
@@ -0,0 +1,79 @@
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("wallcraft")
+
+IMMUTABLE_MAX_AGE = 31536000
+HASH_LENGTH = 12
+
+
+class AssetVersions:
+    """Content hashes for files under the static folder.
+
+    Hashes are memoized per (mtime, size), so a redeployed file gets a new
+    fingerprint without restarting the worker.
+    """
+
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, Tuple[float, int, str]] = {}
+
+    def _path(self, filename: str) -> Optional[str]:
+        path = os.path.normpath(os.path.join(self.static_folder, filename))
+        if not path.startswith(os.path.normpath(self.static_folder) + os.sep):
+            return None
+        return path
+
+    def hash_for(self, filename: str) -> Optional[str]:
+        path = self._path(filename)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._hashes.get(filename)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        version = digest.hexdigest()[:HASH_LENGTH]
+        with self._lock:
+            self._hashes[filename] = (stat.st_mtime, stat.st_size, version)
+        return version
+
+    def is_current(self, filename: str, version: Optional[str]) -> bool:
+        return bool(version) and version == self.hash_for(filename)
+
+
+def product_version(product: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not product:
+        return None
+    updated = product.get("updated_at")
+    if isinstance(updated, datetime):
+        return str(int(updated.timestamp()))
+    if updated:
+        return str(updated)
+    return None
+
+
+def append_version(url: str, version: Optional[str]) -> str:
+    if not url or not version:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}v={version}"
+
+
+def mark_immutable(response) -> None:
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    response.cache_control.no_cache = None
@@ -0,0 +1,510 @@
+"""In-process stand-ins for Firestore, ImgBB and Razorpay.
+
+Each fake sleeps for a configurable latency per round trip (plus a small
+per-document cost for reads) so the benchmark sees the same shape of
+work the real services impose, without touching the network.
+"""
+import copy
+import itertools
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import _helpers, transforms
+
+from uploads import UploadResult
+
+
+# ---------------------------------------------------------------------
+# Firestore
+# ---------------------------------------------------------------------
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocument", data: Optional[Dict[str, Any]],
+                 update_time: Optional[datetime] = None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+        self.create_time = update_time
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        value = self._data
+        for part in field.split("."):
+            value = (value or {}).get(part)
+        return copy.deepcopy(value)
+
+
+def _apply_value(current, value):
+    if isinstance(value, transforms.Increment):
+        return (current or 0) + value.value
+    if isinstance(value, transforms.Maximum):
+        return value.value if current is None else max(current, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        current = list(current or [])
+        return current + [v for v in value.values if v not in current]
+    if isinstance(value, transforms.ArrayRemove):
+        return [v for v in (current or []) if v not in value.values]
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.utcnow()
+    return copy.deepcopy(value)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict):
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = target[key] = {}
+            _merge(child, value)
+        else:
+            target[key] = _apply_value(target.get(key), value)
+
+
+def _strip_transforms(data: Dict[str, Any]) -> Dict[str, Any]:
+    # set() without merge still applies transforms, starting from empty fields
+    result: Dict[str, Any] = {}
+    _merge(result, data)
+    return result
+
+
+class FakeDocument:
+    def __init__(self, client: "FakeFirestore", collection: str, doc_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocument) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def get(self, transaction=None, field_paths=None) -> FakeSnapshot:
+        self._client._round_trip(reads=1)
+        return self._client._snapshot(self)
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        self._client._round_trip(writes=1)
+        self._client._write(self, data, merge=merge)
+
+    def create(self, data: Dict[str, Any]):
+        self._client._round_trip(writes=1)
+        if self._client._read(self) is not None:
+            raise exceptions.AlreadyExists(f"Document {self.path} already exists")
+        self._client._write(self, data)
+
+    def update(self, data: Dict[str, Any], option=None):
+        self._client._round_trip(writes=1)
+        self._client._update(self, data, option)
+
+    def delete(self, option=None):
+        self._client._round_trip(writes=1)
+        self._client._delete(self, option)
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeFirestore", collection: str, orders=(), filters=(),
+                 limit: Optional[int] = None, after: Optional[Dict[str, Any]] = None):
+        self._client = client
+        self._collection = collection
+        self._orders = tuple(orders)
+        self._filters = tuple(filters)
+        self._limit = limit
+        self._after = after
+
+    def _copy(self, **changes) -> "FakeQuery":
+        values = dict(orders=self._orders, filters=self._filters, limit=self._limit, after=self._after)
+        values.update(changes)
+        return FakeQuery(self._client, self._collection, **values)
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def where(self, field: str = None, op: str = None, value=None, filter=None) -> "FakeQuery":
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def start_after(self, position: Dict[str, Any]) -> "FakeQuery":
+        return self._copy(after=dict(position))
+
+    def select(self, field_paths: Iterable[str]) -> "FakeQuery":
+        return self
+
+    def stream(self, transaction=None):
+        docs = self._client._query(self)
+        self._client._round_trip(reads=max(1, len(docs)))
+        return iter(docs)
+
+    def get(self, transaction=None) -> List[FakeSnapshot]:
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        raise NotImplementedError("listeners are not simulated")
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client: "FakeFirestore", name: str):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocument:
+        return FakeDocument(self._client, self._collection, doc_id or secrets.token_hex(10))
+
+    def add(self, data: Dict[str, Any]):
+        ref = self.document()
+        ref.set(data)
+        return datetime.utcnow(), ref
+
+    def list_documents(self):
+        return [self.document(doc_id) for doc_id in self._client._ids(self._collection)]
+
+
+class FakeBatch:
+    def __init__(self, client: "FakeFirestore"):
+        self._client = client
+        self._ops: List[tuple] = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False):
+        self._ops.append(("set", ref, data, merge))
+        return self
+
+    def create(self, ref: FakeDocument, data: Dict[str, Any]):
+        self._ops.append(("create", ref, data, None))
+        return self
+
+    def update(self, ref: FakeDocument, data: Dict[str, Any], option=None):
+        self._ops.append(("update", ref, data, option))
+        return self
+
+    def delete(self, ref: FakeDocument, option=None):
+        self._ops.append(("delete", ref, None, option))
+        return self
+
+    def commit(self):
+        self._client._round_trip(writes=len(self._ops))
+        with self._client._lock:
+            # Like Firestore, a create of an existing document fails the whole commit
+            for op, ref, data, extra in self._ops:
+                if op == "create" and self._client._read(ref) is not None:
+                    self._ops = []
+                    raise exceptions.AlreadyExists(f"Document {ref.path} already exists")
+            for op, ref, data, extra in self._ops:
+                if op in ("set", "create"):
+                    self._client._write(ref, data, merge=extra)
+                elif op == "update":
+                    self._client._update(ref, data, extra)
+                else:
+                    self._client._delete(ref, extra)
+        self._ops = []
+
+
+class FakeTransaction(FakeBatch):
+    """Enough of ``Transaction`` for ``firestore.transactional``; writes apply at commit."""
+
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, client: "FakeFirestore"):
+        super().__init__(client)
+        self._id = None
+
+    def _clean_up(self) -> None:
+        self._ops = []
+        self._id = None
+
+    def _begin(self, retry_id=None) -> None:
+        self._client._round_trip()
+        self._id = secrets.token_bytes(8)
+
+    def _commit(self):
+        self.commit()
+        self._clean_up()
+
+    def _rollback(self) -> None:
+        self._clean_up()
+
+
+def _sort_key(value):
+    # None sorts first, as in Firestore's type ordering
+    return (value is not None, value)
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: b in (a or []),
+}
+
+
+class FakeFirestore:
+    """Dict-backed Firestore with the subset of the API this app uses."""
+
+    def __init__(self, latency: float = 0.02, per_doc_latency: float = 0.00005, jitter: float = 0.2):
+        self.latency = latency
+        self.per_doc_latency = per_doc_latency
+        self.jitter = jitter
+        self._lock = threading.RLock()
+        self._data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._times: Dict[str, datetime] = {}
+        self.stats = {"round_trips": 0, "reads": 0, "writes": 0}
+
+    # Public client API
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def transaction(self) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    @staticmethod
+    def write_option(**kwargs):
+        return _helpers.LastUpdateOption(kwargs["last_update_time"])
+
+    def get_all(self, refs: Iterable[FakeDocument], field_paths=None, transaction=None):
+        refs = list(refs)
+        self._round_trip(reads=len(refs))
+        return iter([self._snapshot(ref) for ref in refs])
+
+    # Internals
+    def _round_trip(self, reads: int = 0, writes: int = 0) -> None:
+        with self._lock:
+            self.stats["round_trips"] += 1
+            self.stats["reads"] += reads
+            self.stats["writes"] += writes
+        delay = self.latency * (1 + random.uniform(-self.jitter, self.jitter)) + reads * self.per_doc_latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def _read(self, ref: FakeDocument) -> Optional[Dict[str, Any]]:
+        return self._data.get(ref._collection, {}).get(ref.id)
+
+    def _snapshot(self, ref: FakeDocument) -> FakeSnapshot:
+        with self._lock:
+            return FakeSnapshot(ref, self._read(ref), self._times.get(ref.path))
+
+    def _write(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
+        with self._lock:
+            docs = self._data.setdefault(ref._collection, {})
+            if merge and ref.id in docs:
+                _merge(docs[ref.id], data)
+            else:
+                docs[ref.id] = _strip_transforms(data)
+            self._times[ref.path] = datetime.utcnow()
+
+    def _check(self, ref: FakeDocument, option) -> None:
+        if isinstance(option, _helpers.LastUpdateOption) and self._times.get(ref.path) != option._last_update_time:
+            raise exceptions.FailedPrecondition(f"{ref.path} was updated since {option._last_update_time}")
+
+    def _update(self, ref: FakeDocument, data: Dict[str, Any], option=None) -> None:
+        with self._lock:
+            self._check(ref, option)
+            current = self._read(ref)
+            if current is None:
+                raise exceptions.NotFound(f"No document to update: {ref.path}")
+            for path, value in data.items():
+                *parents, leaf = path.split(".")
+                target = current
+                for part in parents:
+                    target = target.setdefault(part, {})
+                if value is transforms.DELETE_FIELD:
+                    target.pop(leaf, None)
+                else:
+                    target[leaf] = _apply_value(target.get(leaf), value)
+            self._times[ref.path] = datetime.utcnow()
+
+    def _delete(self, ref: FakeDocument, option=None) -> None:
+        with self._lock:
+            self._check(ref, option)
+            self._data.get(ref._collection, {}).pop(ref.id, None)
+            self._times.pop(ref.path, None)
+
+    def _ids(self, collection: str) -> List[str]:
+        with self._lock:
+            return list(self._data.get(collection, {}))
+
+    def _query(self, query: FakeQuery) -> List[FakeSnapshot]:
+        with self._lock:
+            items = [(doc_id, data) for doc_id, data in self._data.get(query._collection, {}).items()]
+            for field, op, value in query._filters:
+                items = [(i, d) for i, d in items if _OPS[op](d.get(field), value)]
+
+            def field_value(doc_id, data, field):
+                return doc_id if field == "__name__" else data.get(field)
+
+            # Stable multi-key sort: apply the least significant ordering first
+            for field, direction in reversed(query._orders):
+                items.sort(key=lambda item: _sort_key(field_value(*item, field)),
+                           reverse=(direction == "DESCENDING"))
+            if query._after is not None and query._orders:
+                cursor = tuple(_sort_key(query._after.get(f)) for f, _ in query._orders)
+
+                def is_after(item):
+                    for (field, direction), bound in zip(query._orders, cursor):
+                        value = _sort_key(field_value(*item, field))
+                        if value != bound:
+                            return value > bound if direction != "DESCENDING" else value < bound
+                    return False
+                items = [item for item in items if is_after(item)]
+            if query._limit is not None:
+                items = items[:query._limit]
+            return [FakeSnapshot(FakeDocument(self, query._collection, doc_id), data,
+                                 self._times.get(f"{query._collection}/{doc_id}"))
+                    for doc_id, data in items]
+
+
+# ---------------------------------------------------------------------
+# Seed Data
+# ---------------------------------------------------------------------
+_WORDS = ("oak", "maple", "walnut", "floral", "abstract", "ocean", "mountain", "vintage", "minimal",
+          "gold", "marble", "forest", "sunset", "geometric", "botanical", "canvas", "framed", "modern")
+
+
+def seed_catalog(db: FakeFirestore, size: int, images_per_product: int = 3) -> None:
+    rng = random.Random(size)
+    for pid in range(1, size + 1):
+        words = rng.sample(_WORDS, 3)
+        small = rng.randrange(299, 1999)
+        db._write(db.collection("products").document(str(pid)), {
+            "id": pid,
+            "name": " ".join(w.title() for w in words) + f" Wall Art {pid}",
+            "desc": f"A {words[0]} {words[1]} print with a {words[2]} finish. " * 3,
+            "imgs": [f"https://i.ibb.co/fake/{pid}-{n}.jpg" for n in range(images_per_product)],
+            "price_small": str(small),
+            "price_medium": str(small + 400),
+            "price_large": str(small + 900),
+            "features": [w.title() for w in rng.sample(_WORDS, 4)],
+            "updated_at": datetime(2024, 1, 1) + timedelta(minutes=pid),
+        })
+
+
+def seed_reviews(db: FakeFirestore, count: int) -> None:
+    rng = random.Random(count)
+    histogram = {str(i): 0 for i in range(1, 6)}
+    rating_sum = 0
+    start = datetime(2024, 1, 1)
+    for n in range(count):
+        rating = rng.randint(3, 5)
+        histogram[str(rating)] += 1
+        rating_sum += rating
+        db._write(db.collection("reviews").document(f"r{n:07d}"), {
+            "customer_name": f"Customer {n}",
+            "review_text": "Lovely print, arrived well packed. " * 2,
+            "rating": rating,
+            "timestamp": start + timedelta(minutes=n),
+        })
+    db._write(db.collection("stats").document("reviews"),
+              {"count": count, "rating_sum": rating_sum, "histogram": histogram})
+
+
+def seed_orders(db: FakeFirestore, count: int, catalog_size: int) -> None:
+    rng = random.Random(count)
+    for n in range(count):
+        pid = rng.randint(1, max(1, catalog_size))
+        qty = rng.randint(1, 3)
+        db._write(db.collection("orders").document(f"order_seed{n:07d}"), {
+            "order_id": f"order_seed{n:07d}",
+            "items": [{"product_id": pid, "size": "small", "price": 999, "quantity": qty, "subtotal": 999 * qty}],
+            "total": 999 * qty,
+            "timestamp": datetime(2024, 1, 1) + timedelta(hours=n),
+        })
+
+
+# ---------------------------------------------------------------------
+# ImgBB
+# ---------------------------------------------------------------------
+class FakeUploader:
+    """Replaces ``ImageUploader``; uploads in one batch cost a single latency."""
+
+    def __init__(self, latency: float = 0.3):
+        self.latency = latency
+        self._counter = itertools.count(1)
+
+    def upload(self, file_storage) -> UploadResult:
+        return self.upload_many([file_storage])[0]
+
+    def upload_many(self, files) -> List[UploadResult]:
+        files = list(files)
+        if files and self.latency > 0:
+            time.sleep(self.latency)
+        return [UploadResult(f.filename or "image", f"https://i.ibb.co/fake/upload-{next(self._counter)}.jpg")
+                for f in files]
+
+    def upload_urls(self, urls) -> List[UploadResult]:
+        urls = list(urls)
+        if urls and self.latency > 0:
+            time.sleep(self.latency)
+        return [UploadResult(url, f"https://i.ibb.co/fake/upload-{next(self._counter)}.jpg") for url in urls]
+
+    def close(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------
+# Razorpay
+# ---------------------------------------------------------------------
+class _FakeOrders:
+    def __init__(self, parent: "FakeRazorpayClient"):
+        self._parent = parent
+        self._orders: Dict[str, Dict[str, Any]] = {}
+
+    def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        self._parent._call()
+        order = {"id": f"order_{secrets.token_hex(7)}", "amount": data.get("amount"),
+                 "currency": data.get("currency"), "status": "created"}
+        self._orders[order["id"]] = order
+        return dict(order)
+
+    def fetch(self, order_id: str) -> Dict[str, Any]:
+        self._parent._call()
+        if order_id not in self._orders:
+            raise ValueError(f"The id provided does not exist: {order_id}")
+        return dict(self._orders[order_id])
+
+
+class _FakeUtility:
+    def verify_payment_signature(self, params: Dict[str, Any]) -> bool:
+        # Every signature is accepted; the benchmark is about the order path, not crypto
+        return True
+
+
+class FakeRazorpayClient:
+    def __init__(self, latency: float = 0.15):
+        self.latency = latency
+        self.calls = 0
+        self.order = _FakeOrders(self)
+        self.utility = _FakeUtility()
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
@@ -0,0 +1,277 @@
+"""Load-test the real routes against in-process Firestore/ImgBB/Razorpay fakes.
+
+    python -m bench.run --sizes 50,500,5000 --threads 8 --requests 100
+
+Prints p50/p95/p99 latency, requests/sec and Firestore reads per request
+for every route at every catalog size, so a route whose cost grows with
+the catalog shows up as a column that climbs from one size to the next.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Never reach the real services, whatever .env says
+os.environ["FIREBASE_KEY"] = ""
+os.environ.setdefault("CATALOG_WATCH", "0")
+os.environ.setdefault("IMAGE_DERIVATIVES", "0")
+
+from bench.fakes import (FakeFirestore, FakeRazorpayClient, FakeUploader,  # noqa: E402
+                         seed_catalog, seed_orders, seed_reviews)
+
+
+class Scenario(NamedTuple):
+    name: str
+    # Unmeasured setup run before every request, e.g. filling the cart
+    prepare: Optional[Callable[[Any, random.Random, int], None]]
+    request: Callable[[Any, random.Random, int], Any]
+    ok_statuses: tuple = (200,)
+
+
+def _fill_cart(client, rng: random.Random, catalog_size: int, lines: int = 3) -> None:
+    for _ in range(lines):
+        client.post("/api/cart/add", json={
+            "product_id": rng.randint(1, catalog_size),
+            "size": rng.choice(("small", "medium", "large")),
+            "quantity": rng.randint(1, 2),
+        })
+
+
+def build_scenarios(catalog_size: int) -> List[Scenario]:
+    def fill_once(client, rng, i):
+        if i == 0:
+            _fill_cart(client, rng, catalog_size)
+
+    def fill_every(client, rng, i):
+        _fill_cart(client, rng, catalog_size, lines=2)
+
+    def process_order(client, rng, i):
+        token = f"{threading.get_ident()}_{i}_{rng.random()}"
+        return client.post("/process_order", data={
+            "razorpay_payment_id": f"pay_{token}",
+            "razorpay_order_id": f"order_bench_{token}",
+            "razorpay_signature": "bench",
+            "name": "Bench Customer",
+            "mobile": "9999999999",
+            "email": "bench@example.com",
+            "address": "1 Benchmark Road",
+        })
+
+    def admin_update(client, rng, i):
+        pid = rng.randint(1, catalog_size)
+        return client.post("/secret-admin", data={
+            "action": "update",
+            "id": str(pid),
+            "name": f"Updated Wall Art {pid}",
+            "desc": "Updated by the benchmark.",
+            "price_small": "999",
+            "price_medium": "1399",
+            "price_large": "1899",
+            "features": "Framed, Matte",
+        })
+
+    def submit_review(client, rng, i):
+        return client.post("/submit-review", data={
+            "name": "Bench Reviewer",
+            "review": "Lovely print, arrived well packed.",
+            "rating": str(rng.randint(1, 5)),
+        })
+
+    def contact(client, rng, i):
+        return client.post("/process_contact", data={
+            "name": "Bench Customer",
+            "email": "bench@example.com",
+            "mobile": "9999999999",
+            "address": "1 Benchmark Road",
+            "message": "Do you ship abroad?",
+        })
+
+    return [
+        Scenario("home", None, lambda c, rng, i: c.get("/")),
+        Scenario("shop", None, lambda c, rng, i: c.get("/shop")),
+        Scenario("product", None, lambda c, rng, i: c.get(f"/product/{rng.randint(1, catalog_size)}")),
+        Scenario("cart", fill_once, lambda c, rng, i: c.get("/cart")),
+        Scenario("checkout", fill_once, lambda c, rng, i: c.get("/checkout")),
+        Scenario("process_order", fill_every, process_order),
+        Scenario("admin", None, lambda c, rng, i: c.get("/secret-admin")),
+        Scenario("admin_update", None, admin_update, ok_statuses=(302,)),
+        Scenario("submit_review", None, submit_review, ok_statuses=(302,)),
+        Scenario("contact", None, contact, ok_statuses=(302,)),
+        Scenario("sitemap", None, lambda c, rng, i: c.get("/sitemap.xml")),
+        Scenario("feed", None, lambda c, rng, i: c.get("/feed.csv")),
+    ]
+
+
+# ---------------------------------------------------------------------
+# Wiring
+# ---------------------------------------------------------------------
+def install_fakes(wallcraft, db: FakeFirestore, uploader: FakeUploader,
+                  razorpay_client: FakeRazorpayClient, workdir: str) -> None:
+    """Point the app's module-level services at the fakes and reset its caches."""
+    from cart_store import CartStore
+    from metrics import instrument_firestore
+    from orders import OrderJournal
+    from snapshot import CatalogSnapshot
+
+    client = instrument_firestore(db) if wallcraft.METRICS_ENABLED else db
+    wallcraft.db = client
+    wallcraft.review_feed.db = client
+    wallcraft.image_uploader = uploader
+    wallcraft.image_processor.uploader = uploader
+    wallcraft.catalog_importer.uploader = uploader
+    wallcraft.IMAGE_DERIVATIVES = False
+    wallcraft.razorpay_client = razorpay_client
+    wallcraft.checkout_orders.client = razorpay_client
+    wallcraft.order_journal = OrderJournal(os.path.join(workdir, "orders.sqlite3"))
+    wallcraft.order_writer.journal = wallcraft.order_journal
+    wallcraft.cart_store = CartStore(os.path.join(workdir, "carts.sqlite3"))
+    wallcraft.write_queue.spill_dir = os.path.join(workdir, "write_queue")
+    wallcraft.catalog_snapshot = CatalogSnapshot(os.path.join(workdir, "catalog.snapshot"))
+
+    wallcraft.catalog_cache.invalidate()
+    wallcraft.product_cache.invalidate(None)
+    wallcraft.page_cache.clear()
+    wallcraft.review_feed.invalidate()
+
+
+# ---------------------------------------------------------------------
+# Load Generator
+# ---------------------------------------------------------------------
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run_scenario(app, db: FakeFirestore, scenario: Scenario, threads: int,
+                 requests_per_thread: int, warmup: int, seed: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    # The barrier action runs once, before any worker is released, so the
+    # clock and read counter start before the first measured request
+    clock = {"started": 0.0, "reads_before": 0}
+
+    def start_clock():
+        clock["reads_before"] = db.stats["reads"]
+        clock["started"] = time.perf_counter()
+
+    barrier = threading.Barrier(threads, action=start_clock)
+
+    def worker(n: int):
+        rng = random.Random(seed * 1000 + n)
+        client = app.test_client()
+        own: List[float] = []
+        failed = 0
+        for i in range(warmup):
+            if scenario.prepare:
+                scenario.prepare(client, rng, i)
+            scenario.request(client, rng, i)
+        barrier.wait()
+        for i in range(warmup, warmup + requests_per_thread):
+            if scenario.prepare:
+                scenario.prepare(client, rng, i)
+            started = time.perf_counter()
+            response = scenario.request(client, rng, i)
+            own.append(time.perf_counter() - started)
+            if response.status_code not in scenario.ok_statuses:
+                failed += 1
+        with lock:
+            latencies.extend(own)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - clock["started"]
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "route": scenario.name,
+        "requests": total,
+        "errors": errors[0],
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        # Includes reads by unmeasured prepare steps and the order writer
+        "reads_per_request": (db.stats["reads"] - clock["reads_before"]) / total if total else 0.0,
+    }
+
+
+def print_table(size: int, rows: List[Dict[str, Any]]) -> None:
+    print(f"\ncatalog size {size}")
+    print(f"{'route':<15}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'reads/req':>11}{'errors':>8}")
+    for row in rows:
+        print(f"{row['route']:<15}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{row['reads_per_request']:>11.1f}{row['errors']:>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="50,500,5000", help="comma-separated catalog sizes")
+    parser.add_argument("--reviews", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="measured requests per thread")
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests per thread")
+    parser.add_argument("--routes", default="", help="comma-separated subset of routes")
+    parser.add_argument("--firestore-ms", type=float, default=20.0, help="latency per Firestore round trip")
+    parser.add_argument("--per-doc-us", type=float, default=50.0, help="extra latency per document read")
+    parser.add_argument("--imgbb-ms", type=float, default=300.0)
+    parser.add_argument("--razorpay-ms", type=float, default=150.0)
+    parser.add_argument("--no-page-cache", action="store_true", help="render every page")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("wallcraft").setLevel(logging.WARNING)
+    import app as wallcraft
+    if args.no_page_cache:
+        wallcraft.PAGE_CACHE_ENABLED = False
+    wanted = {r.strip() for r in args.routes.split(",") if r.strip()}
+
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    with tempfile.TemporaryDirectory(prefix="wallcraft-bench-") as workdir:
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            db = FakeFirestore(latency=args.firestore_ms / 1000.0, per_doc_latency=args.per_doc_us / 1e6)
+            seed_catalog(db, size)
+            seed_reviews(db, args.reviews)
+            seed_orders(db, args.orders, size)
+            size_dir = os.path.join(workdir, str(size))
+            os.makedirs(size_dir)
+            install_fakes(wallcraft, db, FakeUploader(args.imgbb_ms / 1000.0),
+                          FakeRazorpayClient(args.razorpay_ms / 1000.0), size_dir)
+
+            rows = []
+            for scenario in build_scenarios(size):
+                if wanted and scenario.name not in wanted:
+                    continue
+                rows.append(run_scenario(wallcraft.app, db, scenario, args.threads,
+                                         args.requests, args.warmup, args.seed))
+            results[str(size)] = rows
+            print_table(size, rows)
+        wallcraft.order_writer.drain()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
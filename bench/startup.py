@@ -0,0 +1,66 @@
+"""Measure cold-start cost the way Passenger sees it.
+
+    python -m bench.startup --runs 10 [--warm] [--path /shop]
+
+Each run starts a fresh interpreter, times ``create_app()`` (imports plus
+module-level setup) and the first request through the test client, and
+reports the median, min and max over all runs. Firestore is left
+unconfigured, so the first request pays for the deferred client imports
+but never reaches the network.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+application = create_app()
+created = time.perf_counter()
+response = application.test_client().get(sys.argv[1])
+finished = time.perf_counter()
+print(json.dumps({
+    "import_ms": (created - started) * 1000,
+    "first_request_ms": (finished - created) * 1000,
+    "status": response.status_code,
+}))
+"""
+
+
+def run_once(path: str, warm: bool) -> Dict[str, float]:
+    env = dict(os.environ, FIREBASE_KEY="", CATALOG_WATCH="0", PREFORK_WARMUP="1" if warm else "0")
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, path], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--warm", action="store_true", help="run the pre-fork warm-up in create_app()")
+    args = parser.parse_args(argv)
+
+    runs = [run_once(args.path, args.warm) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts, GET {args.path} (status {runs[-1]['status']}), warm-up {'on' if args.warm else 'off'}")
+    print(f"{'':<18}{'median':>9}{'min':>9}{'max':>9}")
+    for key, label in (("import_ms", "create_app ms"), ("first_request_ms", "first request ms"),
+                       ("process_ms", "whole process ms")):
+        values = [r[key] for r in runs]
+        print(f"{label:<18}{statistics.median(values):>9.1f}{min(values):>9.1f}{max(values):>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
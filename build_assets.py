@@ -0,0 +1,376 @@
+import gzip
+import logging
+import os
+import re
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from compression import brotli
+
+logger = logging.getLogger("wallcraft")
+
+SHARED_CSS = "css/site.css"
+PRECOMPRESS_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".xml", ".map")
+PRECOMPRESS_MIN_BYTES = 512
+
+_STYLE_RE = re.compile(r"(?P<indent>[ \t]*)<style>(?P<css>.*?)</style>", re.S)
+_LINK = "<link rel=\"stylesheet\" href=\"{{ url_for('static', filename='%s') }}\">" % SHARED_CSS
+_LINK_RE = re.compile(r"[ \t]*" + re.escape(_LINK) + r"\r?\n")
+_HEADER = "/* Generated by `flask build-assets` from rules shared by several templates. */\n\n"
+_PARTIAL_RE = re.compile(r"\{%-?\s*(?:include|import|from|extends)\s+[\"']([^\"']+)[\"']")
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_VENDOR_RE = re.compile(r"^-(webkit|moz|ms|o)-")
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)((?:\s[^<>]*)?)>")
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Names set from scripts or passed to macros, e.g. classList.add('active'), img_class="main-image"
+_DYNAMIC_RE = re.compile(r"(classList\.\w+|className|_class|_id)\s*[(=]\s*([^;,\n]*)")
+
+
+# ---------------------------------------------------------------------
+# CSS Blocks
+# ---------------------------------------------------------------------
+class Block:
+    """One top-level CSS rule or at-rule, with the comments written above it."""
+
+    __slots__ = ("text", "key", "properties", "subjects")
+
+    def __init__(self, text: str):
+        self.text = text
+        body = _COMMENT_RE.sub("", text)
+        self.key = re.sub(r"\s*([{};:,>])\s*", r"\1", re.sub(r"\s+", " ", body)).strip()
+        self.properties, self.subjects = _targets_of(self.key)
+
+    def competes(self, other: "Block", markup: "Markup") -> bool:
+        """Whether swapping the two blocks could change which declaration wins."""
+        common = self.properties & other.properties
+        if any(name.startswith("@") for name in common):
+            return True
+        return bool(common) and any(markup.may_match_same(a, b) for a in self.subjects for b in other.subjects)
+
+    def applies(self, markup: "Markup") -> bool:
+        """Whether the block could style anything on a page with this markup."""
+        return any(markup.may_match_same(s, s) for s in self.subjects)
+
+
+class Selector(NamedTuple):
+    subject: FrozenSet[str]
+    context: FrozenSet[str]
+
+
+def _compound_tokens(compound: str) -> Set[str]:
+    compound = re.sub(r"\[[^\]]*\]|(?<!:):(?!:)[\w-]+(\([^)]*\))?", "", compound)
+    tokens = set(re.findall(r"::[\w-]+|[.#][\w-]+", compound))
+    tag = re.match(r"[a-zA-Z][\w-]*", compound)
+    if tag:
+        tokens.add(tag.group(0).lower())
+    return tokens
+
+
+def _selector(text: str) -> Selector:
+    # Subject: tag, classes, ids and pseudo-element of the styled element.
+    # Context: classes and ids its ancestors (or preceding siblings) must carry.
+    compounds = [c for c in re.split(r"[\s>+~]+", text.strip()) if c]
+    subject = _compound_tokens(compounds[-1]) if compounds else set()
+    context: Set[str] = set()
+    for compound in compounds[:-1]:
+        context.update(t for t in _compound_tokens(compound) if t[0] in ".#")
+    return Selector(frozenset(subject), frozenset(context))
+
+
+class Markup:
+    """The elements the templates render: tag, classes and ids, and those of their ancestors.
+
+    Two rules only compete for an element both of their selectors can
+    match, so the markup tells us when reordering them is safe. Names that
+    scripts or macro arguments attach are treated as possible anywhere.
+    """
+
+    def __init__(self):
+        self.elements: Set[Tuple[str, FrozenSet[str], FrozenSet[str]]] = set()
+        self.dynamic: Set[str] = set()
+
+    def scan(self, html: str) -> None:
+        stack: List[Tuple[str, FrozenSet[str]]] = []
+        for closing, tag, attrs in _TAG_RE.findall(html):
+            tag = tag.lower()
+            if closing:
+                for depth in range(len(stack) - 1, -1, -1):
+                    if stack[depth][0] == tag:
+                        del stack[depth:]
+                        break
+                continue
+            names: Set[str] = set()
+            for attr, prefix in (("class", "."), ("id", "#")):
+                match = re.search(r"\s%s\s*=\s*(\"[^\"]*\"|'[^']*')" % attr, attrs)
+                if match:
+                    names.update(prefix + word for word in _attr_words(match.group(1)[1:-1]))
+            ancestors = frozenset(name for _, level in stack for name in level)
+            self.elements.add((tag, frozenset(names), ancestors))
+            if tag not in _VOID_TAGS and not attrs.endswith("/"):
+                stack.append((tag, frozenset(names)))
+        for kind, literal in _DYNAMIC_RE.findall(html):
+            prefix = "#" if kind.endswith("id") else "."
+            for quoted in re.findall(r"[\"']([^\"']*)[\"']", literal):
+                self.dynamic.update(prefix + word for word in quoted.split())
+
+    def may_match_same(self, a: Selector, b: Selector) -> bool:
+        if {t for t in a.subject if t[0] == ":"} != {t for t in b.subject if t[0] == ":"}:
+            return False
+        subject = a.subject | b.subject
+        tags = {t for t in subject if t[0] not in ".#:"}
+        if len(tags) > 1:
+            return False
+        names = {t for t in subject if t[0] in ".#"} - self.dynamic
+        context = (a.context | b.context) - self.dynamic
+        return any(
+            (not tags or tag in tags) and names <= own and context <= ancestors | own
+            for tag, own, ancestors in self.elements
+        )
+
+
+def _attr_words(value: str) -> List[str]:
+    # Literal words plus quoted strings inside Jinja expressions
+    words = re.findall(r"'([\w-]+)'", " ".join(re.findall(r"\{\{.*?\}\}|\{%.*?%\}", value)))
+    words += re.sub(r"\{\{.*?\}\}|\{%.*?%\}", " ", value).split()
+    return words
+
+
+def _targets_of(key: str) -> Tuple[Set[str], List[Selector]]:
+    """Property families ("margin-top" counts as "margin") and selector subjects of a block.
+
+    Named at-rules such as @keyframes compete only with a rule of the same name.
+    """
+    if key.startswith(("@keyframes", "@-webkit-keyframes", "@font-face", "@import", "@charset")):
+        return {key.split("{", 1)[0]}, []
+    properties: Set[str] = set()
+    subjects: List[Selector] = []
+    for prelude, body in re.findall(r"([^{};]*)\{([^{}]*)\}", key):
+        subjects.extend(_selector(selector) for selector in prelude.split(","))
+        for declaration in body.split(";"):
+            name = declaration.split(":", 1)[0].strip().lower()
+            if name.startswith("--"):
+                properties.add(name)
+            elif name:
+                properties.add(_VENDOR_RE.sub("", name).split("-", 1)[0])
+    return properties, subjects
+
+
+def split_blocks(css: str) -> Tuple[List[Block], str]:
+    """Split a stylesheet into top-level blocks plus any trailing text."""
+    blocks: List[Block] = []
+    depth = 0
+    start = 0
+    i = 0
+    quote = None
+    while i < len(css):
+        ch = css[i]
+        if quote:
+            if ch == "\\":
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            i = len(css) if end == -1 else end + 1
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                blocks.append(Block(css[start:i + 1]))
+                start = i + 1
+        elif ch == ";" and depth == 0:
+            # Statement at-rules such as @import
+            blocks.append(Block(css[start:i + 1]))
+            start = i + 1
+        i += 1
+    return blocks, css[start:]
+
+
+def _dedent(text: str) -> str:
+    lines = text.strip("\r\n").splitlines()
+    indents = [len(line) - len(line.lstrip()) for line in lines if line.strip()]
+    cut = min(indents) if indents else 0
+    return "\n".join(line[cut:] for line in lines)
+
+
+# ---------------------------------------------------------------------
+# Shared Stylesheet Extraction
+# ---------------------------------------------------------------------
+def _choose_shared(pages: Dict[str, List[Block]], markups: Dict[str, Markup]) -> List[str]:
+    """Keys of blocks to move into the shared stylesheet, in stylesheet order.
+
+    A block is shared when at least two pages carry it verbatim. The shared
+    sheet loads before each page's own <style> and brings every shared rule
+    along, so a block is only moved if that cannot change the cascade on any
+    page that links it: no page-specific block that could override it may
+    precede it, shared blocks that overlap must keep their relative order,
+    and pages without the block must have nothing it would style.
+    """
+    counts: Dict[str, int] = {}
+    for blocks in pages.values():
+        for key in {b.key for b in blocks}:
+            counts[key] = counts.get(key, 0) + 1
+    shared = {key for key, n in counts.items() if n >= 2 and not key.startswith(("@import", "@charset"))}
+    by_key = {b.key: b for blocks in pages.values() for b in blocks}
+
+    while True:
+        demote: Set[str] = set()
+        for name, blocks in pages.items():
+            local: List[Block] = []
+            for block in blocks:
+                if block.key not in shared:
+                    local.append(block)
+                elif any(block.competes(earlier, markups[name]) for earlier in local):
+                    demote.add(block.key)
+        order: List[str] = []
+        position: Dict[str, int] = {}
+        for blocks in pages.values():
+            for block in blocks:
+                if block.key in shared and block.key not in demote and block.key not in position:
+                    position[block.key] = len(order)
+                    order.append(block.key)
+        for name, blocks in pages.items():
+            moved = [block for block in blocks if block.key in position]
+            for i, block in enumerate(moved):
+                if any(position[earlier.key] > position[block.key] and block.competes(earlier, markups[name])
+                       for earlier in moved[:i]):
+                    demote.add(block.key)
+            if moved:
+                own = {block.key for block in blocks}
+                for key in position:
+                    foreign = by_key[key]
+                    if key not in own and (foreign.applies(markups[name])
+                                           or any(foreign.competes(b, markups[name]) for b in blocks)):
+                        demote.add(key)
+        # Duplicates of a page's own rule stay with it
+        for blocks in pages.values():
+            keys = [b.key for b in blocks]
+            demote.update(k for k in keys if k in shared and keys.count(k) > 1)
+        demote &= shared
+        if not demote:
+            return order
+        shared -= demote
+
+
+def _page_markup(name: str, sources: Dict[str, str], seen: Optional[Set[str]] = None) -> Markup:
+    # A page's own markup plus that of every partial it includes or imports
+    seen = seen if seen is not None else set()
+    seen.add(name)
+    markup = Markup()
+    markup.scan(_STYLE_RE.sub("", sources[name]))
+    for partial in _PARTIAL_RE.findall(sources[name]):
+        if partial in sources and partial not in seen:
+            included = _page_markup(partial, sources, seen)
+            markup.elements |= included.elements
+            markup.dynamic |= included.dynamic
+    return markup
+
+
+def extract_shared_css(templates_dir: str, static_dir: str) -> Dict[str, int]:
+    """Move CSS repeated across templates into ``public/css/site.css``.
+
+    Safe to re-run: templates already linking the shared sheet have its
+    current rules folded back in before the split is recomputed.
+    """
+    css_path = os.path.join(static_dir, SHARED_CSS)
+    existing: List[Block] = []
+    if os.path.exists(css_path):
+        with open(css_path, encoding="utf-8") as f:
+            existing = split_blocks(f.read().replace(_HEADER, "", 1))[0]
+
+    templates: Dict[str, str] = {}
+    for name in sorted(os.listdir(templates_dir)):
+        if name.endswith(".html"):
+            with open(os.path.join(templates_dir, name), encoding="utf-8", newline="") as f:
+                templates[name] = f.read()
+
+    sources: Dict[str, str] = {}
+    pages: Dict[str, List[Block]] = {}
+    tails: Dict[str, str] = {}
+    markups: Dict[str, Markup] = {}
+    for name, source in templates.items():
+        match = _STYLE_RE.search(source)
+        if name.startswith("_") or not match or "{{" in match.group("css") or "{%" in match.group("css"):
+            continue
+        blocks, tail = split_blocks(match.group("css"))
+        if _LINK_RE.search(source):
+            blocks = existing + blocks
+        sources[name], pages[name], tails[name] = source, blocks, tail
+        markups[name] = _page_markup(name, templates)
+
+    order = _choose_shared(pages, markups)
+    shared = set(order)
+    texts = {b.key: b.text for blocks in pages.values() for b in reversed(blocks)}
+    os.makedirs(os.path.dirname(css_path), exist_ok=True)
+    with open(css_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(_HEADER)
+        f.write("\n\n".join(_dedent(texts[key]) for key in order) + "\n")
+
+    stats = {"templates": 0, "shared_rules": len(order), "bytes_saved": 0}
+    for name, source in sources.items():
+        match = _STYLE_RE.search(source)
+        newline = "\r\n" if "\r\n" in source else "\n"
+        indent = match.group("indent")
+        local = [b.text for b in pages[name] if b.key not in shared]
+        uses_shared = any(b.key in shared for b in pages[name])
+        css = "".join(local) + tails[name]
+        if local and not css.startswith(("\n", "\r\n")):
+            css = newline + css
+        replacement = f"{indent}<style>{css}</style>"
+        if uses_shared:
+            replacement = f"{indent}{_LINK}{newline}" + replacement
+        head = _LINK_RE.sub("", source[:match.start()])
+        updated = head + replacement + source[match.end():]
+        if updated != source:
+            with open(os.path.join(templates_dir, name), "w", encoding="utf-8", newline="") as f:
+                f.write(updated)
+            stats["templates"] += 1
+            stats["bytes_saved"] += len(source.encode("utf-8")) - len(updated.encode("utf-8"))
+    return stats
+
+
+# ---------------------------------------------------------------------
+# Precompressed Static Files
+# ---------------------------------------------------------------------
+def _precompress_targets(static_dir: str) -> Iterable[str]:
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            if name.endswith(PRECOMPRESS_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def precompress(static_dir: str) -> Dict[str, int]:
+    """Write ``.gz`` (and ``.br`` when brotli is installed) next to text assets."""
+    stats = {"files": 0, "gz": 0, "br": 0, "skipped": 0}
+    for path in _precompress_targets(static_dir):
+        with open(path, "rb") as f:
+            data = f.read()
+        stats["files"] += 1
+        if len(data) < PRECOMPRESS_MIN_BYTES:
+            stats["skipped"] += 1
+            continue
+        mtime = os.path.getmtime(path)
+        variants = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", lambda d: brotli.compress(d, quality=11)))
+        for suffix, compress in variants:
+            target = path + suffix
+            if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                continue
+            encoded = compress(data)
+            if len(encoded) >= len(data):
+                continue
+            with open(target, "wb") as f:
+                f.write(encoded)
+            stats[suffix[1:]] += 1
+    return stats
+
+
+def build(templates_dir: str, static_dir: str, css: bool = True) -> Dict[str, Dict[str, int]]:
+    result = {}
+    if css:
+        result["css"] = extract_shared_css(templates_dir, static_dir)
+    result["precompress"] = precompress(static_dir)
+    return result
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("wallcraft")
+
+MAX_LINE_QTY = 99
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS carts (
+    cart_id TEXT PRIMARY KEY,
+    lines TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS carts_updated ON carts (updated_at);
+"""
+
+
+def new_cart_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def normalize_lines(cart: Dict[str, Any]) -> Dict[str, int]:
+    # Accepts the legacy cookie shape {"pid:size": {"qty": n}} as well as {"pid:size": n}
+    lines = {}
+    for key, value in (cart or {}).items():
+        qty = value.get("qty", 0) if isinstance(value, dict) else value
+        try:
+            qty = int(qty)
+        except (TypeError, ValueError):
+            continue
+        if qty > 0 and key.count(":") == 1:
+            lines[key] = min(qty, MAX_LINE_QTY)
+    return lines
+
+
+class CartStore:
+    """Server-side carts keyed by an opaque id kept in the session cookie.
+
+    Each cart is one row holding a flat ``{"pid:size": qty}`` JSON object.
+    Mutations run in ``BEGIN IMMEDIATE`` transactions, so concurrent requests
+    from the same visitor cannot lose each other's updates.
+    """
+
+    def __init__(self, path: str, max_age: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self._purged_at = 0.0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, cart_id: Optional[str]) -> Dict[str, int]:
+        if not cart_id:
+            return {}
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT lines FROM carts WHERE cart_id = ?", (cart_id,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else {}
+
+    def count(self, cart_id: Optional[str]) -> int:
+        return sum(self.get(cart_id).values())
+
+    def _mutate(self, cart_id: str, change) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT lines FROM carts WHERE cart_id = ?", (cart_id,)).fetchone()
+            lines = json.loads(row[0]) if row else {}
+            change(lines)
+            if lines:
+                conn.execute(
+                    "INSERT INTO carts (cart_id, lines, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(cart_id) DO UPDATE SET lines = excluded.lines, updated_at = excluded.updated_at",
+                    (cart_id, json.dumps(lines, separators=(",", ":")), time.time()),
+                )
+            else:
+                conn.execute("DELETE FROM carts WHERE cart_id = ?", (cart_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        if time.time() - self._purged_at > 3600:
+            self.purge_expired()
+        return lines
+
+    def add(self, cart_id: str, key: str, qty: int) -> Dict[str, int]:
+        def change(lines):
+            lines[key] = max(0, min(lines.get(key, 0) + qty, MAX_LINE_QTY))
+            if not lines[key]:
+                lines.pop(key)
+        return self._mutate(cart_id, change)
+
+    def adjust(self, cart_id: str, key: str, delta: int, minimum: int = 1) -> Dict[str, int]:
+        # Only changes lines already in the cart, like the +/- buttons on /cart
+        def change(lines):
+            if key in lines:
+                lines[key] = max(minimum, min(lines[key] + delta, MAX_LINE_QTY))
+        return self._mutate(cart_id, change)
+
+    def set_qty(self, cart_id: str, key: str, qty: int) -> Dict[str, int]:
+        def change(lines):
+            if qty > 0:
+                lines[key] = min(qty, MAX_LINE_QTY)
+            else:
+                lines.pop(key, None)
+        return self._mutate(cart_id, change)
+
+    def remove(self, cart_id: str, key: str) -> Dict[str, int]:
+        return self.set_qty(cart_id, key, 0)
+
+    def merge(self, cart_id: str, cart: Dict[str, Any]) -> Dict[str, int]:
+        incoming = normalize_lines(cart)
+
+        def change(lines):
+            for key, qty in incoming.items():
+                lines[key] = min(lines.get(key, 0) + qty, MAX_LINE_QTY)
+        return self._mutate(cart_id, change)
+
+    def clear(self, cart_id: Optional[str]) -> None:
+        if not cart_id:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM carts WHERE cart_id = ?", (cart_id,))
+        finally:
+            conn.close()
+
+    def purge_expired(self) -> int:
+        self._purged_at = time.time()
+        conn = self._connect()
+        try:
+            cur = conn.execute("DELETE FROM carts WHERE updated_at < ?", (time.time() - self.max_age,))
+            return cur.rowcount
+        finally:
+            conn.close()
@@ -0,0 +1,522 @@
+import base64
+import json
+import logging
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("wallcraft")
+
+PRICE_SIZES = ("small", "medium", "large")
+
+
+def money_to_int(val: str) -> int:
+    if not val:
+        return 0
+    if isinstance(val, (int, float)):
+        return int(val)
+    try:
+        cleaned = val.replace("₹", "").replace(",", "").strip()
+        return int(cleaned) if cleaned else 0
+    except ValueError:
+        logger.warning(f"money_to_int: Cannot convert value '{val}' to int.")
+        return 0
+
+
+def first_image(product: Dict[str, Any]) -> str:
+    imgs = product.get("imgs")
+    if isinstance(imgs, str):
+        return imgs
+    return imgs[0] if imgs else ""
+
+
+def encode_id_cursor(product_id: int) -> str:
+    raw = json.dumps({"id": int(product_id)}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_id_cursor(cursor: str) -> Optional[int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["id"])
+    except Exception:
+        return None
+
+
+def product_from_doc(doc) -> Dict[str, Any]:
+    product = doc.to_dict() or {}
+    # Ensure 'id' is int for sorting & comparisons if stored as string
+    if "id" in product:
+        product["id"] = int(product["id"])
+    update_time = getattr(doc, "update_time", None)
+    if update_time:
+        # The revision admin writes are guarded with
+        product["update_time"] = update_time
+        # Older documents carry no updated_at; fall back to Firestore's own write time
+        product.setdefault("updated_at", update_time)
+    return product
+
+
+# ---------------------------------------------------------------------
+# Catalog Index
+# ---------------------------------------------------------------------
+class CatalogIndex:
+    """Id lookup and pre-parsed integer prices for one catalog version."""
+
+    def __init__(self, products: List[Dict[str, Any]], version: int = 0):
+        self.version = version
+        self.products = products
+        self.by_id: Dict[int, Dict[str, Any]] = {}
+        self.prices: Dict[int, Dict[str, int]] = {}
+        self._ids: Optional[List[int]] = None
+        for product in products:
+            if "id" not in product:
+                continue
+            pid = product["id"]
+            self.by_id[pid] = product
+            self.prices[pid] = {
+                size: money_to_int(product.get(f"price_{size}", "0")) for size in PRICE_SIZES
+            }
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, product_id) -> Optional[Dict[str, Any]]:
+        try:
+            return self.by_id.get(int(product_id))
+        except (TypeError, ValueError):
+            return None
+
+    def price(self, product_id, size: str) -> int:
+        try:
+            return self.prices.get(int(product_id), {}).get(size, 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def page(self, after_id: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Up to ``limit`` products with id > ``after_id``, and the id to continue after."""
+        if self._ids is None:
+            self._ids = sorted(self.by_id)
+        ids = self._ids
+        start = bisect_right(ids, after_id) if after_id is not None else 0
+        chunk = ids[start:start + limit]
+        next_after = chunk[-1] if chunk and start + limit < len(ids) else None
+        return [self.by_id[pid] for pid in chunk], next_after
+
+
+def cart_product_ids(cart: Dict[str, Any]) -> List[int]:
+    ids = []
+    seen = set()
+    for key in cart:
+        pid = key.split(":", 1)[0]
+        try:
+            pid = int(pid)
+        except ValueError:
+            continue
+        if pid not in seen:
+            seen.add(pid)
+            ids.append(pid)
+    return ids
+
+
+def price_cart(cart: Dict[str, Any], index: CatalogIndex) -> Tuple[List[Dict[str, Any]], int]:
+    items = []
+    total = 0
+    for key, data in cart.items():
+        try:
+            parts = key.split(":")
+            if len(parts) != 2:
+                logger.error(f"Invalid cart item key format: {key}")
+                continue
+            pid, size = parts
+            qty = data.get("qty", 0) if isinstance(data, dict) else int(data)
+            product = index.get(pid)
+            if not product or qty <= 0:
+                continue
+            price = index.price(pid, size)
+            subtotal = price * qty
+            total += subtotal
+            items.append({
+                "id": product["id"],
+                "name": product["name"],
+                "img": first_image(product),
+                "size": size,
+                "price": price,
+                "qty": qty,
+                "subtotal": subtotal,
+            })
+        except Exception as e:
+            logger.error(f"Error processing cart item {key}: {e}")
+    return items, total
+
+
+# ---------------------------------------------------------------------
+# Catalog Cache
+# ---------------------------------------------------------------------
+class CatalogCache:
+    """In-memory copy of the product list.
+
+    Kept current by a Firestore ``on_snapshot`` listener when one can be
+    attached; otherwise every entry expires after ``ttl`` seconds and is
+    re-read through ``loader``. The returned list is shared between
+    requests and must be treated as read-only.
+
+    ``seed`` supplies a last-known catalog (e.g. an on-disk snapshot) that
+    is served, as already stale, before the first load. With
+    ``background_refresh`` a stale catalog is returned at once while one
+    thread reloads it. ``on_change`` is called under the cache lock after
+    every new catalog is stored, so it must return quickly.
+    """
+
+    def __init__(self, loader: Callable[[], Optional[List[Dict[str, Any]]]],
+                 query_factory: Optional[Callable[[], Any]] = None,
+                 ttl: float = 300.0, retry_after: float = 60.0,
+                 seed: Optional[Callable[[], Optional[List[Dict[str, Any]]]]] = None,
+                 on_change: Optional[Callable[[List[Dict[str, Any]], int], None]] = None,
+                 background_refresh: bool = False):
+        self._loader = loader
+        self._query_factory = query_factory
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._seed = seed
+        self._on_change = on_change
+        self.background_refresh = background_refresh
+        self._refreshing = False
+        self._lock = threading.RLock()
+        self._products: Optional[List[Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._index: Optional[CatalogIndex] = None
+        self._watch = None
+        self._watch_failed_at = 0.0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "stale_served": 0,
+            "invalidations": 0,
+            "snapshots": 0,
+            "seeded": 0,
+            "background_refreshes": 0,
+        }
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def watching(self) -> bool:
+        return self._watch is not None and self._watch.is_active
+
+    def get(self) -> List[Dict[str, Any]]:
+        self._ensure_watch()
+        with self._lock:
+            self._seed_once()
+            products = self._products
+            if products is not None:
+                if self._is_fresh():
+                    self.stats["hits"] += 1
+                    return products
+                self.stats["stale"] += 1
+                if self.background_refresh:
+                    self._refresh_async()
+                    self.stats["stale_served"] += 1
+                    return products
+            else:
+                self.stats["misses"] += 1
+
+            try:
+                fresh = self._loader()
+            except Exception as e:
+                logger.error(f"Catalog reload failed: {e}")
+                fresh = None
+            if fresh is None:
+                if products is not None:
+                    self.stats["stale_served"] += 1
+                    return products
+                return []
+            self._store(fresh)
+            return fresh
+
+    def index(self) -> CatalogIndex:
+        products = self.get()
+        with self._lock:
+            return self._index_for(products)
+
+    def cached_index(self, allow_stale: bool = False) -> Optional[CatalogIndex]:
+        # Index of the in-memory catalog, or None when it would need a reload.
+        # ``allow_stale`` accepts an expired copy while it refreshes in the background.
+        self._ensure_watch()
+        with self._lock:
+            self._seed_once()
+            if self._products is None:
+                return None
+            if not self._is_fresh():
+                if not (allow_stale and self.background_refresh):
+                    return None
+                self._refresh_async()
+            return self._index_for(self._products)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._products = None
+            self._loaded_at = 0.0
+            self._version += 1
+            self.stats["invalidations"] += 1
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                "version": self._version,
+                "size": len(self._products) if self._products is not None else 0,
+                "age": time.monotonic() - self._loaded_at if self._products is not None else None,
+                "watching": self.watching,
+            })
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._watch is not None:
+                try:
+                    self._watch.unsubscribe()
+                except Exception as e:
+                    logger.warning(f"Error closing catalog listener: {e}")
+                self._watch = None
+
+    def _is_fresh(self) -> bool:
+        return self.watching or time.monotonic() - self._loaded_at < self.ttl
+
+    def _index_for(self, products: List[Dict[str, Any]]) -> CatalogIndex:
+        index = self._index
+        if index is None or index.products is not products:
+            index = CatalogIndex(products, self._version)
+            self._index = index
+        return index
+
+    def _store(self, products: List[Dict[str, Any]]) -> None:
+        self._products = products
+        self._loaded_at = time.monotonic()
+        self._version += 1
+        if self._on_change is not None:
+            try:
+                self._on_change(products, self._version)
+            except Exception as e:
+                logger.error(f"Catalog change hook failed: {e}")
+
+    def _seed_once(self) -> None:
+        if self._seed is None or self._products is not None:
+            return
+        seed, self._seed = self._seed, None
+        try:
+            products = seed()
+        except Exception as e:
+            logger.warning(f"Could not seed catalog: {e}")
+            return
+        if products:
+            self._products = products
+            # Already expired, so the first request schedules a reload
+            self._loaded_at = time.monotonic() - self.ttl
+            self._version += 1
+            self.stats["seeded"] = len(products)
+
+    # --- Background refresh ---
+    def _refresh_async(self) -> None:
+        if self._refreshing:
+            return
+        self._refreshing = True
+        threading.Thread(target=self._refresh, args=(self._version,), name="catalog-refresh", daemon=True).start()
+
+    def _refresh(self, version: int) -> None:
+        try:
+            fresh = self._loader()
+        except Exception as e:
+            logger.error(f"Catalog background reload failed: {e}")
+            fresh = None
+        with self._lock:
+            self._refreshing = False
+            self.stats["background_refreshes"] += 1
+            if self._version != version:
+                # Invalidated or replaced while loading; this copy may be older
+                return
+            if fresh is None:
+                # Keep serving the stale copy and try again after retry_after
+                self._loaded_at = time.monotonic() - self.ttl + self.retry_after
+                return
+            self._store(fresh)
+
+    # --- Firestore listener ---
+    def _ensure_watch(self) -> None:
+        if self._query_factory is None or self.watching:
+            return
+        now = time.monotonic()
+        if self._watch_failed_at and now - self._watch_failed_at < self.retry_after:
+            return
+        with self._lock:
+            if self.watching:
+                return
+            try:
+                query = self._query_factory()
+                if query is None:
+                    return
+                self._watch = query.on_snapshot(self._on_snapshot)
+                logger.info("Catalog snapshot listener attached")
+            except Exception as e:
+                self._watch = None
+                self._watch_failed_at = now
+                logger.warning(f"Catalog listener unavailable, using {self.ttl:.0f}s TTL: {e}")
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        try:
+            products = sorted((product_from_doc(d) for d in docs), key=lambda p: p.get("id", 0))
+        except Exception as e:
+            logger.error(f"Could not apply catalog snapshot: {e}")
+            self.invalidate()
+            return
+        with self._lock:
+            self._store(products)
+            self.stats["snapshots"] += 1
+        logger.info("Catalog snapshot applied (%d products)", len(products))
+
+
+# ---------------------------------------------------------------------
+# Product Cache
+# ---------------------------------------------------------------------
+_MISSING = object()
+
+
+class ProductCache:
+    """Per-product cache for single-document reads.
+
+    Unknown ids are cached as negative entries for ``negative_ttl`` seconds
+    so repeated 404s never reach Firestore. Entries are evicted LRU once
+    ``max_entries`` is reached.
+    """
+
+    def __init__(self, fetcher: Callable[[int], Optional[Dict[str, Any]]],
+                 batch_fetcher: Optional[Callable[[List[int]], Dict[int, Dict[str, Any]]]] = None,
+                 ttl: float = 300.0, negative_ttl: float = 60.0, max_entries: int = 2048):
+        self._fetcher = fetcher
+        self._batch_fetcher = batch_fetcher
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "errors": 0}
+
+    def get(self, product_id: int) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(product_id)
+                if entry[1] is _MISSING:
+                    self.stats["negative_hits"] += 1
+                    return None
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+
+        try:
+            product = self._fetcher(product_id)
+        except Exception as e:
+            logger.error(f"Error reading product {product_id} from Firestore: {e}")
+            with self._lock:
+                self.stats["errors"] += 1
+            # Serve an expired copy rather than a 404 when Firestore is failing
+            if entry is not None and entry[1] is not _MISSING:
+                return entry[1]
+            return None
+
+        with self._lock:
+            self._put(product_id, product, now)
+        return product
+
+    def get_many(self, product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        # Cached entries are served as-is; the rest come back in one batch read.
+        if self._batch_fetcher is None:
+            found = {}
+            for pid in product_ids:
+                product = self.get(pid)
+                if product is not None:
+                    found[pid] = product
+            return found
+
+        now = time.monotonic()
+        found: Dict[int, Dict[str, Any]] = {}
+        expired: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        with self._lock:
+            for pid in product_ids:
+                entry = self._entries.get(pid)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(pid)
+                    if entry[1] is _MISSING:
+                        self.stats["negative_hits"] += 1
+                    else:
+                        self.stats["hits"] += 1
+                        found[pid] = entry[1]
+                    continue
+                if entry is not None and entry[1] is not _MISSING:
+                    expired[pid] = entry[1]
+                self.stats["misses"] += 1
+                missing.append(pid)
+        if not missing:
+            return found
+
+        try:
+            fetched = self._batch_fetcher(missing)
+        except Exception as e:
+            logger.error(f"Error batch-reading products {missing} from Firestore: {e}")
+            with self._lock:
+                self.stats["errors"] += 1
+            found.update(expired)
+            return found
+
+        with self._lock:
+            for pid in missing:
+                product = fetched.get(pid)
+                self._put(pid, product, now)
+                if product is not None:
+                    found[pid] = product
+        return found
+
+    def invalidate(self, product_id: Optional[int] = None) -> None:
+        with self._lock:
+            if product_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(product_id, None)
+
+    def _put(self, product_id: int, product: Optional[Dict[str, Any]], now: float) -> None:
+        if product is None:
+            self._entries[product_id] = (now + self.negative_ttl, _MISSING)
+        else:
+            self._entries[product_id] = (now + self.ttl, product)
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# ---------------------------------------------------------------------
+# Cart Pricing
+# ---------------------------------------------------------------------
+class CartPricer:
+    """Prices a session cart by reading only the products it contains."""
+
+    def __init__(self, catalog: CatalogCache, products: ProductCache):
+        self._catalog = catalog
+        self._products = products
+
+    def index_for(self, cart: Dict[str, Any]) -> CatalogIndex:
+        index = self._catalog.cached_index()
+        if index is not None:
+            return index
+        found = self._products.get_many(cart_product_ids(cart))
+        return CatalogIndex(list(found.values()))
+
+    def price(self, cart: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+        return price_cart(cart, self.index_for(cart))
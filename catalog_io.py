@@ -0,0 +1,398 @@
+import csv
+import io
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from catalog import PRICE_SIZES, product_from_doc
+
+logger = logging.getLogger("wallcraft")
+
+PRODUCTS_COLLECTION = "products"
+COUNTERS_COLLECTION = "counters"
+PRODUCT_COUNTER_DOC = "products"
+# Firestore rejects a commit with more than 500 writes
+BATCH_LIMIT = 500
+MAX_IMPORT_ROWS = 5000
+EXPORT_FIELDS = ("id", "name", "desc", "price_small", "price_medium", "price_large", "features", "imgs")
+# A new product needs all of these; a row updating an existing id may leave them out
+REQUIRED_FIELDS = ("name",) + tuple(f"price_{size}" for size in PRICE_SIZES)
+NEW_PRODUCT_DEFAULTS = (("desc", ""), ("features", []), ("imgs", []))
+LIST_SEPARATOR = "|"
+# Images already on ImgBB are kept as they are
+HOSTED_IMAGE_PREFIXES = ("https://i.ibb.co/",)
+
+
+class RowError(NamedTuple):
+    row: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"row {self.row}: {self.message}"
+
+
+class ImportFileError(ValueError):
+    """The upload could not be parsed at all."""
+
+
+# ---------------------------------------------------------------------
+# Product IDs
+# ---------------------------------------------------------------------
+class ProductIdAllocator:
+    """Hands out product IDs from a counter document.
+
+    A block of IDs costs one transaction on ``counters/products`` instead
+    of reading every product for ``max(id) + 1``. The first allocation
+    seeds the counter from the highest existing ID with a single-document
+    query.
+    """
+
+    def __init__(self, db_getter: Callable[[], Any]):
+        self._db_getter = db_getter
+        self._lock = threading.Lock()
+
+    def _counter(self, db):
+        return db.collection(COUNTERS_COLLECTION).document(PRODUCT_COUNTER_DOC)
+
+    @staticmethod
+    def highest_id(db) -> int:
+        from firebase_admin import firestore
+
+        query = db.collection(PRODUCTS_COLLECTION).order_by("id", direction=firestore.Query.DESCENDING).limit(1)
+        for doc in query.stream():
+            return int((doc.to_dict() or {}).get("id", 0))
+        return 0
+
+    def reserve(self, count: int = 1, above: int = 0) -> range:
+        """``count`` consecutive unused IDs, all greater than ``above``."""
+        from firebase_admin import firestore
+
+        db = self._db_getter()
+        if db is None:
+            raise RuntimeError("Firestore is not initialized")
+        if count <= 0:
+            return range(0)
+        counter = self._counter(db)
+
+        @firestore.transactional
+        def take(transaction) -> int:
+            snapshot = counter.get(transaction=transaction)
+            start = (snapshot.to_dict() or {}).get("next_id") if snapshot.exists else None
+            if start is None:
+                start = self.highest_id(db) + 1
+            start = max(start, above + 1)
+            transaction.set(counter, {"next_id": start + count, "updated_at": firestore.SERVER_TIMESTAMP},
+                            merge=True)
+            return start
+
+        with self._lock:
+            start = take(db.transaction())
+        return range(start, start + count)
+
+    def reserve_past(self, batch, db, highest: int) -> None:
+        """Add a write to ``batch`` that keeps the counter above an explicitly chosen ID."""
+        from firebase_admin import firestore
+
+        batch.set(self._counter(db), {"next_id": firestore.Maximum(highest + 1)}, merge=True)
+
+
+# ---------------------------------------------------------------------
+# Parsing & Validation
+# ---------------------------------------------------------------------
+def read_import_rows(stream, filename: str = "") -> Iterator[Dict[str, Any]]:
+    """Rows of a CSV or JSON upload; the format is picked by extension, then by content."""
+    raw = stream.read()
+    text = raw.decode("utf-8-sig") if isinstance(raw, bytes) else raw
+    is_json = filename.lower().endswith(".json") or (not filename.lower().endswith(".csv")
+                                                     and text.lstrip()[:1] in ("[", "{"))
+    if is_json:
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ImportFileError(f"Invalid JSON: {e}")
+        if isinstance(data, dict):
+            data = data.get("products")
+        if not isinstance(data, list):
+            raise ImportFileError("JSON must be a list of products or {\"products\": [...]}")
+        yield from data
+        return
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "name" not in [f.strip().lower() for f in reader.fieldnames]:
+        raise ImportFileError("CSV needs a header row with at least a 'name' column")
+    for row in reader:
+        yield {(k or "").strip().lower(): v for k, v in row.items()}
+
+
+def _split_list(value, separators: str) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    text = str(value)
+    for separator in separators:
+        if separator in text:
+            return [part.strip() for part in text.split(separator) if part.strip()]
+    return [text.strip()] if text.strip() else []
+
+
+def _price(value) -> Optional[str]:
+    text = str(value if value is not None else "").replace("₹", "").replace(",", "").strip()
+    if not text:
+        return None
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    if number < 0 or number != int(number):
+        return None
+    return str(int(number))
+
+
+def validate_row(raw: Any, row: int) -> Tuple[Optional[Dict[str, Any]], List[RowError]]:
+    """Normalize one import row into product fields (without ``updated_at``).
+
+    Fields left blank are omitted, so a row with an ``id`` updates only
+    the fields it fills in. Rows without an ``id`` create products and must
+    have a name and every price.
+    """
+    if not isinstance(raw, dict):
+        return None, [RowError(row, "expected an object")]
+    errors: List[RowError] = []
+    product: Dict[str, Any] = {}
+
+    pid = raw.get("id")
+    if pid not in (None, ""):
+        try:
+            product["id"] = int(str(pid).strip())
+            if product["id"] <= 0:
+                raise ValueError
+        except ValueError:
+            errors.append(RowError(row, f"id must be a positive integer, got {pid!r}"))
+
+    partial = "id" in product
+    name = str(raw.get("name") or "").strip()
+    if not name:
+        if not partial:
+            errors.append(RowError(row, "name is required"))
+    elif len(name) > 200:
+        errors.append(RowError(row, "name is longer than 200 characters"))
+    else:
+        product["name"] = name
+    desc = str(raw.get("desc") or "").strip()
+    if desc:
+        product["desc"] = desc
+
+    for size in PRICE_SIZES:
+        value = raw.get(f"price_{size}")
+        if partial and str(value if value is not None else "").strip() == "":
+            continue
+        price = _price(value)
+        if price is None:
+            errors.append(RowError(row, f"price_{size} must be a whole number of rupees, got {value!r}"))
+        product[f"price_{size}"] = price
+
+    features = _split_list(raw.get("features"), LIST_SEPARATOR + ",")
+    if features:
+        product["features"] = features
+    imgs = _split_list(raw.get("imgs", raw.get("img")), LIST_SEPARATOR + ",\n ")
+    bad = [url for url in imgs if not url.startswith(("http://", "https://"))]
+    if bad:
+        errors.append(RowError(row, f"image URLs must be http(s): {', '.join(bad[:3])}"))
+    if imgs:
+        product["imgs"] = imgs
+    if partial and not errors and len(product) == 1:
+        errors.append(RowError(row, f"nothing to update for id {product['id']}"))
+    return (None if errors else product), errors
+
+
+# ---------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------
+class CatalogImporter:
+    """Validates a batch of product rows and writes them in 500-write batches.
+
+    Rows with an ``id`` update that product (fields not in the import are
+    kept), or create it with that ID when it does not exist yet; rows
+    without one become new products with IDs reserved in one block. Remote image URLs are re-hosted on ImgBB concurrently before
+    anything is written. With ``skip_invalid=False`` a single bad row
+    aborts the whole import.
+    """
+
+    def __init__(self, db_getter: Callable[[], Any], ids: ProductIdAllocator, uploader=None,
+                 batch_size: int = BATCH_LIMIT, max_rows: int = MAX_IMPORT_ROWS):
+        self._db_getter = db_getter
+        self.ids = ids
+        self.uploader = uploader
+        self.batch_size = min(batch_size, BATCH_LIMIT)
+        self.max_rows = max_rows
+
+    def validate(self, rows: Iterable[Any]) -> Tuple[List[Dict[str, Any]], List[RowError], int, Dict[int, int]]:
+        """Valid products, row errors, the row count and the row of each explicit id."""
+        products: List[Dict[str, Any]] = []
+        errors: List[RowError] = []
+        seen_ids: Dict[int, int] = {}
+        total = 0
+        for total, raw in enumerate(rows, start=1):
+            if total > self.max_rows:
+                errors.append(RowError(total, f"imports are limited to {self.max_rows} rows"))
+                break
+            product, row_errors = validate_row(raw, total)
+            if product and "id" in product:
+                if product["id"] in seen_ids:
+                    row_errors.append(RowError(total, f"id {product['id']} already used on row "
+                                                      f"{seen_ids[product['id']]}"))
+                    product = None
+                else:
+                    seen_ids[product["id"]] = total
+            errors.extend(row_errors)
+            if product:
+                products.append(product)
+        return products, errors, total, seen_ids
+
+    @staticmethod
+    def missing_ids(db, ids: List[int]) -> Set[int]:
+        """Which of ``ids`` have no product document yet."""
+        if not ids:
+            return set()
+        collection = db.collection(PRODUCTS_COLLECTION)
+        found = {int(doc.id) for doc in db.get_all([collection.document(str(pid)) for pid in ids],
+                                                   field_paths=["id"]) if doc.exists}
+        return set(ids) - found
+
+    def rehost_images(self, products: List[Dict[str, Any]]) -> Dict[str, int]:
+        stats = {"images_uploaded": 0, "images_failed": 0}
+        if self.uploader is None:
+            return stats
+        urls = list(dict.fromkeys(url for p in products for url in p.get("imgs", ())
+                                  if not url.startswith(HOSTED_IMAGE_PREFIXES)))
+        if not urls:
+            return stats
+        hosted: Dict[str, str] = {}
+        for url, result in zip(urls, self.uploader.upload_urls(urls)):
+            if result.ok:
+                hosted[url] = result.url
+                stats["images_uploaded"] += 1
+            else:
+                # Keep the original URL so the product still has a picture
+                stats["images_failed"] += 1
+        for product in products:
+            if "imgs" in product:
+                product["imgs"] = [hosted.get(url, url) for url in product["imgs"]]
+        return stats
+
+    def run(self, rows: Iterable[Any], skip_invalid: bool = False, dry_run: bool = False,
+            rehost: bool = True, on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        products, errors, total, rows_by_id = self.validate(rows)
+        report: Dict[str, Any] = {
+            "rows": total, "valid": len(products), "errors": errors, "created": 0, "updated": 0,
+            "written": 0, "batches": 0, "images_uploaded": 0, "images_failed": 0, "ids": [], "error": None,
+        }
+        if (errors and not skip_invalid) or not products:
+            return report
+
+        db = self._db_getter()
+        if db is None:
+            if dry_run:
+                # Without Firestore, rows with an unknown id cannot be checked
+                return report
+            raise RuntimeError("Firestore is not initialized")
+        # Rows naming an id that does not exist yet create that product, so need every field
+        unknown = self.missing_ids(db, list(rows_by_id))
+        for product in [p for p in products if p.get("id") in unknown]:
+            missing = [field for field in REQUIRED_FIELDS if field not in product]
+            if missing:
+                errors.append(RowError(rows_by_id[product["id"]], f"id {product['id']} does not exist; "
+                                       f"a new product needs {', '.join(missing)}"))
+                products.remove(product)
+        errors.sort(key=lambda e: e.row)
+        report["valid"] = len(products)
+        if (errors and not skip_invalid) or not products or dry_run:
+            return report
+        if rehost:
+            report.update(self.rehost_images(products))
+
+        new = [p for p in products if "id" not in p]
+        explicit = [p["id"] for p in products if "id" in p]
+        for product, pid in zip(new, self.ids.reserve(len(new), above=max(explicit, default=0))):
+            product["id"] = pid
+        new_ids = {p["id"] for p in new} | unknown
+        for product in products:
+            if product["id"] in new_ids:
+                for field, default in NEW_PRODUCT_DEFAULTS:
+                    product.setdefault(field, default)
+        now = datetime.utcnow()
+        collection = db.collection(PRODUCTS_COLLECTION)
+
+        start = 0
+        while start < len(products):
+            batch = db.batch()
+            room = self.batch_size
+            if start == 0 and explicit:
+                # Keep the counter ahead of IDs chosen in the file; it shares the first commit
+                self.ids.reserve_past(batch, db, max(explicit))
+                room -= 1
+            chunk = products[start:start + room]
+            for product in chunk:
+                product["updated_at"] = now
+                # Updates replace the listed fields and keep the rest (image variants, ...)
+                batch.set(collection.document(str(product["id"])), product, merge=product["id"] not in new_ids)
+            try:
+                batch.commit()
+            except Exception as e:
+                # Earlier batches are already in; report how far the import got
+                logger.error(f"Import batch {report['batches'] + 1} failed: {e}")
+                report["error"] = str(e)
+                break
+            start += len(chunk)
+            report["batches"] += 1
+            report["written"] += len(chunk)
+            if on_progress is not None:
+                on_progress(report["written"], len(products))
+        report["ids"] = [p["id"] for p in products[:report["written"]]]
+        report["created"] = sum(1 for pid in report["ids"] if pid in new_ids)
+        report["updated"] = report["written"] - report["created"]
+        logger.info(f"Imported {report['written']} products ({report['created']} new, {report['updated']} "
+                    f"updated) in {report['batches']} batches")
+        return report
+
+
+# ---------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------
+def export_row(product: Dict[str, Any]) -> Dict[str, Any]:
+    row = {field: product.get(field, "") for field in EXPORT_FIELDS}
+    for field in ("features", "imgs"):
+        value = row[field]
+        if isinstance(value, (list, tuple)):
+            row[field] = LIST_SEPARATOR.join(str(v) for v in value)
+    return row
+
+
+def iter_export_csv(products: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """CSV text chunk by chunk; the output imports back unchanged."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for i, product in enumerate(products, start=1):
+        writer.writerow(export_row(product))
+        if i % 100 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_export_json(products: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    yield "["
+    for i, product in enumerate(products):
+        item = {field: product.get(field) for field in EXPORT_FIELDS}
+        yield ("," if i else "") + "\n" + json.dumps(item, ensure_ascii=False, default=str)
+    yield "\n]\n"
+
+
+def stream_products(db) -> Iterator[Dict[str, Any]]:
+    """Every product straight from Firestore in ID order, without holding the catalog in memory."""
+    for doc in db.collection(PRODUCTS_COLLECTION).order_by("id").stream():
+        yield product_from_doc(doc)
@@ -0,0 +1,191 @@
+import gzip
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is always available
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+logger = logging.getLogger("wallcraft")
+
+COMPRESSIBLE_MIMETYPES = (
+    "text/html", "text/css", "text/plain", "text/xml", "text/csv",
+    "application/json", "application/javascript", "application/xml", "image/svg+xml",
+)
+# (encoding, file suffix) in server preference order
+STATIC_VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding, offered: Iterable[str]) -> Optional[str]:
+    """Best of ``offered`` the client accepts, honouring ``q=0`` exclusions."""
+    best, best_q = None, 0.0
+    for encoding in offered:
+        q = accept_encoding.quality(encoding)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _stream_gzip(chunks: Iterable[bytes], level: int) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        # Flush per chunk so the browser can start parsing before the view finishes
+        out += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def _stream_brotli(chunks: Iterable[bytes], level: int) -> Iterator[bytes]:
+    compressor = brotli.Compressor(quality=level)
+    for chunk in chunks:
+        out = compressor.process(chunk) + compressor.flush()
+        if out:
+            yield out
+    yield compressor.finish()
+
+
+def _closing(stream: Iterator[bytes], source) -> Iterator[bytes]:
+    try:
+        yield from stream
+    finally:
+        if hasattr(source, "close"):
+            source.close()
+
+
+class ResponseCompressor:
+    """Compresses dynamic text responses according to Accept-Encoding.
+
+    Buffered bodies are compressed whole; streamed ones are compressed
+    chunk by chunk without buffering. Bodies with an ETag (cached pages,
+    API listings) are compressed once and the result kept in a small LRU,
+    so page-cache hits cost a dictionary lookup rather than a deflate.
+    """
+
+    def __init__(self, min_size: int = 1024, gzip_level: int = 6, brotli_level: int = 5,
+                 max_entries: int = 256, max_bytes: int = 8 * 1024 * 1024):
+        self.min_size = min_size
+        self.levels = {"gzip": gzip_level, "br": brotli_level}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"compressed": 0, "streamed": 0, "cache_hits": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.stats["cache_hits"] += 1
+            return data
+
+    def _store(self, key: Tuple[str, str], data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self._bytes -= len(oldest)
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes})
+        return stats
+
+    def should_compress(self, response) -> bool:
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return False
+        if response.is_streamed:
+            return not response.direct_passthrough
+        return response.content_length is None or response.content_length >= self.min_size
+
+    def __call__(self, response, request):
+        if not self.should_compress(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate(request.accept_encodings, available_encodings())
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+
+        if response.is_streamed:
+            source = response.response
+            stream = _stream_brotli if encoding == "br" else _stream_gzip
+            response.response = _closing(stream(response.iter_encoded(), level), source)
+            response.headers.pop("Content-Length", None)
+            with self._lock:
+                self.stats["streamed"] += 1
+        else:
+            etag, weak = response.get_etag()
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            key = (etag, encoding) if etag else None
+            data = self._cached(key) if key else None
+            if data is None:
+                data = compress_bytes(body, encoding, level)
+                if key:
+                    self._store(key, data)
+            response.set_data(data)
+            with self._lock:
+                self.stats["compressed"] += 1
+                self.stats["bytes_in"] += len(body)
+                self.stats["bytes_out"] += len(data)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # The bytes differ per encoding, so the strong validator becomes weak
+            response.set_etag(etag, weak=True)
+        return response
+
+
+# ---------------------------------------------------------------------
+# Precompressed Static Files
+# ---------------------------------------------------------------------
+def static_variant(static_folder: str, filename: str, accept_encoding) -> Optional[Tuple[str, str]]:
+    """(encoding, variant filename) for a prebuilt ``.br``/``.gz`` that is not stale."""
+    path = os.path.join(static_folder, filename)
+    try:
+        source_mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    offered: List[str] = []
+    names: Dict[str, str] = {}
+    for encoding, suffix in STATIC_VARIANTS:
+        try:
+            if os.path.getmtime(path + suffix) >= source_mtime:
+                offered.append(encoding)
+                names[encoding] = filename + suffix
+        except OSError:
+            continue
+    encoding = negotiate(accept_encoding, offered)
+    return (encoding, names[encoding]) if encoding else None
@@ -0,0 +1,92 @@
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger("wallcraft")
+
+
+class FanOut:
+    """Runs a request's independent blocking fetches side by side.
+
+    :meth:`gather` runs the first call on the request thread and the rest
+    on a small per-process pool, so a page that needs a reviews page and the
+    review stats waits for the slower of the two rather than their sum.
+    When every pool slot is taken the extra calls simply run inline, so a
+    burst degrades to sequential fetching instead of queueing behind other
+    requests. Calls run in a copy of the caller's context (for
+    per-request metrics) but must not touch ``request`` or ``session``.
+    """
+
+    def __init__(self, max_workers: int = 8, name: str = "fanout"):
+        self.max_workers = max_workers
+        self.name = name
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_workers))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self.stats = {"gathers": 0, "parallel": 0, "inline": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Built lazily per process: a pool inherited across fork has no threads
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _submit(self, call: Callable[[], Any]) -> Optional[Future]:
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            future = self.executor.submit(contextvars.copy_context().run, call)
+        except RuntimeError:
+            self._slots.release()
+            return None
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def gather(self, *calls: Callable[[], Any], return_exceptions: bool = False) -> List[Any]:
+        """Results of ``calls`` in order; with ``return_exceptions`` a failure is returned, not raised."""
+        def run(call):
+            try:
+                return call()
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        if not calls:
+            return []
+        futures = [self._submit(call) if self.enabled else None for call in calls[1:]]
+        parallel = sum(f is not None for f in futures)
+        with self._lock:
+            self.stats["gathers"] += 1
+            self.stats["parallel"] += parallel
+            self.stats["inline"] += len(futures) - parallel
+
+        results = [run(calls[0])]
+        for call, future in zip(calls[1:], futures):
+            if future is None:
+                results.append(run(call))
+                continue
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
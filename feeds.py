@@ -0,0 +1,160 @@
+import csv
+import hashlib
+import io
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+
+from catalog import PRICE_SIZES, first_image
+
+logger = logging.getLogger("wallcraft")
+
+FEED_FIELDS = ("id", "name", "desc") + tuple(f"price_{size}" for size in PRICE_SIZES) + ("image", "link")
+CHUNK_ROWS = 100
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+# (product id) -> absolute product page URL
+LinkFor = Callable[[int], str]
+
+
+def feed_row(product: Dict[str, Any], link: LinkFor, base_url: str) -> Dict[str, str]:
+    row = {field: str(product.get(field) or "") for field in FEED_FIELDS[:-2]}
+    image = first_image(product)
+    # Bundled images are site-relative; feed readers need absolute URLs
+    row["image"] = urljoin(base_url, image) if image else ""
+    row["link"] = link(product["id"])
+    return row
+
+
+def _products(products: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    return (p for p in products if "id" in p)
+
+
+def iter_feed_csv(products: Iterable[Dict[str, Any]], link: LinkFor, base_url: str) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FEED_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    for i, product in enumerate(_products(products), start=1):
+        writer.writerow(feed_row(product, link, base_url))
+        if i % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_feed_xml(products: Iterable[Dict[str, Any]], link: LinkFor, base_url: str) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<products>\n'
+    chunk: List[str] = []
+    for product in _products(products):
+        row = feed_row(product, link, base_url)
+        fields = "".join(f"<{field}>{escape(row[field])}</{field}>" for field in FEED_FIELDS)
+        chunk.append(f"  <product>{fields}</product>\n")
+        if len(chunk) == CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk) + "</products>\n"
+
+
+def _lastmod(product: Dict[str, Any]) -> Optional[str]:
+    updated = product.get("updated_at")
+    return updated.strftime("%Y-%m-%d") if isinstance(updated, datetime) else None
+
+
+def iter_sitemap(products: Iterable[Dict[str, Any]], link: LinkFor, pages: Iterable[str]) -> Iterator[str]:
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n'
+    chunk = [f"  <url><loc>{escape(url)}</loc></url>\n" for url in pages]
+    for product in _products(products):
+        lastmod = _lastmod(product)
+        chunk.append(f"  <url><loc>{escape(link(product['id']))}</loc>"
+                     + (f"<lastmod>{lastmod}</lastmod>" if lastmod else "") + "</url>\n")
+        if len(chunk) >= CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk) + "</urlset>\n"
+
+
+def catalog_validators(products: List[Dict[str, Any]]) -> Tuple[str, Optional[datetime]]:
+    """Content fingerprint and newest ``updated_at`` of a catalog.
+
+    The fingerprint depends only on the products, so every worker derives
+    the same ETag for the same catalog.
+    """
+    digest = hashlib.sha256()
+    newest: Optional[datetime] = None
+    for product in products:
+        updated = product.get("updated_at")
+        # Not every writer bumps updated_at, so the feed fields count as well
+        fields = [str(product.get(field) or "") for field in FEED_FIELDS[:-2]]
+        digest.update("\x1f".join(fields + [first_image(product), str(updated)]).encode("utf-8") + b"\x1e")
+        if isinstance(updated, datetime):
+            updated = updated.replace(tzinfo=None) if updated.tzinfo else updated
+            newest = updated if newest is None or updated > newest else newest
+    return digest.hexdigest()[:24], newest
+
+
+def feed_etag(kind: str, fingerprint: str, base_url: str) -> str:
+    # Links are absolute, so the same catalog served on another host is another body
+    host = hashlib.sha1(base_url.encode("utf-8")).hexdigest()[:8]
+    return f"{kind}-{fingerprint}-{host}"
+
+
+# ---------------------------------------------------------------------
+# Feed Cache
+# ---------------------------------------------------------------------
+class FeedCache:
+    """Sitemap and feed bodies rendered once per catalog version.
+
+    The first request for a feed streams it from the in-memory catalog
+    while recording the encoded chunks; later requests for the same
+    catalog replay them. A new catalog list drops every recorded body.
+    Bodies larger than ``max_bytes`` are streamed but never kept.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._source: Optional[List[Dict[str, Any]]] = None
+        self._validators: Tuple[str, Optional[datetime]] = ("", None)
+        self._bodies: Dict[Hashable, List[bytes]] = {}
+        self.stats = {"rendered": 0, "replayed": 0, "too_large": 0}
+
+    def _sync(self, products: List[Dict[str, Any]]) -> None:
+        if products is not self._source:
+            self._source = products
+            self._validators = catalog_validators(products)
+            self._bodies = {}
+
+    def validators(self, products: List[Dict[str, Any]]) -> Tuple[str, Optional[datetime]]:
+        with self._lock:
+            self._sync(products)
+            return self._validators
+
+    def stream(self, key: Hashable, products: List[Dict[str, Any]],
+               render: Callable[[], Iterable[str]]) -> Iterator[bytes]:
+        with self._lock:
+            self._sync(products)
+            body = self._bodies.get(key)
+            if body is not None:
+                self.stats["replayed"] += 1
+        if body is not None:
+            yield from body
+            return
+
+        chunks: List[bytes] = []
+        size = 0
+        for text in render():
+            data = text.encode("utf-8")
+            if size <= self.max_bytes:
+                chunks.append(data)
+                size += len(data)
+            yield data
+        with self._lock:
+            self.stats["rendered"] += 1
+            if size > self.max_bytes:
+                self.stats["too_large"] += 1
+            elif products is self._source:
+                self._bodies[key] = chunks
@@ -0,0 +1,199 @@
+import contextvars
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from werkzeug.datastructures import FileStorage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it only originals are stored
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger("wallcraft")
+
+# Derivative name -> target width in pixels (never upscaled)
+DERIVATIVE_WIDTHS = {"thumb": 160, "card": 480, "detail": 1200}
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+STATIC_DERIVED_DIR = "derived"
+STATIC_WIDTHS = (240, 480, 960)
+
+
+def imaging_available() -> bool:
+    return Image is not None
+
+
+def _open(data: bytes):
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    return image
+
+
+def _encode(image, fmt: str) -> bytes:
+    pil_format, _, options = FORMATS[fmt]
+    if pil_format == "JPEG" and image.mode != "RGB":
+        # JPEG has no alpha; flatten onto white like the site background cards
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1] if image.mode == "RGBA" else None)
+        image = background
+    out = io.BytesIO()
+    image.save(out, pil_format, **options)
+    return out.getvalue()
+
+
+def _resized(image, width: int):
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def render_derivatives(data: bytes, widths: Dict[str, int] = DERIVATIVE_WIDTHS) -> Dict[str, Dict[str, Any]]:
+    """Return ``{name: {"width": w, "webp": bytes, "jpeg": bytes}}`` for one image."""
+    image = _open(data)
+    rendered = {}
+    for name, width in widths.items():
+        resized = _resized(image, width)
+        rendered[name] = {"width": resized.width}
+        for fmt in FORMATS:
+            rendered[name][fmt] = _encode(resized, fmt)
+    return rendered
+
+
+# ---------------------------------------------------------------------
+# Product image variants
+# ---------------------------------------------------------------------
+def variant_for(product: Dict[str, Any], url: str) -> Optional[Dict[str, Any]]:
+    for variant in product.get("img_variants") or []:
+        if variant.get("src") == url:
+            return variant
+    return None
+
+
+def srcset(variant: Dict[str, Any], fmt: str) -> str:
+    return ", ".join(
+        f"{variant[name][fmt]} {variant[name]['width']}w"
+        for name in DERIVATIVE_WIDTHS
+        if name in variant and fmt in variant[name]
+    )
+
+
+class ImageProcessor:
+    """Builds and uploads thumbnail/card/detail derivatives of product images.
+
+    Each variant is stored in the product's ``img_variants`` list as
+    ``{"src": original_url, "thumb": {"width", "webp", "jpeg"}, ...}`` so
+    templates can look it up from the matching ``imgs`` entry.
+
+    Several images are processed side by side on a small pool: while one is
+    being resized, the derivatives of another are already uploading through
+    the uploader's own pool.
+    """
+
+    def __init__(self, uploader, max_workers: int = 3):
+        self.uploader = uploader
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="image-derivatives"
+                )
+            return self._executor
+
+    def build_variant(self, src: str, data: bytes, name: str = "image") -> Optional[Dict[str, Any]]:
+        if not imaging_available():
+            return None
+        try:
+            rendered = render_derivatives(data)
+        except Exception as e:
+            logger.error(f"Could not render derivatives for {name}: {e}")
+            return None
+
+        stem = os.path.splitext(os.path.basename(name))[0] or "image"
+        jobs: List[Tuple[str, str]] = []
+        files = []
+        for size, encoded in rendered.items():
+            for fmt, (_, mimetype, _) in FORMATS.items():
+                ext = "jpg" if fmt == "jpeg" else fmt
+                files.append(FileStorage(io.BytesIO(encoded[fmt]), filename=f"{stem}-{size}.{ext}", content_type=mimetype))
+                jobs.append((size, fmt))
+
+        results = self.uploader.upload_many(files)
+        variant: Dict[str, Any] = {"src": src}
+        for (size, fmt), result in zip(jobs, results):
+            if not result.ok:
+                logger.error(f"Derivative upload failed for {name} ({size}/{fmt}): {result.error}")
+                return None
+            variant.setdefault(size, {"width": rendered[size]["width"]})[fmt] = result.url
+        return variant
+
+    def build_variants(self, uploads: List[Tuple[str, Any]]) -> List[Dict[str, Any]]:
+        # ``uploads`` pairs each uploaded URL with the FileStorage it came from.
+        jobs = []
+        for url, file_storage in uploads:
+            file_storage.seek(0)
+            jobs.append((url, file_storage.read(), file_storage.filename or "image"))
+        if len(jobs) <= 1 or self.max_workers <= 1:
+            results = [self.build_variant(*job) for job in jobs]
+        else:
+            # Same context handling as ImageUploader.upload_many, for per-request metrics
+            futures = [self.executor.submit(contextvars.copy_context().run, self.build_variant, *job) for job in jobs]
+            results = [future.result() for future in futures]
+        return [variant for variant in results if variant]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def fetch_and_build(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.uploader.session.get(url, timeout=self.uploader.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Could not download {url} for derivatives: {e}")
+            return None
+        return self.build_variant(url, response.content, url.rsplit("/", 1)[-1])
+
+
+# ---------------------------------------------------------------------
+# Local static images
+# ---------------------------------------------------------------------
+def static_derivative_name(filename: str, width: int, fmt: str) -> str:
+    # images/logo.jpg -> images/derived/logo-240.webp
+    folder, name = os.path.split(filename)
+    stem = os.path.splitext(name)[0]
+    ext = "jpg" if fmt == "jpeg" else fmt
+    return "/".join(p for p in (folder, STATIC_DERIVED_DIR, f"{stem}-{width}.{ext}") if p)
+
+
+def build_static_derivatives(static_folder: str, filenames: List[str]) -> List[str]:
+    written = []
+    for filename in filenames:
+        path = os.path.join(static_folder, filename)
+        with open(path, "rb") as f:
+            image = _open(f.read())
+        for width in STATIC_WIDTHS:
+            resized = _resized(image, width)
+            for fmt in FORMATS:
+                target = os.path.join(static_folder, static_derivative_name(filename, width, fmt))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as f:
+                    f.write(_encode(resized, fmt))
+                written.append(target)
+    return written
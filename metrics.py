@@ -0,0 +1,363 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("wallcraft")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# ---------------------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------------------
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(**labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(row)) for labels, row in self._values.items())
+        for labels, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._gauges: List[Tuple[str, str, Callable[[], Dict[Labels, float]]]] = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], Dict[Labels, float]]) -> None:
+        self._gauges.append((name, help_text, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, collect in self._gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {e}")
+                continue
+            for labels, value in sorted(values.items()):
+                if value is not None:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def stat_values(stats: Dict[str, Any]) -> Dict[Labels, float]:
+    """Turn a ``stats`` dict from one of the caches into gauge samples labelled by key."""
+    return {_labels(stat=k): float(v) for k, v in stats.items() if isinstance(v, (int, float))}
+
+
+registry = Registry()
+
+request_latency = registry.histogram(
+    "wallcraft_request_duration_seconds", "Request latency by route, method and status.")
+request_firestore_reads = registry.histogram(
+    "wallcraft_request_firestore_reads", "Firestore documents read per request.", COUNT_BUCKETS)
+request_firestore_round_trips = registry.histogram(
+    "wallcraft_request_firestore_round_trips", "Firestore round trips per request.", COUNT_BUCKETS)
+firestore_ops = registry.counter(
+    "wallcraft_firestore_operations_total", "Firestore calls by operation.")
+firestore_documents = registry.counter(
+    "wallcraft_firestore_documents_total", "Firestore documents read or written.")
+firestore_latency = registry.histogram(
+    "wallcraft_firestore_duration_seconds", "Firestore call latency by operation.")
+upstream_latency = registry.histogram(
+    "wallcraft_upstream_duration_seconds", "Outbound HTTP latency by service, method and status.")
+
+
+# ---------------------------------------------------------------------
+# Per-request accounting
+# ---------------------------------------------------------------------
+class RequestStats:
+    __slots__ = ("started", "elapsed", "firestore_reads", "firestore_writes", "firestore_round_trips",
+                 "firestore_seconds", "upstream_calls", "upstream_seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.firestore_reads = 0
+        self.firestore_writes = 0
+        self.firestore_round_trips = 0
+        self.firestore_seconds = 0.0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+
+    def server_timing(self) -> str:
+        parts = [f"app;dur={self.elapsed * 1000:.1f}"]
+        if self.firestore_round_trips:
+            parts.append(
+                f'firestore;dur={self.firestore_seconds * 1000:.1f};'
+                f'desc="{self.firestore_round_trips} calls, {self.firestore_reads} reads, {self.firestore_writes} writes"'
+            )
+        if self.upstream_calls:
+            parts.append(f'upstream;dur={self.upstream_seconds * 1000:.1f};desc="{self.upstream_calls} calls"')
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("wallcraft_request_stats", default=None)
+
+
+def begin_request() -> RequestStats:
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def end_request(route: str, method: str, status: int) -> Optional[RequestStats]:
+    stats = _current.get()
+    if stats is None:
+        return None
+    _current.set(None)
+    stats.elapsed = time.perf_counter() - stats.started
+    request_latency.observe(stats.elapsed, route=route, method=method, status=status)
+    request_firestore_reads.observe(stats.firestore_reads, route=route)
+    request_firestore_round_trips.observe(stats.firestore_round_trips, route=route)
+    return stats
+
+
+def record_firestore(op: str, elapsed: float, reads: int = 0, writes: int = 0) -> None:
+    firestore_ops.inc(op=op)
+    firestore_latency.observe(elapsed, op=op)
+    if reads:
+        firestore_documents.inc(reads, kind="read")
+    if writes:
+        firestore_documents.inc(writes, kind="write")
+    stats = _current.get()
+    if stats is not None:
+        stats.firestore_round_trips += 1
+        stats.firestore_seconds += elapsed
+        stats.firestore_reads += reads
+        stats.firestore_writes += writes
+
+
+def record_upstream(service: str, method: str, status, elapsed: float) -> None:
+    upstream_latency.observe(elapsed, service=service, method=method.upper(), status=status)
+    stats = _current.get()
+    if stats is not None:
+        stats.upstream_calls += 1
+        stats.upstream_seconds += elapsed
+
+
+# ---------------------------------------------------------------------
+# Firestore instrumentation
+# ---------------------------------------------------------------------
+# Filled in by instrument_firestore() so importing this module stays cheap
+_WRAPPED_TYPES: Tuple[type, ...] = ()
+_QUERY_TYPES: Tuple[type, ...] = ()
+
+
+def _load_types() -> None:
+    global _WRAPPED_TYPES, _QUERY_TYPES
+    if _WRAPPED_TYPES:
+        return
+    from google.cloud.firestore_v1.base_batch import BaseWriteBatch
+    from google.cloud.firestore_v1.base_collection import BaseCollectionReference
+    from google.cloud.firestore_v1.base_document import BaseDocumentReference
+    from google.cloud.firestore_v1.base_query import BaseQuery
+    _QUERY_TYPES = (BaseCollectionReference, BaseQuery)
+    _WRAPPED_TYPES = (BaseCollectionReference, BaseDocumentReference, BaseQuery, BaseWriteBatch)
+
+_WRITE_OPS = {"set", "update", "delete", "create", "add"}
+
+
+def _unwrap(value):
+    if isinstance(value, FirestoreProxy):
+        return value._target
+    if isinstance(value, list):
+        return [_unwrap(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_unwrap(v) for v in value)
+    return value
+
+
+def _wrap(value):
+    if _WRAPPED_TYPES and isinstance(value, _WRAPPED_TYPES):
+        return FirestoreProxy(value)
+    return value
+
+
+class FirestoreProxy:
+    """Transparent wrapper that times and counts Firestore round trips.
+
+    Collection, document, query and batch objects handed out by the client
+    are wrapped as well, so ``db.collection(...).document(...).get()`` is
+    measured without changing any call site.
+    """
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            args = _unwrap(args)
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            if name == "stream":
+                return self._timed_stream(attr(*args, **kwargs))
+            if name == "get_all":
+                return self._timed_stream(attr(*args, **kwargs), op="get_all")
+            if name == "get" and isinstance(self._target, _QUERY_TYPES):
+                return list(self._timed_stream(self._target.stream(*args, **kwargs)))
+            if name in _WRITE_OPS or name in ("get", "commit"):
+                started = time.perf_counter()
+                try:
+                    return _wrap(attr(*args, **kwargs))
+                finally:
+                    elapsed = time.perf_counter() - started
+                    if name == "get":
+                        record_firestore("get", elapsed, reads=1)
+                    elif name == "commit":
+                        record_firestore("commit", elapsed, writes=len(self._target))
+                    else:
+                        record_firestore(name, elapsed, writes=1)
+            return _wrap(attr(*args, **kwargs))
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __bool__(self):
+        # ``if not db`` must not fall through to __len__, which only batches support
+        return bool(self._target)
+
+    def __len__(self):
+        return len(self._target)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f"FirestoreProxy({self._target!r})"
+
+    @staticmethod
+    def _timed_stream(iterator, op: str = "stream"):
+        started = time.perf_counter()
+        reads = 0
+        try:
+            for item in iterator:
+                reads += 1
+                yield item
+        finally:
+            record_firestore(op, time.perf_counter() - started, reads=reads)
+
+
+def instrument_firestore(client):
+    if client is None:
+        return None
+    _load_types()
+    return FirestoreProxy(client)
+
+
+# ---------------------------------------------------------------------
+# HTTP instrumentation
+# ---------------------------------------------------------------------
+def instrument_session(session, service: str):
+    """Record latency of every request made through a ``requests.Session``."""
+    if getattr(session, "_wallcraft_service", None):
+        return session
+    original = session.request
+
+    def request(method, url, *args, **kwargs):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = original(method, url, *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            record_upstream(service, method, status, time.perf_counter() - started)
+
+    session.request = request
+    session._wallcraft_service = service
+    return session
@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("wallcraft")
+
+ORDERS_COLLECTION = "orders"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    written_at REAL
+);
+CREATE INDEX IF NOT EXISTS orders_pending ON orders (status, created_at);
+CREATE INDEX IF NOT EXISTS orders_written ON orders (status, written_at);
+"""
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot journal value of type {type(value).__name__}")
+
+
+def _decode(obj):
+    if "__datetime__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def dump_order(order: Dict[str, Any]) -> str:
+    return json.dumps(order, default=_encode, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_order(payload: str) -> Dict[str, Any]:
+    return json.loads(payload, object_hook=_decode)
+
+
+def write_order(db, order: Dict[str, Any],
+                stage: Optional[Callable[[Any, Any, Dict[str, Any]], None]] = None) -> bool:
+    """Create ``orders/<order_id>`` plus whatever ``stage`` adds, in one atomic commit.
+
+    Returns False when the order document already exists: an earlier attempt
+    committed, so neither the order nor its aggregates are written twice.
+    """
+    from google.api_core import exceptions
+
+    batch = db.batch()
+    batch.create(db.collection(ORDERS_COLLECTION).document(str(order["order_id"])), order)
+    if stage is not None:
+        stage(batch, db, order)
+    try:
+        batch.commit()
+    except exceptions.AlreadyExists:
+        return False
+    return True
+
+
+# ---------------------------------------------------------------------
+# Order Journal
+# ---------------------------------------------------------------------
+class OrderJournal:
+    """Durable local queue of verified orders, keyed by Razorpay order id.
+
+    Each append is committed to SQLite with ``synchronous=FULL`` before the
+    customer sees the success page. Re-appending an order id is a no-op, so
+    a double-submitted checkout cannot produce a second order.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def append(self, order: Dict[str, Any]) -> bool:
+        """Journal ``order``; returns False if its order id was already journaled."""
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO orders (order_id, payload, created_at) VALUES (?, ?, ?)",
+                (str(order["order_id"]), dump_order(order), time.time()),
+            )
+            return cur.rowcount == 1
+        finally:
+            conn.close()
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT payload FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        finally:
+            conn.close()
+        return load_order(row[0]) if row else None
+
+    def claim(self, limit: int = 50) -> List[Tuple[str, Dict[str, Any], int]]:
+        # Leases keep several worker processes from draining the same rows at once.
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT order_id, payload, attempts FROM orders WHERE status = 'pending' AND lease_until < ? "
+                "ORDER BY created_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE orders SET lease_until = ? WHERE order_id = ?",
+                [(now + self.lease_seconds, order_id) for order_id, _, _ in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [(order_id, load_order(payload), attempts) for order_id, payload, attempts in rows]
+
+    def mark_written(self, order_id: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE orders SET status = 'written', written_at = ?, last_error = NULL WHERE order_id = ?",
+                (time.time(), order_id),
+            )
+        finally:
+            conn.close()
+
+    def prune_written(self, max_age: float) -> int:
+        """Delete orders written to Firestore more than ``max_age`` seconds ago."""
+        conn = self._connect()
+        try:
+            cur = conn.execute("DELETE FROM orders WHERE status = 'written' AND written_at < ?",
+                               (time.time() - max_age,))
+            return cur.rowcount
+        finally:
+            conn.close()
+
+    def mark_failed(self, order_id: str, error: str, retry_in: float) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE orders SET attempts = attempts + 1, last_error = ?, lease_until = ? WHERE order_id = ?",
+                (error[:500], time.time() + retry_in, order_id),
+            )
+        finally:
+            conn.close()
+
+    def counts(self) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM orders GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        counts = {"pending": 0, "written": 0}
+        counts.update(dict(rows))
+        return counts
+
+
+# ---------------------------------------------------------------------
+# Background Writer
+# ---------------------------------------------------------------------
+class OrderWriter:
+    """Drains the journal into Firestore ``orders/<order_id>`` documents.
+
+    Writes use the Razorpay order id as the document id and ``create`` it,
+    so a retry after a timeout that actually committed is recognised rather
+    than counted twice by the writes ``stage`` adds to the same commit.
+    Written rows stay in the journal for ``keep_written`` seconds, so a
+    late double submit is still recognised locally, and are then pruned.
+    The thread is started lazily so it runs inside each forked worker.
+    """
+
+    def __init__(self, journal: OrderJournal, db_getter: Callable[[], Any],
+                 interval: float = 5.0, max_backoff: float = 300.0,
+                 stage: Optional[Callable[[Any, Any, Dict[str, Any]], None]] = None,
+                 on_written: Optional[Callable[[], None]] = None, keep_written: float = 86400.0):
+        self.journal = journal
+        self.keep_written = keep_written
+        self._db_getter = db_getter
+        self.stage = stage
+        self.on_written = on_written
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def ensure_started(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="order-writer", daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        self.ensure_started()
+        self._wake.set()
+
+    def drain(self) -> int:
+        db = self._db_getter()
+        if db is None:
+            return 0
+        written = 0
+        while True:
+            batch = self.journal.claim()
+            if not batch:
+                if written:
+                    pruned = self.journal.prune_written(self.keep_written)
+                    if pruned:
+                        logger.info(f"Pruned {pruned} written orders from the journal")
+                    if self.on_written:
+                        self.on_written()
+                return written
+            for order_id, order, attempts in batch:
+                try:
+                    if not write_order(db, order, self.stage):
+                        logger.info(f"Order {order_id} was already in Firestore")
+                except Exception as e:
+                    retry_in = min(self.max_backoff, self.interval * (2 ** min(attempts, 6)))
+                    self.journal.mark_failed(order_id, str(e), retry_in)
+                    logger.error(f"Could not write order {order_id} to Firestore, retrying in {retry_in:.0f}s: {e}")
+                    continue
+                self.journal.mark_written(order_id)
+                written += 1
+                logger.info(f"Order {order_id} saved in Firestore")
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Order writer error: {e}")
@@ -0,0 +1,120 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from flask import Response, make_response, request, session
+
+logger = logging.getLogger("wallcraft")
+
+
+class CachedPage:
+    __slots__ = ("body", "mimetype", "etag", "created")
+
+    def __init__(self, body: bytes, mimetype: str):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.created = time.monotonic()
+
+    def to_response(self, status: str) -> Response:
+        response = Response(self.body, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        # Browsers keep the page but must revalidate, which costs one 304
+        response.cache_control.no_cache = True
+        response.headers["X-Page-Cache"] = status
+        return response.make_conditional(request)
+
+
+class PageCache:
+    """LRU cache of rendered pages bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024, ttl: float = 120.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "bypass": 0, "evictions": 0}
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if time.monotonic() - entry.created >= self.ttl:
+                self._remove(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key: Hashable, entry: CachedPage) -> None:
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes})
+        return stats
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def cached(self, *versions: Callable[[], Hashable], enabled: Callable[[], bool] = lambda: True,
+               shows_flashes: bool = False):
+        """Cache a GET view keyed by endpoint, view args, query string and ``versions``.
+
+        For views that render flashed messages (``shows_flashes``), requests
+        carrying flashes bypass the cache so the messages are shown and
+        consumed; other views ignore them. Only plain 200 responses are stored.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != "GET" or (shows_flashes and session.get("_flashes")) or not enabled():
+                    with self._lock:
+                        self.stats["bypass"] += 1
+                    return view(*args, **kwargs)
+
+                key = (
+                    request.endpoint,
+                    tuple(sorted(kwargs.items())),
+                    tuple(sorted(request.args.items(multi=True))),
+                    tuple(version() for version in versions),
+                )
+                entry = self.get(key)
+                if entry is not None:
+                    return entry.to_response("HIT")
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                entry = CachedPage(response.get_data(), response.mimetype)
+                self.put(key, entry)
+                return entry.to_response("MISS")
+            return wrapper
+        return decorator
@@ -4,4 +4,6 @@ BASE_DIR = os.path.dirname(__file__)
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
-from app import app as application  # Passenger looks for `application`
+from app import create_app
+
+application = create_app()  # Passenger looks for `application`
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, List, MutableMapping, Optional
+
+logger = logging.getLogger("wallcraft")
+
+CHECKOUT_SESSION_KEY = "checkout"
+
+
+def make_http_session(timeout=(3.05, 10), retries: int = 2, pool_size: int = 10):
+    """Pooled ``requests.Session`` with retries and a default timeout on every request."""
+    # Imported here so the app does not pay for requests until a session is needed
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    send = session.request
+
+    def request(method, url, **kwargs):
+        kwargs.setdefault("timeout", timeout)
+        return send(method, url, **kwargs)
+
+    session.request = request
+    # Connection errors are retried for every method since nothing was sent.
+    # Status retries keep urllib3's default idempotent methods: a 502/504 on
+    # POST /v1/orders may come after Razorpay created the order.
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def cart_fingerprint(items: List[Dict[str, Any]], total: int) -> str:
+    lines = sorted((str(i["id"]), i["size"], int(i["qty"]), int(i["price"])) for i in items)
+    raw = json.dumps([lines, int(total)], separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+# ---------------------------------------------------------------------
+# Checkout Sessions
+# ---------------------------------------------------------------------
+class CheckoutOrders:
+    """Reuses one Razorpay order per priced cart.
+
+    The order id is kept in the visitor's session next to the cart
+    fingerprint, so refreshing /checkout or navigating back does not create
+    a new order until the cart contents or prices change or ``ttl`` passes.
+    Orders older than ``verify_after`` are checked with Razorpay before
+    reuse, in case the visitor paid but never came back to /process_order.
+    """
+
+    def __init__(self, client, currency: str = "INR", ttl: float = 1800.0, verify_after: float = 120.0):
+        self.client = client
+        self.currency = currency
+        self.ttl = ttl
+        self.verify_after = verify_after
+        self.stats = {"reused": 0, "created": 0, "errors": 0}
+
+    def cached(self, state: MutableMapping) -> Optional[Dict[str, Any]]:
+        """The session's Razorpay order, if it is young enough to reuse."""
+        cached = state.get(CHECKOUT_SESSION_KEY)
+        if cached and cached.get("order_id") and time.time() - cached.get("created", 0) < self.ttl:
+            return dict(cached)
+        return None
+
+    def fetch(self, cached: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Razorpay's current copy of a cached order; None when it is too new to need checking or cannot be read.
+
+        Does not touch the session, so it can run beside cart pricing.
+        """
+        if not cached or time.time() - cached.get("created", 0) < self.verify_after:
+            return None
+        try:
+            return self.client.order.fetch(cached["order_id"])
+        except Exception as e:
+            logger.warning(f"Could not look up Razorpay order {cached['order_id']}: {e}")
+            return None
+
+    def order_id_for(self, state: MutableMapping, items: List[Dict[str, Any]], total: int,
+                     remote: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """The order to pay for this cart, reusing the session's when it still fits.
+
+        ``remote`` is the cached order as :meth:`fetch` returned it; an order
+        Razorpay no longer accepts payment for (already paid, other amount)
+        is replaced rather than reused.
+        """
+        if total <= 0:
+            return None
+        fingerprint = cart_fingerprint(items, total)
+        cached = self.cached(state)
+        stale = remote is not None and (remote.get("status") != "created" or remote.get("amount") != total * 100)
+        if cached and cached.get("fp") == fingerprint and not stale:
+            self.stats["reused"] += 1
+            return cached["order_id"]
+
+        try:
+            order = self.client.order.create({
+                "amount": total * 100,
+                "currency": self.currency,
+                "payment_capture": "1",
+                "notes": {"cart": fingerprint},
+            })
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Razorpay order creation failed: {e}")
+            return None
+
+        self.stats["created"] += 1
+        state[CHECKOUT_SESSION_KEY] = {"fp": fingerprint, "order_id": order.get("id"), "created": time.time()}
+        return order.get("id")
+
+    def forget(self, state: MutableMapping) -> None:
+        state.pop(CHECKOUT_SESSION_KEY, None)
@@ -0,0 +1,178 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from catalog import PRICE_SIZES
+
+logger = logging.getLogger("wallcraft")
+
+PRODUCTS_COLLECTION = "products"
+# Fields an admin form may overwrite; images go through the array helpers
+EDITABLE_FIELDS = ("name", "desc", "features") + tuple(f"price_{size}" for size in PRICE_SIZES)
+
+
+class ProductConflict(RuntimeError):
+    """The product changed after the admin loaded it."""
+
+
+class ProductNotFound(LookupError):
+    """The product document does not exist (any more)."""
+
+
+def _image_list(imgs) -> List[str]:
+    if isinstance(imgs, str):
+        return [imgs]
+    return list(imgs or [])
+
+
+def _variants_for(product: Optional[Dict[str, Any]], url: str) -> List[Dict[str, Any]]:
+    return [v for v in (product or {}).get("img_variants") or [] if v.get("src") == url]
+
+
+# ---------------------------------------------------------------------
+# Product Writer
+# ---------------------------------------------------------------------
+class ProductWriter:
+    """Field-level admin writes to ``products/{id}``.
+
+    Every action is a single ``update()``: edited fields are written as
+    they are, images are added and removed with ``ArrayUnion`` and
+    ``ArrayRemove``, and nothing the form did not touch is rewritten. When
+    the caller knows which revision it edited (the document's
+    ``update_time``), the write carries it as a precondition, so an edit
+    made in the meantime is reported as a :class:`ProductConflict` rather
+    than silently overwritten.
+    """
+
+    def __init__(self, db_getter: Callable[[], Any]):
+        self._db_getter = db_getter
+        self._lock = threading.Lock()
+        self.stats = {"writes": 0, "conflicts": 0, "retries": 0}
+
+    def _db(self):
+        db = self._db_getter()
+        if db is None:
+            raise RuntimeError("Firestore is not initialized")
+        return db
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _write(self, pid: int, data: Optional[Dict[str, Any]], expected: Optional[datetime] = None) -> None:
+        """One ``update`` (or ``delete`` when ``data`` is None), guarded by ``expected``."""
+        from google.api_core import exceptions
+
+        db = self._db()
+        ref = db.collection(PRODUCTS_COLLECTION).document(str(pid))
+        option = db.write_option(last_update_time=expected) if expected else None
+        try:
+            if data is None:
+                ref.delete(option=option)
+            else:
+                ref.update(data, option=option)
+        except exceptions.FailedPrecondition as e:
+            # Also raised when the document was deleted since that revision
+            self._count("conflicts")
+            raise ProductConflict(pid) from e
+        except exceptions.NotFound as e:
+            raise ProductNotFound(pid) from e
+        self._count("writes")
+
+    def update(self, pid: int, fields: Dict[str, Any], add_imgs: Iterable[str] = (),
+               add_variants: Iterable[Dict[str, Any]] = (), expected: Optional[datetime] = None,
+               current: Optional[Dict[str, Any]] = None) -> None:
+        """Overwrite the edited ``fields`` and append any new images.
+
+        ``current`` is only a hint: a legacy product whose ``imgs`` is still
+        a bare string gets that URL folded into the union, which Firestore
+        would otherwise replace with the new array.
+        """
+        from firebase_admin import firestore
+
+        data = {k: v for k, v in fields.items() if k in EDITABLE_FIELDS}
+        add_imgs = list(add_imgs)
+        add_variants = list(add_variants)
+        if add_imgs:
+            legacy = (current or {}).get("imgs")
+            data["imgs"] = firestore.ArrayUnion(([legacy] if isinstance(legacy, str) else []) + add_imgs)
+        if add_variants:
+            data["img_variants"] = firestore.ArrayUnion(add_variants)
+        data["updated_at"] = firestore.SERVER_TIMESTAMP
+        self._write(pid, data, expected)
+
+    def remove_image(self, pid: int, url: str, current: Optional[Dict[str, Any]] = None) -> None:
+        """Drop ``url`` and its derivatives; concurrent image edits are kept.
+
+        Raises :class:`ProductNotFound` when the product does not have
+        ``url``. A ``current`` copy without it is confirmed with one read, in
+        case the image was added after that copy was cached.
+        """
+        from firebase_admin import firestore
+
+        if current is not None and url not in _image_list(current.get("imgs")):
+            snapshot = self._db().collection(PRODUCTS_COLLECTION).document(str(pid)).get()
+            current = snapshot.to_dict() if snapshot.exists else None
+            if current is None or url not in _image_list(current.get("imgs")):
+                raise ProductNotFound(f"Product {pid} has no image {url}")
+        data = {"imgs": firestore.ArrayRemove([url]), "updated_at": firestore.SERVER_TIMESTAMP}
+        variants = _variants_for(current, url)
+        if variants:
+            data["img_variants"] = firestore.ArrayRemove(variants)
+        self._write(pid, data)
+
+    def replace_image(self, pid: int, old_url: str, new_url: str,
+                      new_variants: Iterable[Dict[str, Any]] = (),
+                      current: Optional[Dict[str, Any]] = None) -> bool:
+        """Swap ``old_url`` for ``new_url`` in place; False when ``old_url`` is gone.
+
+        Keeping the image's position needs the whole array, so the write is
+        built from ``current`` (normally the cached product) and guarded by
+        its ``update_time``. Only when that copy turns out to be stale is
+        the document read again, inside a transaction.
+        """
+        from firebase_admin import firestore
+
+        new_variants = list(new_variants)
+
+        def replaced(product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            imgs = _image_list(product.get("imgs"))
+            if old_url not in imgs:
+                return None
+            imgs[imgs.index(old_url)] = new_url
+            variants = [v for v in product.get("img_variants") or [] if v.get("src") != old_url]
+            return {"imgs": imgs, "img_variants": variants + new_variants,
+                    "updated_at": firestore.SERVER_TIMESTAMP}
+
+        if current is not None and current.get("update_time"):
+            data = replaced(current)
+            if data is not None:
+                try:
+                    self._write(pid, data, current["update_time"])
+                    return True
+                except ProductConflict:
+                    self._count("retries")
+                    logger.info(f"Product {pid} changed since it was cached; re-reading for image replace")
+
+        db = self._db()
+        ref = db.collection(PRODUCTS_COLLECTION).document(str(pid))
+
+        @firestore.transactional
+        def swap(transaction) -> bool:
+            snapshot = ref.get(transaction=transaction)
+            if not snapshot.exists:
+                raise ProductNotFound(pid)
+            data = replaced(snapshot.to_dict() or {})
+            if data is None:
+                return False
+            transaction.update(ref, data)
+            return True
+
+        done = swap(db.transaction())
+        if done:
+            self._count("writes")
+        return done
+
+    def delete(self, pid: int, expected: Optional[datetime] = None) -> None:
+        self._write(pid, None, expected)
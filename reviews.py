@@ -0,0 +1,180 @@
+import base64
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("wallcraft")
+
+REVIEWS_COLLECTION = "reviews"
+STATS_COLLECTION = "stats"
+REVIEW_STATS_DOC = "reviews"
+MAX_PAGE_SIZE = 50
+
+
+def review_from_doc(doc) -> Dict[str, Any]:
+    review = doc.to_dict() or {}
+    return {
+        "customer_name": review.get("customer_name", "Anonymous"),
+        "review_text": review.get("review_text", ""),
+        "rating": int(review.get("rating", 0)),
+    }
+
+
+def empty_review_stats() -> Dict[str, Any]:
+    return {"count": 0, "rating_sum": 0, "histogram": {str(i): 0 for i in range(1, 6)}}
+
+
+def review_stats_from_dict(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    stats = empty_review_stats()
+    if data:
+        stats["count"] = int(data.get("count", 0))
+        stats["rating_sum"] = int(data.get("rating_sum", 0))
+        for star, n in (data.get("histogram") or {}).items():
+            if star in stats["histogram"]:
+                stats["histogram"][star] = int(n)
+    stats["average"] = round(stats["rating_sum"] / stats["count"], 1) if stats["count"] else 0
+    return stats
+
+
+# ---------------------------------------------------------------------
+# Cursors
+# ---------------------------------------------------------------------
+def encode_cursor(doc) -> str:
+    ts = (doc.to_dict() or {}).get("timestamp")
+    payload = {"t": ts.isoformat() if isinstance(ts, datetime) else None, "id": doc.id}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Dict[str, Any]]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return {
+            "timestamp": datetime.fromisoformat(payload["t"]),
+            "__name__": str(payload["id"]),
+        }
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------------------
+# Review Feed
+# ---------------------------------------------------------------------
+class ReviewFeed:
+    """Newest-first review pages read with ``limit`` + ``start_after``.
+
+    The first page and the aggregate stats document are cached for ``ttl``
+    seconds and dropped by :meth:`invalidate` whenever a review is written.
+    """
+
+    def __init__(self, db, page_size: int = 8, ttl: float = 120.0):
+        self.db = db
+        self.page_size = page_size
+        self.ttl = ttl
+        # Bumped on every local review write so rendered pages can key on it
+        self.version = 0
+        self._lock = threading.Lock()
+        self._first_page: Optional[Tuple[float, Dict[str, Any]]] = None
+        self._stats: Optional[Tuple[float, Dict[str, Any]]] = None
+
+    def _query(self):
+        from firebase_admin import firestore
+        return (
+            self.db.collection(REVIEWS_COLLECTION)
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .order_by("__name__", direction=firestore.Query.DESCENDING)
+        )
+
+    def page(self, cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        limit = max(1, min(limit or self.page_size, MAX_PAGE_SIZE))
+        first = not cursor and limit == self.page_size
+        if first:
+            with self._lock:
+                cached = self._first_page
+            if cached and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+
+        result = {"reviews": [], "next_cursor": None}
+        if not self.db:
+            return result
+        query = self._query()
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None:
+                return result
+            query = query.start_after(position)
+        # One extra document tells us whether another page exists
+        docs = list(query.limit(limit + 1).stream())
+        result["reviews"] = [review_from_doc(d) for d in docs[:limit]]
+        if len(docs) > limit:
+            result["next_cursor"] = encode_cursor(docs[limit - 1])
+
+        if first:
+            with self._lock:
+                self._first_page = (time.monotonic(), result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = self._stats
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        if not self.db:
+            return review_stats_from_dict(None)
+        doc = self.db.collection(STATS_COLLECTION).document(REVIEW_STATS_DOC).get()
+        stats = review_stats_from_dict(doc.to_dict() if doc.exists else None)
+        with self._lock:
+            self._stats = (time.monotonic(), stats)
+        return stats
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._first_page = None
+            self._stats = None
+            self.version += 1
+
+    def add(self, review: Dict[str, Any]) -> None:
+        batch = self.db.batch()
+        self.stage(batch, review)
+        batch.commit()
+        self.invalidate()
+
+    def stage(self, batch, review: Dict[str, Any], doc_id: Optional[str] = None) -> None:
+        """Add the review and its aggregate increments to ``batch``, so they commit atomically.
+
+        With an explicit ``doc_id`` the review is created rather than set, and
+        a batch that was already committed fails instead of counting it twice.
+        """
+        from firebase_admin import firestore
+
+        rating = int(review.get("rating", 0))
+        if doc_id:
+            batch.create(self.db.collection(REVIEWS_COLLECTION).document(doc_id), review)
+        else:
+            batch.set(self.db.collection(REVIEWS_COLLECTION).document(), review)
+        increments = {
+            "count": firestore.Increment(1),
+            "rating_sum": firestore.Increment(rating),
+        }
+        if 1 <= rating <= 5:
+            increments["histogram"] = {str(rating): firestore.Increment(1)}
+        batch.set(self.db.collection(STATS_COLLECTION).document(REVIEW_STATS_DOC), increments, merge=True)
+
+    def rebuild_stats(self) -> Dict[str, Any]:
+        stats = empty_review_stats()
+        for doc in self.db.collection(REVIEWS_COLLECTION).select(["rating"]).stream():
+            try:
+                rating = int((doc.to_dict() or {}).get("rating", 0))
+            except (TypeError, ValueError):
+                rating = 0
+            stats["count"] += 1
+            stats["rating_sum"] += rating
+            if 1 <= rating <= 5:
+                stats["histogram"][str(rating)] += 1
+        self.db.collection(STATS_COLLECTION).document(REVIEW_STATS_DOC).set(stats)
+        self.invalidate()
+        return review_stats_from_dict(stats)
@@ -0,0 +1,235 @@
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("wallcraft")
+
+PRODUCT_SALES_COLLECTION = "sales_products"
+DAILY_SALES_COLLECTION = "sales_days"
+DEFAULT_SHARDS = 4
+# Firestore rejects a commit with more than 500 writes
+BATCH_LIMIT = 500
+# Identify a counter document; written as they are, never summed
+KEY_FIELDS = ("product_id", "day")
+# Best sellers read this many busiest shards per shard slot they return
+CANDIDATE_FACTOR = 2
+
+
+def order_day(order: Dict[str, Any]) -> str:
+    ts = order.get("timestamp")
+    return (ts if isinstance(ts, datetime) else datetime.utcnow()).strftime("%Y-%m-%d")
+
+
+def shard_for(order_id: str, shards: int) -> int:
+    # Stable per order, so a replayed order lands on the same documents
+    return zlib.crc32(str(order_id).encode("utf-8")) % max(1, shards)
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def order_contributions(order: Dict[str, Any]) -> Dict[Tuple[str, Any], Dict[str, Any]]:
+    """What one order adds to each aggregate, keyed by (collection, product id or day)."""
+    day = order_day(order)
+    daily: Dict[str, Any] = {"day": day, "orders": 1, "units": 0, "revenue": _int(order.get("total")), "sizes": {}}
+    contributions: Dict[Tuple[str, Any], Dict[str, Any]] = {(DAILY_SALES_COLLECTION, day): daily}
+    for item in order.get("items") or []:
+        pid = _int(item.get("product_id"))
+        qty = _int(item.get("quantity"))
+        size = str(item.get("size") or "small")
+        product = contributions.setdefault((PRODUCT_SALES_COLLECTION, pid), {
+            "product_id": pid, "units": 0, "revenue": 0, "sizes": {},
+        })
+        for target in (product, daily):
+            target["units"] += qty
+            target["sizes"][size] = target["sizes"].get(size, 0) + qty
+        product["revenue"] += _int(item.get("subtotal"))
+    return contributions
+
+
+def _add(target: Dict[str, Any], fields: Dict[str, Any]) -> None:
+    for key, value in fields.items():
+        if key in KEY_FIELDS:
+            target[key] = value
+        elif isinstance(value, dict):
+            _add(target.setdefault(key, {}), value)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            target[key] = target.get(key, 0) + value
+        else:
+            target[key] = value
+
+
+def _increments(fields: Dict[str, Any]) -> Dict[str, Any]:
+    from firebase_admin import firestore
+
+    result: Dict[str, Any] = {}
+    for key, value in fields.items():
+        if key in KEY_FIELDS:
+            result[key] = value
+        elif isinstance(value, dict):
+            result[key] = _increments(value)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            result[key] = firestore.Increment(value)
+        else:
+            result[key] = value
+    return result
+
+
+# ---------------------------------------------------------------------
+# Sales Aggregates
+# ---------------------------------------------------------------------
+class SalesAggregates:
+    """Per-product and per-day sales counters kept up to date with every order.
+
+    Each order adds ``Increment`` writes to the same atomic commit that
+    creates its ``orders`` document (see :func:`orders.write_order`), on one
+    of ``shards`` documents per product and per day so busy days do not
+    contend on a single document. Best sellers read only the busiest
+    product shards and the dashboard one document per day shard, however
+    many orders or products there are.
+    """
+
+    def __init__(self, db_getter: Callable[[], Any], shards: int = DEFAULT_SHARDS, ttl: float = 300.0):
+        self._db_getter = db_getter
+        self.shards = max(1, shards)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._best: Dict[int, Tuple[float, List[Dict[str, Any]]]] = {}
+        # Bumped whenever cached figures are dropped, for page cache keys
+        self.version = 0
+
+    def _db(self):
+        db = self._db_getter()
+        if db is None:
+            raise RuntimeError("Firestore is not initialized")
+        return db
+
+    def stage(self, batch, db, order: Dict[str, Any]) -> None:
+        """Add ``order``'s counter increments to ``batch``."""
+        shard = shard_for(order.get("order_id", ""), self.shards)
+        for (collection, key), fields in order_contributions(order).items():
+            ref = db.collection(collection).document(f"{key}-{shard}")
+            batch.set(ref, _increments(fields), merge=True)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._best = {}
+            self.version += 1
+
+    # -----------------------------------------------------------------
+    # Reads
+    # -----------------------------------------------------------------
+    def best_sellers(self, limit: int = 8) -> List[Dict[str, Any]]:
+        with self._lock:
+            cached = self._best.get(limit)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        sellers = self._top_products(limit)
+        with self._lock:
+            self._best[limit] = (time.monotonic(), sellers)
+        return sellers
+
+    def _top_products(self, limit: int) -> List[Dict[str, Any]]:
+        """The ``limit`` products with most units, from the busiest shards only.
+
+        Reads the ``CANDIDATE_FACTOR * limit * shards`` shard documents with
+        the most units, then the remaining shards of every product among
+        them, so the cost is fixed by ``limit`` and ``shards`` rather than by
+        sales history. A product is missed only if none of its shards made
+        the first read, i.e. it is close to the cut-off; right after
+        ``rebuild`` every total sits on one shard and the ranking is exact.
+        """
+        from firebase_admin import firestore
+
+        db = self._db()
+        collection = db.collection(PRODUCT_SALES_COLLECTION)
+        query = collection.order_by("units", direction=firestore.Query.DESCENDING).limit(CANDIDATE_FACTOR * max(1, limit) * self.shards)
+        seen: Dict[str, Dict[str, Any]] = {doc.id: doc.to_dict() or {} for doc in query.stream()}
+        pids = sorted({_int(data.get("product_id")) for data in seen.values()})
+        refs = [collection.document(f"{pid}-{shard}") for pid in pids for shard in range(self.shards)]
+        missing = [ref for ref in refs if ref.id not in seen]
+        if missing:
+            seen.update({doc.id: doc.to_dict() or {} for doc in db.get_all(missing) if doc.exists})
+
+        totals: Dict[int, Dict[str, Any]] = {}
+        for data in seen.values():
+            pid = _int(data.get("product_id"))
+            _add(totals.setdefault(pid, {"product_id": pid, "units": 0, "revenue": 0, "sizes": {}}), data)
+        sellers = [t for t in totals.values() if t["units"] > 0]
+        sellers.sort(key=lambda t: (-t["units"], -t["revenue"], t["product_id"]))
+        return sellers[:limit]
+
+    def daily(self, days: int = 30, today: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """One row per day for the last ``days`` days, oldest first, zero-filled."""
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        end = (today or datetime.utcnow()).date()
+        start = end - timedelta(days=days - 1)
+        rows: Dict[str, Dict[str, Any]] = {}
+        for i in range(days):
+            day = (start + timedelta(days=i)).isoformat()
+            rows[day] = {"day": day, "orders": 0, "units": 0, "revenue": 0, "sizes": {}}
+        query = self._db().collection(DAILY_SALES_COLLECTION).where(filter=FieldFilter("day", ">=", start.isoformat()))
+        for doc in query.stream():
+            data = doc.to_dict() or {}
+            row = rows.get(data.get("day"))
+            if row is not None:
+                _add(row, data)
+        return list(rows.values())
+
+    def dashboard(self, days: int = 30, top: int = 10) -> Dict[str, Any]:
+        daily = self.daily(days)
+        totals: Dict[str, Any] = {"orders": 0, "units": 0, "revenue": 0, "sizes": {}}
+        for row in daily:
+            _add(totals, {k: v for k, v in row.items() if k != "day"})
+        return {"days": daily, "totals": totals, "best_sellers": self.best_sellers(top)}
+
+    # -----------------------------------------------------------------
+    # Rebuild
+    # -----------------------------------------------------------------
+    def rebuild(self, orders: Iterable[Dict[str, Any]],
+                on_progress: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+        """Recompute every counter from ``orders`` (read once) and replace the stored ones.
+
+        Orders committed while this runs can be lost from the counters, so
+        run it while checkout is quiet.
+        """
+        db = self._db()
+        aggregates: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+        count = 0
+        for order in orders:
+            for key, fields in order_contributions(order).items():
+                _add(aggregates.setdefault(key, {}), fields)
+            count += 1
+            if on_progress and count % 1000 == 0:
+                on_progress(count)
+
+        # Shard 0 carries the rebuilt totals; every other counter document goes
+        writes: List[Tuple[str, Any, Optional[Dict[str, Any]]]] = []
+        for (collection, key), fields in sorted(aggregates.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+            writes.append(("set", db.collection(collection).document(f"{key}-0"), fields))
+        kept = {(collection, f"{key}-0") for collection, key in aggregates}
+        for collection in (PRODUCT_SALES_COLLECTION, DAILY_SALES_COLLECTION):
+            for ref in db.collection(collection).list_documents():
+                if (collection, ref.id) not in kept:
+                    writes.append(("delete", ref, None))
+
+        batches = 0
+        for start in range(0, len(writes), BATCH_LIMIT):
+            batch = db.batch()
+            for op, ref, fields in writes[start:start + BATCH_LIMIT]:
+                if op == "delete":
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, fields)
+            batch.commit()
+            batches += 1
+        self.invalidate()
+        return {"orders": count, "documents": len(aggregates), "batches": batches}
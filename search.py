@@ -0,0 +1,217 @@
+import logging
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from catalog import PRICE_SIZES, money_to_int
+
+logger = logging.getLogger("wallcraft")
+
+SORTS = ("relevance", "price_asc", "price_desc", "name", "newest")
+# A hit in the name outranks one in the features, which outranks the description
+FIELD_WEIGHTS = (("name", 3), ("features", 2), ("desc", 1))
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _field_text(product: Dict[str, Any], field: str) -> str:
+    value = product.get(field)
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value or "")
+
+
+def _signature(product: Dict[str, Any]) -> tuple:
+    return (
+        tuple(_field_text(product, field) for field, _ in FIELD_WEIGHTS),
+        tuple(product.get(f"price_{size}") for size in PRICE_SIZES),
+    )
+
+
+class SearchQuery(NamedTuple):
+    q: str = ""
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    sort: str = ""
+    size: str = "small"
+
+    @property
+    def active(self) -> bool:
+        return bool(self.q or self.min_price is not None or self.max_price is not None or self.sort)
+
+
+def _price_arg(value: Optional[str]) -> Optional[int]:
+    if value is None or not str(value).strip():
+        return None
+    price = money_to_int(str(value))
+    return price if price >= 0 else None
+
+
+def parse_search_args(args) -> SearchQuery:
+    """Build a query from request args; unknown sorts and sizes fall back to defaults."""
+    sort = args.get("sort", "")
+    size = args.get("size", "small")
+    return SearchQuery(
+        q=(args.get("q") or "").strip()[:100],
+        min_price=_price_arg(args.get("min")),
+        max_price=_price_arg(args.get("max")),
+        sort=sort if sort in SORTS else "",
+        size=size if size in PRICE_SIZES else "small",
+    )
+
+
+# ---------------------------------------------------------------------
+# Search Index
+# ---------------------------------------------------------------------
+class SearchIndex:
+    """Inverted index over name/desc/features plus per-size sorted price arrays.
+
+    :meth:`sync` diffs a new catalog against the indexed one and only
+    re-tokenizes products whose text or prices changed, so an admin edit
+    costs one product's worth of work rather than a full rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._source: Optional[List[Dict[str, Any]]] = None
+        self._products: Dict[int, Dict[str, Any]] = {}
+        self._order: List[int] = []
+        self._position: Dict[int, int] = {}
+        self._signatures: Dict[int, tuple] = {}
+        self._terms: Dict[int, Dict[str, int]] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._prices: Dict[str, Dict[int, int]] = {size: {} for size in PRICE_SIZES}
+        # Rebuilt lazily after a sync that changed anything
+        self._vocabulary: Optional[List[str]] = None
+        self._sorted_prices: Optional[Dict[str, Tuple[List[int], List[int]]]] = None
+        self.stats = {"syncs": 0, "reindexed": 0, "removed": 0, "searches": 0}
+
+    def sync(self, products: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            if products is self._source:
+                return
+            seen = set()
+            changed = 0
+            for product in products:
+                if "id" not in product:
+                    continue
+                pid = product["id"]
+                seen.add(pid)
+                self._products[pid] = product
+                signature = _signature(product)
+                if self._signatures.get(pid) != signature:
+                    self._reindex(pid, product, signature)
+                    changed += 1
+            removed = [pid for pid in self._signatures if pid not in seen]
+            for pid in removed:
+                self._remove(pid)
+            self._order = [p["id"] for p in products if "id" in p]
+            self._position = {pid: i for i, pid in enumerate(self._order)}
+            self._source = products
+            self.stats["syncs"] += 1
+            self.stats["reindexed"] += changed
+            self.stats["removed"] += len(removed)
+            if changed or removed:
+                self._vocabulary = None
+                self._sorted_prices = None
+
+    def _reindex(self, pid: int, product: Dict[str, Any], signature: tuple) -> None:
+        self._remove(pid, keep_product=True)
+        terms: Dict[str, int] = {}
+        for field, weight in FIELD_WEIGHTS:
+            for token in set(tokenize(_field_text(product, field))):
+                terms[token] = max(terms.get(token, 0), weight)
+        for token, weight in terms.items():
+            self._postings.setdefault(token, {})[pid] = weight
+        self._terms[pid] = terms
+        self._signatures[pid] = signature
+        for size in PRICE_SIZES:
+            self._prices[size][pid] = money_to_int(product.get(f"price_{size}", "0"))
+
+    def _remove(self, pid: int, keep_product: bool = False) -> None:
+        for token in self._terms.pop(pid, {}):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(pid, None)
+                if not posting:
+                    del self._postings[token]
+        self._signatures.pop(pid, None)
+        for prices in self._prices.values():
+            prices.pop(pid, None)
+        if not keep_product:
+            self._products.pop(pid, None)
+
+    def _ensure_sorted(self) -> None:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        if self._sorted_prices is None:
+            self._sorted_prices = {}
+            for size, prices in self._prices.items():
+                pairs = sorted((price, pid) for pid, price in prices.items())
+                self._sorted_prices[size] = ([p for p, _ in pairs], [pid for _, pid in pairs])
+
+    def _matches(self, token: str) -> Dict[int, int]:
+        # Every indexed term starting with ``token``, so "flor" finds "floral"
+        vocabulary = self._vocabulary
+        found: Dict[int, int] = {}
+        i = bisect_left(vocabulary, token)
+        while i < len(vocabulary) and vocabulary[i].startswith(token):
+            for pid, weight in self._postings[vocabulary[i]].items():
+                # An exact term counts a little more than a prefix of one
+                score = weight * 2 if vocabulary[i] == token else weight * 2 - 1
+                if score > found.get(pid, 0):
+                    found[pid] = score
+            i += 1
+        return found
+
+    def search(self, query: SearchQuery) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_sorted()
+            self.stats["searches"] += 1
+            scores: Optional[Dict[int, int]] = None
+            for token in dict.fromkeys(tokenize(query.q)):
+                matches = self._matches(token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {pid: s + matches[pid] for pid, s in scores.items() if pid in matches}
+                if not scores:
+                    return []
+
+            candidates: Optional[Set[int]] = None
+            if query.min_price is not None or query.max_price is not None:
+                prices, pids = self._sorted_prices[query.size]
+                lo = bisect_left(prices, query.min_price) if query.min_price is not None else 0
+                hi = bisect_right(prices, query.max_price) if query.max_price is not None else len(prices)
+                candidates = set(pids[lo:hi])
+
+            if scores is not None:
+                ids: Iterable[int] = scores if candidates is None else (p for p in scores if p in candidates)
+            elif candidates is not None:
+                ids = candidates
+            else:
+                ids = self._order
+            results = list(ids)
+
+            sort = query.sort or ("relevance" if scores is not None else "")
+            size_prices = self._prices[query.size]
+            position = self._position
+            if sort == "relevance" and scores is not None:
+                results.sort(key=lambda pid: (-scores[pid], position[pid]))
+            elif sort == "price_asc":
+                results.sort(key=lambda pid: (size_prices.get(pid, 0), pid))
+            elif sort == "price_desc":
+                results.sort(key=lambda pid: (-size_prices.get(pid, 0), pid))
+            elif sort == "name":
+                results.sort(key=lambda pid: (str(self._products[pid].get("name") or "").lower(), pid))
+            elif sort == "newest":
+                results.sort(reverse=True)
+            elif candidates is not None or scores is not None:
+                results.sort(key=position.__getitem__)
+            return [self._products[pid] for pid in results]
@@ -0,0 +1,86 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("wallcraft")
+
+
+class LazyService:
+    """Thread-safe singleton built on first use, once per worker process.
+
+    The factory runs under a lock the first time :meth:`get` is called in a
+    process, so Passenger's preloader never opens gRPC channels or HTTP pools
+    that forked workers would then share. A failed factory is retried after
+    ``retry_after`` seconds instead of on every request.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], retry_after: float = 30.0):
+        self.name = name
+        self._factory = factory
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._pid: Optional[int] = None
+        self._retry_at = 0.0
+
+    def _current(self) -> bool:
+        return self._pid == os.getpid() and (self._value is not None or time.monotonic() < self._retry_at)
+
+    def get(self) -> Any:
+        if self._current():
+            return self._value
+        with self._lock:
+            if self._current():
+                return self._value
+            started = time.perf_counter()
+            try:
+                value = self._factory()
+                logger.info(f"{self.name} initialized in {(time.perf_counter() - started) * 1000:.0f} ms")
+            except Exception as e:
+                value = None
+                self._retry_at = time.monotonic() + self.retry_after
+                logger.error(f"Failed to init {self.name}: {e}")
+            self._value = value
+            self._pid = os.getpid()
+            return value
+
+    @property
+    def initialized(self) -> bool:
+        return self._pid == os.getpid() and self._value is not None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._value = None
+            self._pid = None
+            self._retry_at = 0.0
+
+
+class ServiceProxy:
+    """Stands in for a :class:`LazyService` value at module level.
+
+    Attribute access builds the service on demand, and ``if not proxy``
+    is true while the service is unavailable, so existing ``if not db``
+    checks keep working.
+    """
+
+    __slots__ = ("_service",)
+
+    def __init__(self, service: LazyService):
+        object.__setattr__(self, "_service", service)
+
+    def __getattr__(self, name):
+        target = self._service.get()
+        if target is None:
+            raise RuntimeError(f"{self._service.name} is not available")
+        return getattr(target, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._service.get(), name, value)
+
+    def __bool__(self):
+        return self._service.get() is not None
+
+    def __repr__(self):
+        return f"ServiceProxy({self._service.name})"
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("wallcraft")
+
+MAGIC = b"WCAT"
+FORMAT_VERSION = 1
+# magic, format version, revision, written_at, crc32 of payload, payload length
+_HEADER = struct.Struct("<4sHQdIQ")
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot snapshot value of type {type(value).__name__}")
+
+
+def _decode(obj):
+    if "__datetime__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class CatalogSnapshot:
+    """Versioned on-disk copy of the catalog shared by every worker.
+
+    The file is a fixed header followed by compact JSON. Readers map it
+    read-only, so all workers share one page-cache copy, and writers replace
+    it atomically, so a reader never sees a half-written file. Writing the
+    same catalog again is a no-op; a changed catalog gets the next revision.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.revision = 0
+        self.written_at: Optional[float] = None
+        self._digest: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Optional[List[Dict[str, Any]]]:
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, fmt, revision, written_at, crc, length = _HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or fmt != FORMAT_VERSION:
+                    logger.warning(f"Ignoring catalog snapshot {self.path}: unknown format")
+                    return None
+                payload = mm[_HEADER.size:_HEADER.size + length]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Could not read catalog snapshot {self.path}: {e}")
+            return None
+
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            logger.warning(f"Ignoring corrupt catalog snapshot {self.path}")
+            return None
+        products = json.loads(payload, object_hook=_decode)
+        with self._lock:
+            self.revision = revision
+            self.written_at = written_at
+            self._digest = hashlib.sha256(payload).digest()
+        logger.info(f"Loaded catalog snapshot r{revision} ({len(products)} products)")
+        return products
+
+    def write(self, products: List[Dict[str, Any]]) -> bool:
+        """Persist ``products``; returns False when the file already holds them."""
+        try:
+            payload = json.dumps(products, default=_encode, ensure_ascii=False,
+                                 separators=(",", ":"), sort_keys=True).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            logger.error(f"Could not serialize catalog snapshot: {e}")
+            return False
+        digest = hashlib.sha256(payload).digest()
+        crc = zlib.crc32(payload)
+
+        with self._lock:
+            if digest == self._digest:
+                return False
+            on_disk = self._read_header()
+            if on_disk and on_disk[4] == crc and on_disk[5] == len(payload):
+                # Another worker already wrote this catalog
+                self.revision, self.written_at, self._digest = on_disk[2], on_disk[3], digest
+                return False
+            revision = max(self.revision, on_disk[2] if on_disk else 0) + 1
+            written_at = time.time()
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(tmp, "wb") as f:
+                    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, revision, written_at, crc, len(payload)))
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.error(f"Could not write catalog snapshot {self.path}: {e}")
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                return False
+            self.revision, self.written_at, self._digest = revision, written_at, digest
+        logger.info(f"Wrote catalog snapshot r{revision} ({len(products)} products, {len(payload)} bytes)")
+        return True
+
+    def _read_header(self) -> Optional[tuple]:
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            fields = _HEADER.unpack(header)
+            return fields if fields[0] == MAGIC and fields[1] == FORMAT_VERSION else None
+        except OSError:
+            return None
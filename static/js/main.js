@@ -74,7 +74,7 @@ function initializeCart() {
             button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Adding...';
             button.disabled = true;
             
-            fetch(this.action, {
+            fetch('/api/cart/add', {
                 method: 'POST',
                 body: formData
             })
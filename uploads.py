@@ -0,0 +1,152 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger("wallcraft")
+
+IMGBB_UPLOAD_URL = "https://api.imgbb.com/1/upload"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UploadResult(NamedTuple):
+    filename: str
+    url: Optional[str]
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.url is not None
+
+
+class ImageUploader:
+    """Uploads images to ImgBB on a bounded thread pool.
+
+    All uploads share one pooled ``requests.Session``. Files are sent as
+    multipart bodies rather than base64 strings, every request carries a
+    (connect, read) timeout, and connection errors, timeouts and
+    429/5xx responses are retried with exponential backoff.
+    """
+
+    def __init__(self, api_key: str, max_workers: int = 4,
+                 timeout: tuple = (5, 30), retries: int = 3, backoff: float = 0.5,
+                 session_hook: Optional[Callable[["requests.Session"], Any]] = None):
+        self.api_key = api_key
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session_hook = session_hook
+        self._lock = threading.Lock()
+        self._session: Optional["requests.Session"] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def session(self) -> "requests.Session":
+        with self._lock:
+            if self._session is None:
+                # Imported on first upload so app startup does not pay for it
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount("https://", adapter)
+                if self.session_hook is not None:
+                    self.session_hook(session)
+                self._session = session
+            return self._session
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="imgbb-upload"
+                )
+            return self._executor
+
+    def upload(self, file_storage) -> UploadResult:
+        filename = file_storage.filename or "image"
+
+        def send():
+            file_storage.seek(0)
+            return self.session.post(
+                IMGBB_UPLOAD_URL,
+                data={"key": self.api_key, "name": filename, "expiration": "0"},
+                files={"image": (filename, file_storage.stream, file_storage.mimetype)},
+                timeout=self.timeout,
+            )
+        return self._send(filename, send)
+
+    def upload_url(self, url: str) -> UploadResult:
+        # ImgBB fetches the image itself, so nothing is downloaded here
+        return self._send(url, lambda: self.session.post(
+            IMGBB_UPLOAD_URL,
+            data={"key": self.api_key, "image": url, "expiration": "0"},
+            timeout=self.timeout,
+        ))
+
+    def _send(self, filename: str, send: Callable[[], "requests.Response"]) -> UploadResult:
+        import requests
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"{type(e).__name__}: {e}"
+                logger.warning(f"ImgBB upload of {filename} failed (attempt {attempt + 1}): {error}")
+                continue
+            except Exception as e:
+                error = str(e)
+                break
+
+            if response.status_code in RETRY_STATUSES:
+                error = f"HTTP {response.status_code}"
+                logger.warning(f"ImgBB upload of {filename} failed (attempt {attempt + 1}): {error}")
+                continue
+            try:
+                result = response.json()
+            except ValueError:
+                result = {}
+            if response.status_code == 200 and result.get("success"):
+                return UploadResult(filename, result["data"]["url"])
+            error = f"HTTP {response.status_code}: {result.get('error') or response.text[:200]}"
+            break
+
+        logger.error(f"ImgBB upload failed for {filename}: {error}")
+        return UploadResult(filename, None, error)
+
+    def upload_many(self, files: Iterable) -> List[UploadResult]:
+        # Results come back in the same order as ``files``.
+        files = list(files)
+        if not files:
+            return []
+        if len(files) == 1:
+            return [self.upload(files[0])]
+        # Each task runs in a copy of the caller's context so per-request metrics follow it
+        futures = [self.executor.submit(contextvars.copy_context().run, self.upload, f) for f in files]
+        return [future.result() for future in futures]
+
+    def upload_urls(self, urls: Iterable[str]) -> List[UploadResult]:
+        # Same ordering and context handling as upload_many
+        urls = list(urls)
+        futures = [self.executor.submit(contextvars.copy_context().run, self.upload_url, u) for u in urls]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -0,0 +1,353 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import secrets
+import string
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger("wallcraft")
+
+# Firestore commits at most 500 writes, and a review stages two
+MAX_BATCH_ENTRIES = 250
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_SPILL_PATTERN = "spill-*.jsonl"
+
+
+def auto_id() -> str:
+    """A 20-character document id in the same alphabet Firestore uses for ``add()``."""
+    return "".join(secrets.choice(_AUTO_ID_CHARS) for _ in range(20))
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot queue value of type {type(value).__name__}")
+
+
+def _decode(obj):
+    if "__datetime__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Entry(NamedTuple):
+    kind: str
+    doc_id: str
+    data: Dict[str, Any]
+    queued_at: float
+
+
+class Kind(NamedTuple):
+    # stage(batch, db, doc_id, data) adds the entry's writes to ``batch``
+    stage: Callable[[Any, Any, str, Dict[str, Any]], None]
+    on_written: Optional[Callable[[], None]]
+
+
+# ---------------------------------------------------------------------
+# Write Queue
+# ---------------------------------------------------------------------
+class WriteQueue:
+    """Buffers fire-and-forget documents and commits them in batches.
+
+    ``enqueue`` only appends to an in-memory deque, so a form post never
+    waits on Firestore. A background thread commits the queue as one
+    ``WriteBatch`` when ``max_batch`` entries are waiting or every
+    ``interval`` seconds, whichever comes first.
+
+    Entries leave memory for a spill file in ``spill_dir`` when a commit
+    fails or there is no database yet, when the queue grows past
+    ``max_memory`` and at interpreter exit; every worker picks spill files up again on its next flush.
+    Document ids are chosen at enqueue time and written with ``create``,
+    so an entry committed twice (a timeout that actually succeeded, a
+    worker that died before deleting its spill file) is recognised by
+    ``AlreadyExists`` instead of being stored twice.
+    """
+
+    def __init__(self, spill_dir: str, db_getter: Callable[[], Any], max_batch: int = 100,
+                 interval: float = 1.0, max_memory: int = 5000, max_backoff: float = 300.0,
+                 on_flush: Optional[Callable[[float, int, bool], None]] = None):
+        self.spill_dir = spill_dir
+        self._db_getter = db_getter
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_ENTRIES))
+        self.interval = interval
+        self.max_memory = max_memory
+        self.max_backoff = max_backoff
+        self.on_flush = on_flush
+        self._kinds: Dict[str, Kind] = {}
+        self._queue: Deque[Entry] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self.stats = {"queued": 0, "written": 0, "duplicates": 0, "dropped": 0, "flushes": 0,
+                      "failed_flushes": 0, "spilled": 0, "reloaded": 0, "last_flush_seconds": 0.0}
+
+    def register(self, kind: str, stage: Callable[[Any, Any, str, Dict[str, Any]], None],
+                 on_written: Optional[Callable[[], None]] = None) -> None:
+        self._kinds[kind] = Kind(stage, on_written)
+
+    # -----------------------------------------------------------------
+    # Producer side
+    # -----------------------------------------------------------------
+    def enqueue(self, kind: str, data: Dict[str, Any]) -> str:
+        """Queue ``data`` for writing and return the document id it will get."""
+        if kind not in self._kinds:
+            raise KeyError(f"Unknown write kind {kind!r}")
+        entry = Entry(kind, auto_id(), data, time.time())
+        with self._lock:
+            self._queue.append(entry)
+            self.stats["queued"] += 1
+            depth = len(self._queue)
+        if depth > self.max_memory:
+            self.spill()
+        if depth >= self.max_batch or not self.running:
+            self.wake()
+        return entry.doc_id
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["depth"] = len(self._queue)
+            stats["oldest_seconds"] = time.time() - self._queue[0].queued_at if self._queue else 0.0
+        stats["spill_files"] = len(self._spill_files())
+        return stats
+
+    # -----------------------------------------------------------------
+    # Background thread
+    # -----------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def ensure_started(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            if self._pid is None:
+                atexit.register(self.spill)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        self.ensure_started()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if time.monotonic() < self._retry_at:
+                continue
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write queue error: {e}")
+
+    # -----------------------------------------------------------------
+    # Flushing
+    # -----------------------------------------------------------------
+    def flush(self) -> int:
+        """Commit spilled and queued entries; returns how many were written."""
+        db = self._db_getter()
+        if db is None:
+            # Nothing to commit to yet; keep what is waiting safe on disk
+            self.spill()
+            return 0
+        written = 0
+        with self._flush_lock:
+            for path in self._claim_spill_files():
+                entries = self._read_spill(path)
+                for start in range(0, len(entries), self.max_batch):
+                    done = self._commit(db, entries[start:start + self.max_batch])
+                    if done is None:
+                        # Give the file back; its entries stay durable until Firestore recovers
+                        self._release(path)
+                        self.spill()
+                        return written
+                    written += done
+                os.remove(path)
+
+            while True:
+                with self._lock:
+                    entries = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                if not entries:
+                    break
+                done = self._commit(db, entries)
+                if done is None:
+                    with self._lock:
+                        self._queue.extendleft(reversed(entries))
+                    # Firestore is down, so make whatever is waiting survive a restart
+                    self.spill()
+                    break
+                written += done
+        return written
+
+    def _commit(self, db, entries: List[Entry]) -> Optional[int]:
+        """Write ``entries`` as one batch; None when Firestore is unavailable."""
+        from google.api_core import exceptions
+
+        started = time.perf_counter()
+        try:
+            batch = db.batch()
+            for entry in entries:
+                self._kinds[entry.kind].stage(batch, db, entry.doc_id, entry.data)
+            batch.commit()
+            self._written(entries, started, len(entries))
+            return len(entries)
+        except (exceptions.AlreadyExists, exceptions.InvalidArgument, TypeError, ValueError) as e:
+            if len(entries) == 1:
+                return self._reject(entries[0], e, started)
+            logger.warning(f"Write batch of {len(entries)} rejected ({e}); retrying entries one by one")
+        except Exception as e:
+            self._failed(started, e)
+            return None
+
+        written = 0
+        for entry in entries:
+            done = self._commit(db, [entry])
+            if done is None:
+                return None
+            written += done
+        return written
+
+    def _reject(self, entry: Entry, error: Exception, started: float) -> int:
+        from google.api_core import exceptions
+
+        if isinstance(error, exceptions.AlreadyExists):
+            # Committed by an earlier attempt whose outcome we never saw
+            with self._lock:
+                self.stats["duplicates"] += 1
+            self._written([], started, 0)
+            return 0
+        with self._lock:
+            self.stats["dropped"] += 1
+        payload = json.dumps(entry.data, default=_encode, ensure_ascii=False)
+        logger.critical(f"WRITE DROPPED {entry.kind}/{entry.doc_id} {error}: {payload}")
+        return 0
+
+    def _written(self, entries: List[Entry], started: float, count: int) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats["written"] += count
+            self.stats["flushes"] += 1
+            self.stats["last_flush_seconds"] = elapsed
+            self._failures = 0
+            self._retry_at = 0.0
+        if self.on_flush:
+            self.on_flush(elapsed, count, True)
+        for kind in {entry.kind for entry in entries}:
+            callback = self._kinds[kind].on_written
+            if callback:
+                callback()
+
+    def _failed(self, started: float, error: Exception) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats["failed_flushes"] += 1
+            self._failures += 1
+            backoff = min(self.max_backoff, self.interval * (2 ** min(self._failures, 8)))
+            self._retry_at = time.monotonic() + backoff
+        if self.on_flush:
+            self.on_flush(elapsed, 0, False)
+        logger.error(f"Write queue flush failed, retrying in {backoff:.1f}s: {error}")
+
+    # -----------------------------------------------------------------
+    # Spill files
+    # -----------------------------------------------------------------
+    def spill(self) -> int:
+        """Move every queued entry to a new spill file; returns how many moved."""
+        with self._lock:
+            entries = list(self._queue)
+            self._queue.clear()
+        if not entries:
+            return 0
+        name = f"spill-{os.getpid()}-{time.time_ns()}.jsonl"
+        path = os.path.join(self.spill_dir, name)
+        tmp = path + ".tmp"
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry._asdict(), default=_encode, ensure_ascii=False,
+                                       separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.error(f"Could not spill {len(entries)} queued writes to {self.spill_dir}: {e}")
+            with self._lock:
+                self._queue.extendleft(reversed(entries))
+            return 0
+        with self._lock:
+            self.stats["spilled"] += len(entries)
+        logger.warning(f"Spilled {len(entries)} queued writes to {path}")
+        return len(entries)
+
+    def _spill_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.spill_dir, _SPILL_PATTERN)))
+
+    def _claim_spill_files(self) -> List[str]:
+        # Renaming is atomic, so exactly one worker wins each file. Claims
+        # left behind by a worker that died are taken over as well.
+        claimed = []
+        pid = os.getpid()
+        candidates = self._spill_files() + sorted(glob.glob(os.path.join(self.spill_dir, "spill-*.claimed-*")))
+        for path in candidates:
+            base, _, owner = path.partition(".claimed-")
+            if owner and owner.isdigit() and int(owner) != pid and _pid_alive(int(owner)):
+                continue
+            target = f"{base}.claimed-{pid}"
+            try:
+                if path != target:
+                    os.rename(path, target)
+            except OSError:
+                continue
+            claimed.append(target)
+        return claimed
+
+    def _release(self, path: str) -> None:
+        try:
+            os.rename(path, path.partition(".claimed-")[0])
+        except OSError as e:
+            logger.error(f"Could not release spill file {path}: {e}")
+
+    def _read_spill(self, path: str) -> List[Entry]:
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = Entry(**json.loads(line, object_hook=_decode))
+                except (TypeError, ValueError):
+                    logger.warning(f"Skipping unreadable line in {path}")
+                    continue
+                if entry.kind in self._kinds:
+                    entries.append(entry)
+                else:
+                    logger.error(f"Skipping spilled write of unknown kind {entry.kind!r} in {path}")
+        with self._lock:
+            self.stats["reloaded"] += len(entries)
+        return entries